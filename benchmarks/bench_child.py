@@ -0,0 +1,94 @@
+"""
+generate_child_workplans for a parent with a long history, half of the children exist:
+an outer join with one ORM object per child versus INSERT ... SELECT ... NOT EXISTS.
+The legacy query is fixed to filter with IS NULL, as written it selected nothing.
+
+    python -m benchmarks.bench_child [SIZE]
+"""
+import sys
+
+import pendulum
+import sqlalchemy as sa
+from script_master_helper.workplanner import schemas
+from script_master_helper.workplanner.enums import Statuses
+
+from benchmarks import common
+from workplanner.models import Workplan
+
+SIZE = 100_000
+
+
+def legacy_generate_child_workplans(db, schema):
+    from workplanner.app import logger
+
+    subquery = sa.select(Workplan).filter(Workplan.name == schema.name).subquery()
+    parent_workplans_query = (
+        sa.select(Workplan.worktime_utc)
+        .filter(
+            Workplan.name == schema.parent_name,
+            Workplan.status == schema.status_trigger,
+        )
+        .outerjoin(subquery, subquery.c.worktime_utc == Workplan.worktime_utc)
+        .filter(subquery.c.worktime_utc.is_(None))
+    )
+    with db.begin_nested():
+        for worktime_utc in db.scalars(parent_workplans_query):
+            item = Workplan(name=schema.name, worktime_utc=worktime_utc)
+            logger.info("Created missing workplans [{}] {}", schema.name, worktime_utc)
+            db.add(item)
+            yield item
+
+
+def create_database(size):
+    from workplanner import service
+
+    engine = common.create_engine("bench_child.db")
+    start_time = pendulum.datetime(2000, 1, 1)
+    parent = schemas.GenerateWorkplans(
+        name="bench_child", start_time=start_time, interval_in_seconds=60
+    )
+    child = schemas.GenerateWorkplans(
+        name="bench_child_child", start_time=start_time, interval_in_seconds=120
+    )
+    with common.session(engine) as db, db.begin():
+        end_time = start_time.add(minutes=size - 1)
+        service.fill_missing(db, parent, end_time=end_time)
+        db.execute(
+            sa.update(Workplan)
+            .where(Workplan.name == parent.name)
+            .values(status=Statuses.success)
+        )
+        service.fill_missing(db, child, end_time=end_time)
+        db.execute(sa.text("ANALYZE"))
+
+    schema = schemas.GenerateChildWorkplans(
+        name=child.name, parent_name=parent.name, status_trigger=Statuses.success
+    )
+
+    return engine, schema
+
+
+def main(size):
+    from workplanner import service
+
+    common.silence_logs()
+    functions = {
+        "legacy": legacy_generate_child_workplans,
+        "bulk": service.generate_child_workplans,
+    }
+    results = {}
+    for key, function in functions.items():
+        engine, schema = create_database(size)
+        with common.session(engine) as db, db.begin():
+            with common.timer(results, key):
+                items = list(function(db, schema))
+                db.flush()
+        assert len(items) == size // 2
+        engine.dispose()
+
+    print(f"{'parents':>10} {'legacy, s':>10} {'bulk, s':>10}")
+    print(f"{size:>10} {results['legacy']:>10.2f} {results['bulk']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZE)
@@ -0,0 +1,131 @@
+"""
+Concurrent writers and readers on SQLite: driver defaults versus the tuned pragmas.
+
+Each writer reads and then updates its own workplans in small transactions,
+each reader lists workplans, for a fixed time.
+
+    python -m benchmarks.bench_concurrency [WRITERS] [READERS] [SECONDS]
+"""
+import sys
+import threading
+import time
+
+import pendulum
+import sqlalchemy as sa
+from script_master_helper.workplanner import schemas
+from script_master_helper.workplanner.enums import Statuses
+
+from benchmarks import common
+
+WRITERS = 8
+READERS = 8
+SECONDS = 5
+ROWS = 50
+
+
+def writer(engine, name, ids, deadline, stats):
+    from workplanner import service
+
+    statuses = [Statuses.run, Statuses.success]
+    while time.perf_counter() < deadline:
+        schema_list = [
+            schemas.WorkplanUpdate(id=id_, status=statuses[stats["writes"] % 2])
+            for id_ in ids
+        ]
+        try:
+            with common.session(engine) as db, db.begin():
+                # Like generation: the state is read, then written.
+                service.execute_list(db, name).all()
+                service.many_update(db, schema_list)
+        except sa.exc.OperationalError:
+            stats["errors"] += 1
+        else:
+            stats["writes"] += 1
+
+
+def reader(engine, name, deadline, stats):
+    from workplanner import service
+
+    while time.perf_counter() < deadline:
+        try:
+            with common.session(engine) as db:
+                service.execute_list(db, name).all()
+        except sa.exc.OperationalError:
+            stats["errors"] += 1
+        else:
+            stats["reads"] += 1
+
+
+def run(pragmas: dict | None, writers: int, readers: int, seconds: float) -> dict:
+    from workplanner import database, service
+
+    engine = common.create_engine(
+        "bench_concurrency.db",
+        connect_args={"check_same_thread": False},
+        pool_size=writers + readers,
+    )
+    if pragmas:
+        database.set_sqlite_pragmas(engine, pragmas)
+    engine.dispose()
+
+    ids = {}
+    with common.session(engine) as db, db.begin():
+        for i in range(writers):
+            start_time = pendulum.datetime(2000, 1, 1)
+            workplans = service.fill_missing(
+                db,
+                schemas.GenerateWorkplans(
+                    name=f"bench_concurrency_{i}",
+                    start_time=start_time,
+                    interval_in_seconds=60,
+                ),
+                end_time=start_time.add(minutes=ROWS - 1),
+            )
+            ids[i] = [wp.id for wp in workplans]
+
+    stats = {"writes": 0, "reads": 0, "errors": 0}
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(
+            target=writer,
+            args=(engine, f"bench_concurrency_{i}", ids[i], deadline, stats),
+        )
+        for i in range(writers)
+    ] + [
+        threading.Thread(
+            target=reader,
+            args=(engine, f"bench_concurrency_{i % writers}", deadline, stats),
+        )
+        for i in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    engine.dispose()
+
+    return stats
+
+
+def main(writers, readers, seconds):
+    from workplanner import database, service  # noqa: F401 configures the logger
+
+    common.silence_logs()
+    modes = {"default": None, "tuned": database.sqlite_pragmas()}
+
+    print(f"{'mode':>8} {'writes/s':>9} {'reads/s':>9} {'errors':>7}")
+    for mode, pragmas in modes.items():
+        stats = run(pragmas, writers, readers, seconds)
+        print(
+            f"{mode:>8} {stats['writes'] / seconds:>9.0f}"
+            f" {stats['reads'] / seconds:>9.0f} {stats['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else WRITERS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else READERS,
+        float(sys.argv[3]) if len(sys.argv) > 3 else SECONDS,
+    )
@@ -0,0 +1,62 @@
+"""
+/workplan/count on a name with a long history: loading rows versus count(*).
+
+    python -m benchmarks.bench_count [SIZE]
+"""
+import sys
+import tracemalloc
+
+import pendulum
+from script_master_helper.workplanner import schemas
+from script_master_helper.workplanner.enums import Operators
+
+from benchmarks import common
+from workplanner import crud
+
+SIZE = 1_000_000
+
+
+def main(size):
+    from workplanner import service
+
+    common.silence_logs()
+    engine = common.create_engine("bench_count.db")
+    name = "bench_count"
+    with common.session(engine) as db, db.begin():
+        start_time = pendulum.datetime(2000, 1, 1)
+        service.fill_missing(
+            db,
+            schemas.GenerateWorkplans(
+                name=name, start_time=start_time, interval_in_seconds=60
+            ),
+            end_time=start_time.add(minutes=size - 1),
+        )
+
+    query_filter = crud.QueryFilter(
+        schemas.WorkplanQuery(
+            filter=schemas.WorkplanQuery.Filter(
+                name=[schemas.WorkplanQuery.Value(value=name, operator=Operators.equal)]
+            )
+        )
+    )
+    results = {}
+    memory = {}
+    for key in ("legacy", "count"):
+        with common.session(engine) as db:
+            tracemalloc.start()
+            with common.timer(results, key):
+                if key == "legacy":
+                    count = len(db.scalars(query_filter.get_query_with_filter()).all())
+                else:
+                    count = db.scalar(query_filter.get_count_query())
+            memory[key] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        assert count == size
+
+    print(f"{'rows':>10} {'mode':>8} {'time, s':>8} {'peak memory, MB':>16}")
+    for key in results:
+        print(f"{size:>10} {key:>8} {results[key]:>8.2f} {memory[key] / 2**20:>16.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZE)
@@ -0,0 +1,59 @@
+"""
+/workplan/count/by/list by name and status on a long history:
+GROUP BY over the workplans versus the sum of the status counters.
+
+    python -m benchmarks.bench_count_by [SIZE]
+"""
+import sys
+
+import pendulum
+import sqlalchemy as sa
+from script_master_helper.workplanner import schemas
+
+from benchmarks import common
+from workplanner import crud
+from workplanner.models import Workplan
+
+SIZE = 1_000_000
+NAMES = 10
+
+
+def main(size):
+    from workplanner import service
+
+    common.silence_logs()
+    engine = common.create_engine("bench_count_by.db")
+    start_time = pendulum.datetime(2000, 1, 1)
+    with common.session(engine) as db, db.begin():
+        for i in range(NAMES):
+            service.fill_missing(
+                db,
+                schemas.GenerateWorkplans(
+                    name=f"bench_count_by_{i}",
+                    start_time=start_time,
+                    interval_in_seconds=60,
+                ),
+                end_time=start_time.add(minutes=size // NAMES - 1),
+            )
+
+    fields = (Workplan.name, Workplan.status)
+    queries = {
+        "group by": sa.select(*fields, sa.func.count().label("count")).group_by(
+            *fields
+        ),
+        "counters": crud.count_by(*fields),
+    }
+    results = {}
+    for key, query in queries.items():
+        with common.session(engine) as db:
+            with common.timer(results, key):
+                data = db.execute(query).mappings().all()
+        assert sum(row["count"] for row in data) == size // NAMES * NAMES
+
+    print(f"{'rows':>10} {'mode':>10} {'time, s':>8}")
+    for key in results:
+        print(f"{size:>10} {key:>10} {results[key]:>8.4f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZE)
@@ -0,0 +1,75 @@
+"""
+Filling gaps of a minute-level workplan with the ORM and with INSERT ... SELECT.
+
+    python -m benchmarks.bench_fill_missing [SIZE ...]
+"""
+import sys
+
+import pendulum
+import sqlalchemy as sa
+from script_master_helper.workplanner import schemas
+
+from benchmarks import common
+from workplanner.models import Workplan
+from workplanner.utils import iter_range_datetime
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def legacy_fill_missing(db, schema, end_time):
+    from workplanner.app import logger
+
+    exists_worktimes = set(
+        db.scalars(
+            sa.select(Workplan.worktime_utc).filter(Workplan.name == schema.name)
+        )
+    )
+    with db.begin_nested():
+        for wt in iter_range_datetime(
+            schema.start_time, end_time, schema.interval_timedelta
+        ):
+            if wt not in exists_worktimes:
+                logger.info("Created missing workplans [{}] {}", schema.name, wt)
+                db.add(Workplan(name=schema.name, worktime_utc=wt))
+
+
+def main(sizes):
+    from workplanner import service
+
+    common.silence_logs()
+    engine = common.create_engine("bench_fill_missing.db")
+    start_time = pendulum.datetime(2020, 1, 1)
+
+    print(f"{'slots':>10} {'legacy, s':>10} {'bulk, s':>10} {'repeat, s':>10}")
+    for size in sizes:
+        end_time = start_time.add(minutes=size - 1)
+        results = {}
+        for key in ("legacy", "bulk"):
+            schema = schemas.GenerateWorkplans(
+                name=f"{key}-{size}",
+                start_time=start_time,
+                interval_in_seconds=60,
+                keep_sequence=True,
+            )
+            with common.session(engine) as db, db.begin():
+                with common.timer(results, key):
+                    if key == "legacy":
+                        legacy_fill_missing(db, schema, end_time)
+                        db.flush()
+                    else:
+                        service.fill_missing(db, schema, end_time=end_time)
+
+            # Regular case: the history is complete and nothing is created.
+            if key == "bulk":
+                with common.session(engine) as db, db.begin():
+                    with common.timer(results, "repeat"):
+                        service.fill_missing(db, schema, end_time=end_time)
+
+        print(
+            f"{size:>10} {results['legacy']:>10.2f} {results['bulk']:>10.2f}"
+            f" {results['repeat']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(i) for i in sys.argv[1:]] or SIZES)
@@ -0,0 +1,105 @@
+"""
+A chain of child workplans LEVELS deep under a root with a long history:
+a generate_child_workplans call per edge versus generate_graph,
+for the first pass and for a pass after a few new root workplans.
+Before the second pass the history is made an hour old,
+so that it lies before the high water marks of the edges.
+
+    python -m benchmarks.bench_graph [SIZE]
+"""
+import sys
+
+import pendulum
+import sqlalchemy as sa
+from script_master_helper.workplanner import schemas as client_schemas
+from script_master_helper.workplanner.enums import Statuses
+
+from benchmarks import common
+from workplanner import schemas
+from workplanner.models import Workplan
+
+SIZE = 20_000
+LEVELS = 5
+NEW = 10
+
+
+def create_database(size):
+    from workplanner import service
+
+    engine = common.create_engine("bench_graph.db")
+    root = client_schemas.GenerateWorkplans(
+        name="bench_graph_0",
+        start_time=pendulum.datetime(2000, 1, 1),
+        interval_in_seconds=60,
+        extra=client_schemas.GenerateWorkplans.Extra(status=Statuses.success),
+    )
+    edges = [
+        schemas.WorkplanEdge(
+            parent_name=f"bench_graph_{level}",
+            name=f"bench_graph_{level + 1}",
+            extra=schemas.WorkplanEdge.Extra(status=Statuses.success),
+        )
+        for level in range(LEVELS)
+    ]
+    with common.session(engine) as db, db.begin():
+        service.fill_missing(db, root, end_time=root.start_time.add(minutes=size - 1))
+        service.save_edges(db, edges)
+        db.execute(sa.text("ANALYZE"))
+
+    return engine, root, edges
+
+
+def make_history_old(engine, root, size):
+    from workplanner import service
+
+    with common.session(engine) as db, db.begin():
+        db.execute(
+            sa.update(Workplan).values(updated_utc=pendulum.now().subtract(hours=1))
+        )
+        end_time = root.start_time.add(minutes=size + NEW - 1)
+        service.fill_missing(db, root, end_time=end_time)
+
+
+def per_edge(db, edges):
+    from workplanner import service
+
+    items = []
+    for edge in edges:
+        items.extend(service.generate_child_workplans(db, edge))
+
+    return items
+
+
+def main(size):
+    from workplanner import service
+
+    common.silence_logs()
+    functions = {
+        "per edge": lambda db, edges: per_edge(db, edges),
+        "graph": lambda db, edges: service.generate_graph(db),
+    }
+    results = {}
+    for key, function in functions.items():
+        engine, root, edges = create_database(size)
+        with common.session(engine) as db, db.begin():
+            with common.timer(results, f"{key} first"):
+                items = function(db, edges)
+        assert len(items) == size * LEVELS
+
+        make_history_old(engine, root, size)
+        with common.session(engine) as db, db.begin():
+            with common.timer(results, f"{key} next"):
+                items = function(db, edges)
+        assert len(items) == NEW * LEVELS
+        engine.dispose()
+
+    print(f"{'pass':>10} {'per edge, s':>12} {'graph, s':>10}")
+    for pass_ in ("first", "next"):
+        print(
+            f"{pass_:>10} {results[f'per edge {pass_}']:>12.3f}"
+            f" {results[f'graph {pass_}']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZE)
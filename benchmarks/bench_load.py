@@ -0,0 +1,139 @@
+"""
+Latency of the sync and the async API under concurrent clients.
+
+Each stack is served by uvicorn in a subprocess over the same SQLite database.
+Every client reads the executable list and a page of workplans in a loop.
+
+    python -m benchmarks.bench_load [CLIENTS] [REQUESTS_PER_CLIENT]
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import pendulum
+from script_master_helper.workplanner import schemas
+
+from benchmarks import common
+
+CLIENTS = 500
+REQUESTS_PER_CLIENT = 10
+NAMES = 50
+PORT = 8099
+
+
+def prepare():
+    from workplanner import service
+
+    engine = common.create_engine("workplanner.db")
+    start_time = pendulum.today().add(days=-30)
+    with common.session(engine) as db, db.begin():
+        for i in range(NAMES):
+            service.fill_missing(
+                db,
+                schemas.GenerateWorkplans(
+                    name=f"bench_load_{i}",
+                    start_time=start_time,
+                    interval_in_seconds=86400,
+                ),
+            )
+
+
+async def client(http: httpx.AsyncClient, i: int, count: int, stats: dict):
+    name = f"bench_load_{i % NAMES}"
+    query = {
+        "filter": {"name": [{"value": name, "operator": "="}]},
+        "limit": 100,
+    }
+    for n in range(count):
+        start = time.perf_counter()
+        try:
+            if n % 2:
+                response = await http.post("/workplan/list", json=query)
+            else:
+                response = await http.get(f"/workplan/execute/{name}/list")
+        except httpx.TransportError:
+            stats["errors"] += 1
+            continue
+
+        if response.status_code == 200:
+            stats["latencies"].append(time.perf_counter() - start)
+        else:
+            stats["errors"] += 1
+
+
+async def load(clients: int, count: int) -> dict:
+    stats = {"latencies": [], "errors": 0}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=300
+    ) as http:
+        await asyncio.gather(*(client(http, i, count, stats) for i in range(clients)))
+
+    return stats
+
+
+def serve(async_api: bool) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WORKPLANNER_ASYNC_API=str(async_api),
+        WORKPLANNER_LOGLEVEL="ERROR",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "workplanner.app:app"]
+        + ["--port", str(PORT), "--log-level", "error", "--no-access-log"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/docs")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+    server.kill()
+    raise RuntimeError("The server did not start")
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def main(clients, count):
+    from workplanner import service  # noqa: F401 configures the logger first
+
+    common.silence_logs()
+    prepare()
+
+    print(
+        f"{'stack':>6} {'clients':>8} {'rps':>8} {'p50, ms':>9} {'p99, ms':>9}"
+        f" {'errors':>7}"
+    )
+    for async_api in (False, True):
+        server = serve(async_api)
+        try:
+            start = time.perf_counter()
+            stats = asyncio.run(load(clients, count))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies = stats["latencies"]
+        print(
+            f"{'async' if async_api else 'sync':>6} {clients:>8}"
+            f" {len(latencies) / elapsed:>8.0f}"
+            f" {percentile(latencies, 50) * 1000:>9.1f}"
+            f" {percentile(latencies, 99) * 1000:>9.1f}"
+            f" {stats['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else CLIENTS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else REQUESTS_PER_CLIENT,
+    )
@@ -0,0 +1,106 @@
+"""
+recreate_prev with a long list of back_restarts, every third offset is skipped:
+the quadratic grouping, a DELETE and one fill_missing per run
+versus an in-place reset UPDATE and an INSERT of the missing worktimes.
+
+    python -m benchmarks.bench_recreate_prev [SIZE ...]
+"""
+import datetime as dt
+import sys
+
+import pendulum
+from script_master_helper.workplanner import schemas
+
+from benchmarks import common
+from workplanner import crud
+from workplanner.utils import iter_period_from_range
+
+SIZES = (1_000, 100_000)
+# The legacy version needs hours for larger sizes,
+# and its DELETE ... IN exceeds the number of SQLite parameters.
+LEGACY_MAX_SIZE = 10_000
+
+
+def legacy_iter_period_from_range(datetimes, interval_timedelta, length=None):
+    datetimes = sorted(set(datetimes))
+    while datetimes:
+        date1 = datetimes.pop(0)
+        date2 = date1
+        i = 1
+        while datetimes:
+            i += 1
+            date = date2 + interval_timedelta
+            if date in datetimes and (length is None or i <= length):
+                date2 = datetimes.pop(datetimes.index(date))
+            else:
+                break
+
+        yield date1, date2
+
+
+def legacy_recreate_prev(db, schema, worktime_list):
+    from workplanner import service
+
+    db.execute(crud.delete(schema.name, worktimes=worktime_list))
+    items = []
+    for date1, date2 in legacy_iter_period_from_range(
+        worktime_list, schema.interval_timedelta
+    ):
+        items.extend(service.fill_missing(db, schema, start_time=date1, end_time=date2))
+
+    return items
+
+
+def main(sizes):
+    from workplanner import service
+
+    common.silence_logs()
+    start_time = pendulum.datetime(2000, 1, 1)
+    interval = dt.timedelta(hours=1)
+    print(
+        f"{'worktimes':>10} {'legacy grouping, s':>19} {'grouping, s':>12}"
+        f" {'legacy recreate, s':>19} {'recreate, s':>12}"
+    )
+    for size in sizes:
+        engine = common.create_engine("bench_recreate_prev.db")
+        schema = schemas.GenerateWorkplans(
+            name="bench_recreate_prev",
+            start_time=start_time,
+            interval_in_seconds=int(interval.total_seconds()),
+            back_restarts=[-i for i in range(1, size + 1) if i % 3],
+            extra=schemas.GenerateWorkplans.Extra(status="QUEUE"),
+        )
+        last_wt = start_time + interval * (size - 1)
+        worktime_list = [last_wt + interval * (i + 1) for i in schema.back_restarts]
+        with common.session(engine) as db, db.begin():
+            service.fill_missing(db, schema, end_time=last_wt)
+
+        results = {}
+        with common.timer(results, "grouping"):
+            list(iter_period_from_range(worktime_list, interval))
+        with common.session(engine) as db, db.begin():
+            with common.timer(results, "recreate"):
+                items = service.recreate_prev(db, schema, from_worktime=last_wt)
+            assert len(items) == len(worktime_list)
+
+        if size <= LEGACY_MAX_SIZE:
+            with common.timer(results, "legacy grouping"):
+                list(legacy_iter_period_from_range(worktime_list, interval))
+            with common.session(engine) as db, db.begin():
+                with common.timer(results, "legacy recreate"):
+                    items = legacy_recreate_prev(db, schema, worktime_list)
+                assert len(items) == len(worktime_list)
+
+        def cell(key, width):
+            return (
+                f"{results[key]:>{width}.3f}" if key in results else f"{'-':>{width}}"
+            )
+
+        print(
+            f"{size:>10} {cell('legacy grouping', 19)} {cell('grouping', 12)}"
+            f" {cell('legacy recreate', 19)} {cell('recreate', 12)}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
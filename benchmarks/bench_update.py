@@ -0,0 +1,64 @@
+"""
+/workplan/update/list: one UPDATE ... RETURNING per item versus grouped executemany.
+
+    python -m benchmarks.bench_update [SIZE ...]
+"""
+import sys
+
+import pendulum
+from script_master_helper.workplanner import schemas
+from script_master_helper.workplanner.enums import Statuses
+
+from benchmarks import common
+from workplanner.models import Workplan
+
+SIZES = (1_000, 10_000)
+
+
+def run(size):
+    from workplanner import service
+
+    engine = common.create_engine("bench_update.db")
+    name = "bench_update"
+    with common.session(engine) as db, db.begin():
+        start_time = pendulum.datetime(2000, 1, 1)
+        workplans = service.fill_missing(
+            db,
+            schemas.GenerateWorkplans(
+                name=name, start_time=start_time, interval_in_seconds=60
+            ),
+            end_time=start_time.add(minutes=size - 1),
+        )
+    ids = [wp.id for wp in workplans]
+
+    results = {}
+    for key, status in (("legacy", Statuses.run), ("bulk", Statuses.success)):
+        schema_list = [
+            schemas.WorkplanUpdate(id=id_, status=status, info=key) for id_ in ids
+        ]
+        with common.session(engine) as db, db.begin():
+            with common.timer(results, key):
+                if key == "legacy":
+                    for schema in schema_list:
+                        service.update(db, schema)
+                else:
+                    assert service.many_update(db, schema_list) == size
+
+        with common.session(engine) as db:
+            assert db.query(Workplan).filter(Workplan.status == status).count() == size
+
+    return results
+
+
+def main(sizes):
+    from workplanner import service  # noqa: F401 configures the logger first
+
+    common.silence_logs()
+    print(f"{'rows':>10} {'legacy, s':>10} {'bulk, s':>10}")
+    for size in sizes:
+        results = run(size)
+        print(f"{size:>10} {results['legacy']:>10.2f} {results['bulk']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -0,0 +1,40 @@
+"""
+Latency of finding the last worktime depending on the length of the history.
+
+    python -m benchmarks.bench_worktime
+"""
+import datetime as dt
+import timeit
+
+import pendulum
+
+from workplanner import worktime
+from workplanner.utils import iter_range_datetime
+
+INTERVAL = dt.timedelta(minutes=1)
+HISTORY_DAYS = (1, 30, 365, 730)
+
+
+def legacy_last_slot(start_time, interval_timedelta):
+    return list(iter_range_datetime(start_time, pendulum.now(), interval_timedelta))[-1]
+
+
+def bench(func, start_time, number):
+    return timeit.timeit(lambda: func(start_time, INTERVAL), number=number) / number
+
+
+def main():
+    now = pendulum.now()
+    print(f"{'history':>10} {'slots':>10} {'legacy, ms':>12} {'worktime, us':>14}")
+    for days in HISTORY_DAYS:
+        start_time = now.subtract(days=days).start_of("minute")
+        slots = worktime.count_slots(start_time, now, INTERVAL)
+        legacy = bench(legacy_last_slot, start_time, number=1)
+        current = bench(worktime.last_slot, start_time, number=10_000)
+        print(
+            f"{days:>8} d {slots:>10} {legacy * 1000:>12.1f} {current * 1_000_000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import orjson
+import sqlalchemy as sa
+from script_master_helper.utils import custom_encoder
+from sqlalchemy.orm import Session
+
+from workplanner import const
+
+# Importing the service requires a home directory for settings and logs.
+os.environ.setdefault(const.HOME_DIR_VARNAME, tempfile.mkdtemp(prefix="workplanner-"))
+
+
+def homedir() -> Path:
+    return const.get_homepath()
+
+
+def silence_logs():
+    from loguru import logger
+
+    # The sink still formats every message, so logging costs are kept.
+    logger.configure(handlers=[{"sink": lambda message: None, "level": "INFO"}])
+
+
+def create_engine(filename: str, **kwargs) -> sa.Engine:
+    from workplanner import migrations
+
+    path = homedir() / filename
+    path.unlink(missing_ok=True)
+    engine = sa.create_engine(
+        f"sqlite:///{path}",
+        json_serializer=lambda obj: orjson.dumps(obj, default=custom_encoder),
+        **kwargs,
+    )
+    migrations.migrate(engine)
+
+    return engine
+
+
+def session(engine: sa.Engine) -> Session:
+    return Session(engine, autoflush=False, expire_on_commit=False)
+
+
+@contextlib.contextmanager
+def timer(results: dict, key):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
@@ -8,7 +8,7 @@ from script_master_helper.utils import custom_encoder
 from sqlalchemy import orm
 from sqlalchemy.orm import Session
 
-from workplanner import const
+from workplanner import const, database, migrations
 from workplanner.models import Base
 
 TestSession = orm.scoped_session(
@@ -37,11 +37,26 @@ def configure_database(homedir):
     TestSession.configure(bind=engine)
 
     Base.metadata.drop_all(engine)
-    Base.metadata.create_all(engine)
+    migrations.migrate(engine)
 
     return engine
 
 
+@pytest.fixture()
+def file_session_factory(tmp_path) -> orm.sessionmaker:
+    """A database of the test in a file, for commits and concurrent connections."""
+    engine = sqlalchemy.create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        json_serializer=lambda obj: orjson.dumps(obj, default=custom_encoder),
+    )
+    database.set_sqlite_pragmas(engine, {"journal_mode": "WAL", "busy_timeout": 30000})
+    migrations.migrate(engine)
+
+    yield orm.sessionmaker(engine)
+
+    engine.dispose()
+
+
 @pytest.fixture(scope="function")
 def session() -> Session:
     db = TestSession()
@@ -52,6 +67,24 @@ def session() -> Session:
         db.rollback()
 
 
+@pytest.fixture()
+def queries(configure_database) -> list[str]:
+    """SQL statements executed during the test, without savepoints."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if not statement.startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+            statements.append(statement)
+
+    sqlalchemy.event.listen(
+        configure_database, "before_cursor_execute", before_cursor_execute
+    )
+    yield statements
+    sqlalchemy.event.remove(
+        configure_database, "before_cursor_execute", before_cursor_execute
+    )
+
+
 @pytest.fixture()
 def freeze_time() -> pendulum.DateTime:
     now = pendulum.datetime(2022, 11, 11, 11, 11, 0, 0, tz="UTC")
@@ -1,9 +1,16 @@
+import base64
+import uuid
+
+import orjson
 import pendulum
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
 from script_master_helper.workplanner.enums import Operators, Statuses
 from script_master_helper.workplanner.schemas import WorkplanQuery
 
 from tests.factories import WorkplanFactory
-from workplanner import crud
+from workplanner import crud, schemas
 from workplanner.models import Workplan
 
 
@@ -55,6 +62,67 @@ def test_not_in_QueryFilter(session):
     assert session.scalars(query).all() == [wp3.id]
 
 
+def test_count_QueryFilter(session):
+    WorkplanFactory.create_many(5, name="test_count_QueryFilter")
+    WorkplanFactory.create_many(3, name="test_count_QueryFilter2")
+    schema = WorkplanQuery(
+        filter=WorkplanQuery.Filter(
+            name=[WorkplanQuery.Value(value="test_count_QueryFilter")]
+        ),
+        order_by=["worktime_utc"],
+        limit=2,
+        page=2,
+    )
+    query = crud.QueryFilter(schema).get_count_query()
+
+    assert session.scalar(query) == 5
+
+
+def test_cursor_QueryFilter(session):
+    name = "test_cursor_QueryFilter"
+    wp_list = WorkplanFactory.create_many(5, name=name, status=Statuses.queue)
+    WorkplanFactory.create_many(5, name="test_cursor_QueryFilter2")
+    wp_list[1].status = Statuses.add
+    session.flush()
+    cursor = ""
+    pages = []
+
+    while cursor is not None:
+        query_filter = crud.QueryFilter(
+            schemas.WorkplanQuery(
+                filter=WorkplanQuery.Filter(name=[WorkplanQuery.Value(value=name)]),
+                order_by=["status"],
+                limit=2,
+                cursor=cursor,
+            )
+        )
+        items = session.scalars(query_filter.get_query_with_filter()).all()
+        pages.append([i.id for i in items])
+        cursor = query_filter.next_cursor(items)
+
+    assert pages == [
+        [wp_list[1].id, wp_list[0].id],
+        [wp_list[2].id, wp_list[3].id],
+        [wp_list[4].id],
+    ]
+
+
+@pytest.mark.parametrize(
+    "values", [[1, 2], [None, None], ["name", "not a date"], ["name", 5]]
+)
+def test_cursor_QueryFilter_wrong_types(values):
+    query_filter = crud.QueryFilter(
+        schemas.WorkplanQuery(
+            filter=WorkplanQuery.Filter(),
+            limit=2,
+            cursor=base64.urlsafe_b64encode(orjson.dumps(values)).decode(),
+        )
+    )
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        query_filter.get_query_with_filter()
+
+
 def test_get_by_id(session):
     wp = WorkplanFactory()
     WorkplanFactory()
@@ -112,3 +180,22 @@ def test_reset(session):
         assert wp.retries == 0
         assert wp.started_utc == None
         assert wp.finished_utc == None
+
+
+def test_claim_skip_locked():
+    now = pendulum.now()
+    query = crud.claim("postgresql", ["name"], 10, "owner", now, now)
+
+    assert "FOR UPDATE SKIP LOCKED" in str(query.compile(dialect=postgresql.dialect()))
+    assert "SKIP LOCKED" not in str(
+        crud.claim("sqlite", ["name"], 10, "owner", now, now)
+    )
+
+
+def test_uuid_expr(session):
+    query = sa.select(sa.type_coerce(crud.uuid_expr("sqlite"), sa.Uuid))
+    ids = {session.scalar(query) for _ in range(100)}
+
+    assert len(ids) == 100
+    # The same as the ids of uuid.uuid4, the default of the model.
+    assert {(i.version, i.variant) for i in ids} == {(4, uuid.RFC_4122)}
@@ -0,0 +1,26 @@
+import sqlalchemy as sa
+
+from workplanner import database
+
+
+def test_set_sqlite_pragmas(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    database.set_sqlite_pragmas(
+        engine,
+        {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 1234},
+    )
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234
+
+
+def test_engine_options():
+    options = database.engine_options("sqlite:///workplanner.db")
+
+    assert options["pool_size"] == 5
+    assert options["max_overflow"] == 10
+    assert options["pool_pre_ping"] is True
+    assert "pool_size" not in database.engine_options("sqlite://")
+    sa.create_engine("sqlite://", **database.engine_options("sqlite://")).dispose()
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import sqlalchemy as sa
+
+from tests.factories import WorkplanFactory
+from workplanner import events, service
+
+
+def test_event_bus():
+    bus = events.EventBus()
+
+    async def main():
+        subscription = bus.subscribe(["a", "b"])
+        everything = bus.subscribe()
+        # Published from another thread, before anybody reads.
+        thread = threading.Thread(
+            target=lambda: [bus.publish(["a"]), bus.publish("bc")]
+        )
+        thread.start()
+        thread.join()
+        received = await subscription.get(timeout=1)
+        received_all = await everything.get(timeout=1)
+        bus.unsubscribe(subscription)
+        bus.publish(["a"])
+        idle = await subscription.get(timeout=0.01)
+
+        return received, received_all, idle
+
+    assert asyncio.run(main()) == ({"a", "b"}, {"a", "b", "c"}, set())
+
+
+def test_published_after_commit(file_session_factory, monkeypatch):
+    bus = events.EventBus()
+    monkeypatch.setattr(events, "bus", bus)
+
+    async def main():
+        subscription = bus.subscribe()
+        with file_session_factory() as db:
+            db.execute(sa.select(1))
+            events.notify(db, "rolled_back")
+            db.rollback()
+            events.notify(db, "committed")
+            assert await subscription.get(timeout=0.01) == set()
+            db.commit()
+
+        return await subscription.get(timeout=1)
+
+    assert asyncio.run(main()) == {"committed"}
+
+
+def test_run_notifies(session):
+    wp = WorkplanFactory()
+
+    service.run(session, wp.id)
+
+    assert session.info[events.PENDING_KEY] == {wp.name}
+    session.info.pop(events.PENDING_KEY)
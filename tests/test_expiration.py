@@ -0,0 +1,54 @@
+import pendulum
+import sqlalchemy as sa
+from script_master_helper.workplanner.enums import Statuses, Error
+
+from workplanner.expiration import ExpirationSweeper
+from workplanner.models import Workplan
+
+
+def test_expiration_sweeper(file_session_factory):
+    freeze_time = pendulum.datetime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+
+    with file_session_factory.begin() as db:
+        for i, status in enumerate(
+            [Statuses.add, Statuses.queue, Statuses.run, Statuses.success]
+        ):
+            db.add(
+                Workplan(
+                    name="test_expiration_sweeper",
+                    worktime_utc=freeze_time.add(minutes=i),
+                    status=status,
+                    expires_utc=freeze_time.add(minutes=-1),
+                )
+            )
+        db.add(
+            Workplan(
+                name="test_expiration_sweeper",
+                worktime_utc=freeze_time.add(minutes=10),
+                expires_utc=freeze_time.add(minutes=1),
+            )
+        )
+
+    sweeper = ExpirationSweeper(file_session_factory, interval=60, batch_size=2)
+
+    assert sweeper.sweep() == 3
+    assert sweeper.sweep() == 0
+
+    pendulum.set_test_now(freeze_time.add(minutes=1))
+
+    assert sweeper.sweep() == 1
+    assert sweeper.stats()["sweeps"] == 3
+    assert sweeper.stats()["total_expired"] == 4
+    with file_session_factory() as db:
+        statuses = db.execute(
+            sa.select(Workplan.status, Workplan.info).order_by(Workplan.worktime_utc)
+        ).all()
+
+    assert statuses == [
+        (Statuses.error, Error.expired),
+        (Statuses.error, Error.expired),
+        (Statuses.error, Error.expired),
+        (Statuses.success, None),
+        (Statuses.error, Error.expired),
+    ]
@@ -0,0 +1,58 @@
+import asyncio
+import csv
+import io
+
+import orjson
+
+from tests.factories import WorkplanFactory
+from workplanner import export
+
+
+def test_iter_ndjson(session):
+    wp_list = WorkplanFactory.create_many(3, data={"key": "value"})
+
+    chunks = list(export.iter_ndjson([wp_list[:2], wp_list[2:]]))
+    rows = [orjson.loads(line) for line in b"".join(chunks).splitlines()]
+
+    assert len(chunks) == 2
+    assert [row["id"] for row in rows] == [str(wp.id) for wp in wp_list]
+    assert rows[0]["data"] == {"key": "value"}
+
+
+def test_iter_csv(session):
+    wp_list = WorkplanFactory.create_many(3, data={"key": "value"})
+
+    chunks = list(export.iter_csv([wp_list[:2], wp_list[2:]]))
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+
+    assert len(chunks) == 2
+    assert [row["id"] for row in rows] == [str(wp.id) for wp in wp_list]
+    assert orjson.loads(rows[0]["data"]) == {"key": "value"}
+
+
+def test_iter_csv_empty():
+    assert list(export.iter_csv([])) == [",".join(export.FIELDS) + "\r\n"]
+
+
+def test_aiter_generated(session):
+    a = WorkplanFactory.create_many(2, name="a")
+    b = WorkplanFactory.create_many(1, name="b")
+
+    async def items():
+        for item in [*a, *b]:
+            yield item
+
+    async def main():
+        return [line async for line in export.aiter_generated(["c", "a", "b"], items())]
+
+    lines = [orjson.loads(line) for line in asyncio.run(main())]
+
+    assert [(line["name"], len(line["workplans"])) for line in lines] == [
+        ("a", 2),
+        ("b", 1),
+        ("c", 0),
+    ]
+    assert lines == [
+        orjson.loads(line)
+        for line in export.iter_generated([("a", a), ("b", b), ("c", [])])
+    ]
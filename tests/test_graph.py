@@ -0,0 +1,137 @@
+import pendulum
+import pytest
+import sqlalchemy as sa
+from script_master_helper.workplanner.enums import Statuses
+
+from tests.factories import WorkplanFactory
+from workplanner import crud, schemas, service
+from workplanner.models import Workplan, WorkplanEdge
+
+
+def edge(parent_name, name, **kwargs) -> schemas.WorkplanEdge:
+    return schemas.WorkplanEdge(parent_name=parent_name, name=name, **kwargs)
+
+
+def worktimes(db, name) -> list[int]:
+    query = crud.get_by_name(name).order_by(Workplan.worktime_utc)
+
+    return [i.worktime_utc.minute for i in db.scalars(query)]
+
+
+def test_graph_levels():
+    edges = [("b", "c"), ("a", "b"), ("a", "c"), ("x", "y")]
+
+    assert service.graph_levels(edges) == [["b", "y"], ["c"]]
+    with pytest.raises(ValueError, match="cycle"):
+        service.graph_levels([*edges, ("c", "a")])
+
+
+def test_generate_graph_chain(session):
+    freeze_time = pendulum.datetime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+
+    name = "test_generate_graph_chain"
+    WorkplanFactory.create_many(3, 60, name=name, status=Statuses.success)
+    service.save_edges(
+        session,
+        [
+            edge(f"{name}_2", f"{name}_3", status_trigger=Statuses.success),
+            edge(name, f"{name}_2", extra=dict(hash="2", status=Statuses.success)),
+        ],
+    )
+
+    items = service.generate_graph(session)
+
+    # The children of the second level are triggered by the ones just created.
+    assert [(i.name, i.worktime_utc.minute) for i in items] == [
+        (f"{name}_2", 1),
+        (f"{name}_2", 2),
+        (f"{name}_2", 3),
+        (f"{name}_3", 1),
+        (f"{name}_3", 2),
+        (f"{name}_3", 3),
+    ]
+    assert {(i.hash, i.status) for i in items[:3]} == {("2", Statuses.success)}
+    assert {(i.hash, i.status) for i in items[3:]} == {(None, Statuses.add)}
+    assert service.generate_graph(session) == []
+
+
+def test_generate_graph_waits_for_all_parents(session):
+    freeze_time = pendulum.datetime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+
+    name = "test_generate_graph_waits_for_all_parents"
+    WorkplanFactory.create_many(3, 60, name=f"{name}_a", status=Statuses.success)
+    b = WorkplanFactory.create_many(3, 60, name=f"{name}_b", status=Statuses.add)
+    b[0].status = Statuses.success
+    session.flush()
+    service.save_edges(session, [edge(f"{name}_a", name), edge(f"{name}_b", name)])
+
+    assert [i.worktime_utc.minute for i in service.generate_graph(session)] == [1]
+
+    b[2].status = Statuses.success
+    session.flush()
+
+    assert [i.worktime_utc.minute for i in service.generate_graph(session)] == [3]
+    assert worktimes(session, name) == [1, 3]
+
+
+def test_generate_graph_high_water(session):
+    freeze_time = pendulum.datetime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+
+    name = "test_generate_graph_high_water"
+    parents = WorkplanFactory.create_many(
+        3, 60, name=f"{name}_parent", status=Statuses.success
+    )
+    service.save_edges(session, [edge(f"{name}_parent", name)])
+    later = freeze_time.add(hours=1)
+
+    assert len(service.generate_graph(session)) == 3
+    # The parents updated during the overlap are scanned again.
+    assert service.generate_graph(session, now=later) == []
+    edges = session.scalars(crud.get_edges().where(WorkplanEdge.name == name)).all()
+    assert [e.high_water_utc for e in edges] == [later.subtract(minutes=1)]
+
+    session.execute(
+        sa.delete(Workplan).where(
+            Workplan.name == name, Workplan.worktime_utc < parents[2].worktime_utc
+        )
+    )
+    # The parents have not changed since the previous pass, they are not scanned.
+    assert service.generate_graph(session, now=later) == []
+
+    session.execute(
+        sa.update(Workplan)
+        .where(Workplan.id == parents[0].id)
+        .values(updated_utc=later)
+    )
+    items = service.generate_graph(session, now=later)
+
+    assert [i.worktime_utc.minute for i in items] == [1]
+
+    # A changed edge scans all parents again.
+    service.save_edges(session, [edge(f"{name}_parent", name, extra=dict(hash="1"))])
+    items = service.generate_graph(session, now=later)
+
+    assert [i.worktime_utc.minute for i in items] == [2]
+
+
+def test_save_edges(session):
+    name = "test_save_edges"
+    schema_list = [edge(f"{name}_a", f"{name}_b"), edge(f"{name}_b", f"{name}_c")]
+
+    assert service.save_edges(session, schema_list) == 2
+    assert service.save_edges(session, schema_list[:1]) == 1
+    assert service.get_edges(session) == schema_list
+    with pytest.raises(ValueError, match="cycle"):
+        service.save_edges(session, [edge(f"{name}_c", f"{name}_a")])
+
+    pks = [schemas.WorkplanEdgePK(parent_name=f"{name}_a", name=f"{name}_b")]
+    assert service.delete_edges(session, pks) == 1
+    assert service.get_edges(session) == schema_list[1:]
+
+
+def test_edge_status_trigger():
+    with pytest.raises(ValueError):
+        edge("a", "b", status_trigger="UNKNOWN")
@@ -0,0 +1,115 @@
+import contextlib
+
+import pendulum
+import pytest
+import sqlalchemy as sa
+from script_master_helper.workplanner.enums import Statuses
+
+from workplanner import crud, migrations, schemas
+from workplanner.models import Base, Workplan, WorkplanEdge
+
+
+@contextlib.contextmanager
+def explain(engine):
+    """Statements are replaced with their EXPLAIN QUERY PLAN."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        return f"EXPLAIN QUERY PLAN {statement}", parameters
+
+    sa.event.listen(engine, "before_cursor_execute", before_cursor_execute, retval=True)
+    try:
+        yield
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture()
+def analyzed(session, configure_database):
+    # Mostly finished workplans, like in a database with history.
+    now = pendulum.now()
+    rows = [
+        {
+            "name": f"test_indexes_{n}",
+            "worktime_utc": now.add(minutes=i),
+            "status": Statuses.success if i < 190 else Statuses.add,
+            "expires_utc": now.add(days=1) if i % 3 else None,
+            "hash": "hash",
+        }
+        for n in range(10)
+        for i in range(200)
+    ]
+    session.execute(crud.insert_workplans("sqlite", rows))
+    session.execute(sa.text("ANALYZE"))
+
+    return session
+
+
+def query_plan(session, engine, query) -> str:
+    with explain(engine):
+        plan = session.connection().execute(query).cursor.fetchall()
+
+    return "\n".join(row[-1] for row in plan)
+
+
+@pytest.mark.parametrize(
+    "query,index",
+    [
+        (crud.executable("test_indexes_1"), "ix_workplans_executable"),
+        (
+            crud.claim("sqlite", ["test_indexes_1"], 1, "owner", pendulum.now(), None),
+            "ix_workplans_executable",
+        ),
+        (crud.expire(limit=10), "ix_workplans_active_expires_utc"),
+        (
+            crud.release_expired_leases(limit=10),
+            "ix_workplans_running_lease_expires_utc",
+        ),
+        (
+            crud.generate_state("test_indexes_1", "hash"),
+            # Primary key of the counters.
+            "sqlite_autoindex_workplan_fatal_errors_1",
+        ),
+        (
+            sa.select(Workplan).filter(
+                Workplan.name == "test_indexes_1",
+                Workplan.status.in_(Statuses.error_statuses),
+            ),
+            "ix_workplans_name_status_worktime_utc",
+        ),
+        (
+            crud.insert_children(
+                "sqlite", "test_indexes_child", "test_indexes_1", Statuses.success
+            ),
+            "ix_workplans_name_status_worktime_utc",
+        ),
+        (
+            crud.insert_graph_children(
+                "sqlite",
+                {
+                    "test_indexes_child": [
+                        WorkplanEdge(
+                            parent_name="test_indexes_1",
+                            name="test_indexes_child",
+                            status_trigger=Statuses.success,
+                            high_water_utc=pendulum.now(),
+                        )
+                    ]
+                },
+                {"test_indexes_child": {}},
+            ),
+            "ix_workplans_name_updated_utc",
+        ),
+    ],
+)
+def test_query_uses_index(analyzed, configure_database, query, index):
+    assert f"INDEX {index} " in query_plan(analyzed, configure_database, query)
+
+
+def test_ensure_indexes(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'indexes.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_workplans_executable")
+
+    assert migrations.ensure_indexes(engine) == ["ix_workplans_executable"]
+    assert migrations.ensure_indexes(engine) == []
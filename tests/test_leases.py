@@ -0,0 +1,58 @@
+import pendulum
+import sqlalchemy as sa
+from script_master_helper.workplanner.enums import Statuses
+
+from workplanner.leases import LeaseReaper
+from workplanner.models import Workplan
+
+
+def test_lease_reaper(file_session_factory):
+    freeze_time = pendulum.datetime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+
+    with file_session_factory.begin() as db:
+        for i, (status, lease_minutes) in enumerate(
+            [
+                (Statuses.run, -1),
+                (Statuses.run, -2),
+                (Statuses.run, 1),
+                (Statuses.success, -1),
+                (Statuses.run, None),
+            ]
+        ):
+            db.add(
+                Workplan(
+                    name="test_lease_reaper",
+                    worktime_utc=freeze_time.add(minutes=i),
+                    status=status,
+                    lease_owner=None if lease_minutes is None else "runner",
+                    lease_expires_utc=None
+                    if lease_minutes is None
+                    else freeze_time.add(minutes=lease_minutes),
+                )
+            )
+
+    reaper = LeaseReaper(file_session_factory, interval=60, batch_size=1)
+
+    assert reaper.sweep() == 2
+    assert reaper.sweep() == 0
+
+    pendulum.set_test_now(freeze_time.add(minutes=1))
+
+    assert reaper.sweep() == 1
+    assert reaper.stats()["sweeps"] == 3
+    assert reaper.stats()["total_released"] == 3
+    with file_session_factory() as db:
+        rows = db.execute(
+            sa.select(Workplan.status, Workplan.lease_owner).order_by(
+                Workplan.worktime_utc
+            )
+        ).all()
+
+    assert rows == [
+        (Statuses.add, None),
+        (Statuses.add, None),
+        (Statuses.add, None),
+        (Statuses.success, "runner"),
+        (Statuses.run, None),
+    ]
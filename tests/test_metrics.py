@@ -0,0 +1,131 @@
+import pendulum
+import pytest
+import sqlalchemy as sa
+from script_master_helper.workplanner.enums import Statuses
+from script_master_helper.workplanner.schemas import GenerateWorkplans
+
+from tests.factories import WorkplanFactory
+from workplanner import database, metrics, service
+
+
+@pytest.fixture()
+def registry() -> metrics.Registry:
+    return metrics.Registry()
+
+
+def test_render(registry):
+    counter = metrics.Counter("test_total", "Counter.", ["name"], registry=registry)
+    gauge = metrics.Gauge("test_gauge", "Gauge.", registry=registry)
+    counter.inc(name='a"b')
+    counter.inc(2, name='a"b')
+    counter.inc(name="c\\d\n")
+    gauge.set(1.5)
+
+    assert registry.render() == (
+        "# HELP test_total Counter.\n"
+        "# TYPE test_total counter\n"
+        'test_total{name="a\\"b"} 3.0\n'
+        'test_total{name="c\\\\d\\n"} 1.0\n'
+        "# HELP test_gauge Gauge.\n"
+        "# TYPE test_gauge gauge\n"
+        "test_gauge 1.5\n"
+    )
+    with pytest.raises(ValueError):
+        counter.inc(-1, name="a")
+    with pytest.raises(ValueError):
+        counter.inc(other="a")
+    with pytest.raises(ValueError):
+        metrics.Counter("test_total", "Counter.", registry=registry)
+
+
+def test_histogram(registry):
+    histogram = metrics.Histogram(
+        "test_seconds", "Histogram.", ["route"], registry=registry, buckets=[1, 0.1]
+    )
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value, route="/a")
+
+    assert registry.render().splitlines()[2:] == [
+        'test_seconds_bucket{route="/a",le="0.1"} 2.0',
+        'test_seconds_bucket{route="/a",le="1.0"} 3.0',
+        'test_seconds_bucket{route="/a",le="+Inf"} 4.0',
+        'test_seconds_sum{route="/a"} 2.65',
+        'test_seconds_count{route="/a"} 4.0',
+    ]
+
+
+def test_gauge_replace(registry):
+    gauge = metrics.Gauge("test_gauge", "Gauge.", ["status"], registry=registry)
+    gauge.replace({("a",): 1, ("b",): 2})
+    gauge.replace({("b",): 3})
+
+    assert registry.render().splitlines()[2:] == ['test_gauge{status="b"} 3.0']
+
+
+def test_set_status_counts(session):
+    name = "test_set_status_counts"
+    WorkplanFactory(name=name, status=Statuses.success)
+    counts = service.status_counts(session)
+
+    metrics.set_status_counts(counts)
+
+    lines = metrics.WORKPLANS.render().splitlines()
+    assert f'workplanner_workplans{{status="{Statuses.success}"}} ' in "\n".join(lines)
+    # Statuses without workplans are reported too.
+    assert len(lines) - 2 >= len(Statuses.all_statuses)
+    assert counts[Statuses.success] >= 1
+
+
+def test_instrument_queries(registry, monkeypatch):
+    histogram = metrics.Histogram(
+        "test_db_seconds", "Queries.", ["operation"], registry=registry
+    )
+    monkeypatch.setattr(metrics, "DB_QUERY_DURATION", histogram)
+    engine = sa.create_engine("sqlite://")
+    database.instrument_queries(engine)
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (id INTEGER)")
+        conn.execute(sa.text("INSERT INTO t VALUES (:id)"), [{"id": 1}, {"id": 2}])
+        conn.execute(sa.text("select * from t"))
+
+    rendered = registry.render()
+    assert 'test_db_seconds_count{operation="CREATE"} 1.0' in rendered
+    assert 'test_db_seconds_count{operation="INSERT"} 1.0' in rendered
+    assert 'test_db_seconds_count{operation="SELECT"} 1.0' in rendered
+
+
+def created(source: str) -> float:
+    return metrics.WORKPLANS_CREATED._values.get((source,), 0)
+
+
+def test_workplans_created(session):
+    pendulum.set_test_now(pendulum.datetime(2022, 1, 10))
+    schema = GenerateWorkplans(
+        name="test_workplans_created",
+        start_time=pendulum.datetime(2022, 1, 10).subtract(minutes=2),
+        interval_in_seconds=60,
+    )
+    before = created("fill_missing")
+    service.fill_missing(session, schema)
+
+    assert created("fill_missing") - before == 3
+
+
+def test_generate_workplans_created(session):
+    pendulum.set_test_now(pendulum.datetime(2022, 1, 10))
+    schema = GenerateWorkplans(
+        name="test_generate_workplans_created",
+        start_time=pendulum.datetime(2022, 1, 10).subtract(minutes=2),
+        interval_in_seconds=60,
+    )
+
+    before = created("generate_workplans")
+    list(service.generate_workplans(session, schema))
+
+    assert created("generate_workplans") - before == 1
+
+    pendulum.set_test_now(pendulum.datetime(2022, 1, 10).add(minutes=1))
+    list(service.generate_workplans(session, schema))
+
+    assert created("generate_workplans") - before == 2
@@ -0,0 +1,214 @@
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from workplanner import migrations, models
+from workplanner.models import (
+    Workplan,
+    WorkplanFatalErrors,
+    WorkplanName,
+    WorkplanStatusCount,
+)
+
+# The workplans table of the databases created before the lease columns.
+OLD_WORKPLANS_DDL = [
+    """
+    CREATE TABLE workplans (
+        name VARCHAR(100) NOT NULL,
+        worktime_utc DATETIME NOT NULL,
+        id CHAR(32) NOT NULL,
+        status VARCHAR(30) NOT NULL,
+        hash VARCHAR(30),
+        retries INTEGER NOT NULL,
+        info VARCHAR,
+        data JSON NOT NULL,
+        expires_utc DATETIME,
+        started_utc DATETIME,
+        finished_utc DATETIME,
+        created_utc DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        updated_utc DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        PRIMARY KEY (name, worktime_utc)
+    )
+    """,
+    "CREATE UNIQUE INDEX ix_workplans_id ON workplans (id)",
+    "CREATE INDEX ix_workplans_status ON workplans (status)",
+    "CREATE INDEX ix_workplans_status_expires_utc ON workplans (status, expires_utc)",
+    """
+    INSERT INTO workplans (name, worktime_utc, id, status, retries, data)
+    VALUES ('a', '2022-01-01 00:00:00.000000', '1234', 'CRITICAL', 0, '{}')
+    """,
+]
+
+
+def create_old_database(tmp_path) -> sa.Engine:
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for ddl in OLD_WORKPLANS_DDL:
+            conn.exec_driver_sql(ddl)
+
+    return engine
+
+
+def test_migrate_old_database(tmp_path):
+    engine = create_old_database(tmp_path)
+
+    assert migrations.migrate(engine) == [
+        "0001",
+        "0002",
+        "0003",
+        "0004",
+        "0005",
+        "0006",
+    ]
+    assert migrations.migrate(engine) == []
+
+    inspector = sa.inspect(engine)
+    assert {"lease_owner", "lease_expires_utc"} <= {
+        c["name"] for c in inspector.get_columns("workplans")
+    }
+    assert {ix["name"] for ix in inspector.get_indexes("workplans")} == {
+        ix.name for ix in Workplan.__table__.indexes
+    }
+    assert inspector.has_table("workplan_definitions")
+    with engine.connect() as conn:
+        # The history is counted.
+        assert conn.execute(sa.select(WorkplanFatalErrors)).all() == [("a", "", 1)]
+        assert conn.execute(sa.select(WorkplanStatusCount)).all() == [
+            ("a", "CRITICAL", 1)
+        ]
+        assert conn.execute(sa.select(WorkplanName.name, WorkplanName.hash)).all() == [
+            ("a", None)
+        ]
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT name FROM workplans").scalars().all() == [
+            "a"
+        ]
+
+
+def test_migrate_new_database(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+
+    # Nothing to change, the versions are recorded.
+    assert migrations.migrate(engine) == [
+        "0001",
+        "0002",
+        "0003",
+        "0004",
+        "0005",
+        "0006",
+    ]
+    assert migrations.applied_versions(engine) == {
+        "0001",
+        "0002",
+        "0003",
+        "0004",
+        "0005",
+        "0006",
+    }
+
+
+def test_migrate_retries_failed_migration(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    calls = []
+
+    def fail(engine):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError
+
+    steps = [migrations.Migration("0001", "Fails once", fail)]
+    try:
+        migrations.migrate(engine, steps)
+    except RuntimeError:
+        pass
+
+    assert migrations.applied_versions(engine) == set()
+    assert migrations.migrate(engine, steps) == ["0001"]
+
+
+def fatal_errors(engine) -> list[tuple]:
+    with engine.connect() as conn:
+        query = sa.select(WorkplanFatalErrors).order_by(WorkplanFatalErrors.name)
+        return conn.execute(query).all()
+
+
+def test_backfill(tmp_path):
+    engine = create_old_database(tmp_path)
+    with engine.begin() as conn:
+        for name in ["b", "c", "d"]:
+            conn.exec_driver_sql(
+                "INSERT INTO workplans (name, worktime_utc, id, status, retries, data) "
+                f"VALUES ('{name}', '2022-01-01 00:00:00.000000', '{name}', "
+                "'CRITICAL', 0, '{}')"
+            )
+    migrations.migrate(engine)
+    table = WorkplanFatalErrors.__table__
+    expected = [("a", "", 1), ("b", "", 1), ("c", "", 1), ("d", "", 1)]
+    assert fatal_errors(engine) == expected
+
+    # Counters that went wrong are replaced, one batch of names at a time.
+    with engine.begin() as conn:
+        conn.execute(sa.update(table).values(fatal_errors=5))
+        conn.execute(table.insert().values(name="a", hash="1", fatal_errors=1))
+    count = migrations.backfill(
+        engine, [table], [models.FATAL_ERRORS_BACKFILL], batch_size=3
+    )
+
+    assert count == 4
+    assert fatal_errors(engine) == expected
+
+
+def test_backfill_name_summaries(tmp_path):
+    engine = create_old_database(tmp_path)
+    with engine.begin() as conn:
+        for name, worktime in [("a", "2022-01-02"), ("b", "2022-01-01")]:
+            conn.exec_driver_sql(
+                "INSERT INTO workplans (name, worktime_utc, id, status, hash, retries, data) "
+                f"VALUES ('{name}', '{worktime} 00:00:00.000000', '{name}{worktime}', "
+                "'SUCCESS', '1', 0, '{}')"
+            )
+    migrations.migrate(engine)
+    tables = [WorkplanName.__table__, WorkplanStatusCount.__table__]
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(table.delete())
+    count = migrations.backfill(
+        engine,
+        tables,
+        [models.NAMES_BACKFILL, models.STATUS_COUNTS_BACKFILL],
+        batch_size=1,
+    )
+
+    assert count == 2
+    with engine.connect() as conn:
+        names = sa.select(WorkplanName.name, WorkplanName.hash).order_by("name")
+        assert conn.execute(names).all() == [("a", "1"), ("b", "1")]
+        counts = sa.select(WorkplanStatusCount).order_by("name", "status")
+        assert conn.execute(counts).all() == [
+            ("a", "CRITICAL", 1),
+            ("a", "SUCCESS", 1),
+            ("b", "SUCCESS", 1),
+        ]
+
+
+def test_create_summary_tables_replaces_triggers(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    migrations.migrate(engine)
+
+    migrations.create_summary_tables(
+        engine, [WorkplanFatalErrors.__table__], models.FATAL_ERRORS_TRIGGERS
+    )
+    with engine.begin() as conn:
+        conn.exec_driver_sql(OLD_WORKPLANS_DDL[-1])
+
+    # The trigger counts once.
+    assert fatal_errors(engine) == [("a", "", 1)]
+
+
+def test_concurrent_index_ddl():
+    index = next(
+        ix for ix in Workplan.__table__.indexes if ix.name == "ix_workplans_executable"
+    )
+    ddl = migrations.concurrent_index_ddl(index, postgresql.dialect())
+
+    assert ddl.startswith("CREATE INDEX CONCURRENTLY ix_workplans_executable ")
+    assert "WHERE status IN ('ADD', 'QUEUE')" in ddl
@@ -0,0 +1,100 @@
+import pendulum
+import sqlalchemy as sa
+
+from workplanner import resources, schemas, service
+from workplanner.models import Workplan
+from workplanner.scheduler import Scheduler, next_due
+
+
+def test_next_due():
+    schema = schemas.GenerateWorkplans(
+        name="test_next_due",
+        start_time=pendulum.datetime(2022, 1, 1),
+        interval_in_seconds=3600,
+    )
+
+    assert next_due(schema, pendulum.datetime(2021, 1, 1)) == schema.start_time
+    assert next_due(schema, pendulum.datetime(2022, 1, 1, 5, 30)) == (
+        pendulum.datetime(2022, 1, 1, 6)
+    )
+    assert next_due(schema, pendulum.datetime(2022, 1, 1, 6)) == (
+        pendulum.datetime(2022, 1, 1, 7)
+    )
+
+
+def test_scheduler(file_session_factory):
+    freeze_time = pendulum.datetime(2022, 1, 10, 10, 30)
+    pendulum.set_test_now(freeze_time)
+    start_time = pendulum.datetime(2022, 1, 10)
+    with file_session_factory.begin() as db:
+        service.save_definitions(
+            db,
+            [
+                schemas.GenerateWorkplans(
+                    name="hourly", start_time=start_time, interval_in_seconds=3600
+                ),
+                schemas.GenerateWorkplans(
+                    name="daily", start_time=start_time, interval_in_seconds=86400
+                ),
+            ],
+        )
+
+    def worktimes():
+        with file_session_factory() as db:
+            return db.execute(
+                sa.select(Workplan.name, Workplan.worktime_utc).order_by(
+                    Workplan.name, Workplan.worktime_utc
+                )
+            ).all()
+
+    scheduler = Scheduler(file_session_factory, reload_interval=3600, batch_size=1)
+
+    assert scheduler.tick() == 30 * 60
+    assert worktimes() == [
+        ("daily", start_time),
+        ("hourly", start_time.add(hours=10)),
+    ]
+    # Nothing is due, so nothing is read or written.
+    pendulum.set_test_now(freeze_time.add(minutes=10))
+    assert scheduler.tick() == 20 * 60
+
+    pendulum.set_test_now(freeze_time.add(minutes=30))
+    assert scheduler.tick() == 60 * 60
+    assert worktimes()[-1] == ("hourly", start_time.add(hours=11))
+
+    with file_session_factory.begin() as db:
+        service.delete_definitions(db, ["hourly"])
+    scheduler.wake()
+
+    assert (
+        scheduler.tick(freeze_time.add(minutes=90))
+        == (start_time.add(days=1) - freeze_time.add(minutes=90)).total_seconds()
+    )
+    assert worktimes()[-1] == ("hourly", start_time.add(hours=11))
+
+
+def test_scheduler_wakes_after_commit(file_session_factory, monkeypatch):
+    freeze_time = pendulum.datetime(2022, 1, 10, 10, 30)
+    pendulum.set_test_now(freeze_time)
+    scheduler = Scheduler(file_session_factory, reload_interval=3600, batch_size=10)
+    monkeypatch.setattr(resources, "scheduler", scheduler)
+    schema = schemas.GenerateWorkplans(
+        name="hourly",
+        start_time=pendulum.datetime(2022, 1, 10),
+        interval_in_seconds=3600,
+    )
+
+    assert scheduler.tick() is None
+
+    with file_session_factory() as db:
+        resources.save_definitions_resource([schema], db=db)
+        # Until the commit, the scheduler keeps the old definitions.
+        assert scheduler.tick() is None
+        db.commit()
+
+    scheduler.tick()
+
+    with file_session_factory() as db:
+        assert db.scalars(sa.select(Workplan.worktime_utc)).all() == [
+            pendulum.datetime(2022, 1, 10, 10)
+        ]
@@ -10,7 +10,7 @@ from script_master_helper.workplanner.schemas import (
 )
 
 from tests.factories import WorkplanFactory
-from workplanner import crud
+from workplanner import crud, events, schemas
 from workplanner import service
 from workplanner.models import Workplan
 from workplanner.utils import iter_range_datetime2
@@ -76,12 +76,49 @@ def test_many_update(session):
         ],
     )
     assert session.execute(
-        sa.select(Workplan.id).where(
-            Workplan.name == wp_list[0].name, Workplan.status == Statuses.queue
-        )
+        sa.select(Workplan.id)
+        .where(Workplan.name == wp_list[0].name, Workplan.status == Statuses.queue)
+        .order_by(Workplan.worktime_utc)
     ).scalars().all() == [wp_list[0].id, wp_list[1].id]
 
 
+def test_many_update_groups(session):
+    wp_list = WorkplanFactory.create_many(4, name="test_many_update_groups")
+
+    count = service.many_update(
+        session,
+        [
+            WorkplanUpdate(id=wp_list[0].id, status=Statuses.run),
+            WorkplanUpdate(id=wp_list[1].id, status=Statuses.run),
+            WorkplanUpdate(
+                name=wp_list[2].name,
+                worktime_utc=wp_list[2].worktime_utc,
+                status=Statuses.error,
+                info="Error",
+            ),
+            WorkplanUpdate(id=wp_list[3].id, retries=5, data={"key": "value"}),
+            WorkplanUpdate(
+                name="test_many_update_groups_not_found",
+                worktime_utc=wp_list[0].worktime_utc,
+                status=Statuses.run,
+            ),
+        ],
+    )
+    rows = session.execute(
+        sa.select(Workplan.status, Workplan.info, Workplan.retries, Workplan.data)
+        .where(Workplan.name == "test_many_update_groups")
+        .order_by(Workplan.worktime_utc)
+    ).all()
+
+    assert count == 4
+    assert rows == [
+        (Statuses.run, None, 0, {}),
+        (Statuses.run, None, 0, {}),
+        (Statuses.error, "Error", 0, {}),
+        (Statuses.add, None, 5, {"key": "value"}),
+    ]
+
+
 def test_create_by_worktimes(session):
     items = service.create_by_worktimes(
         session,
@@ -93,69 +130,6 @@ def test_create_by_worktimes(session):
     assert items
 
 
-def test_is_create_next(session, freeze_time):
-    interval = 60
-    name = "test_is_create_next"
-    WorkplanFactory.create_many(5, interval, name=name)
-
-    pendulum.set_test_now(freeze_time + timedelta(seconds=interval * 5))
-
-    assert not service.is_create_next(session, name, timedelta(seconds=interval))
-
-    pendulum.set_test_now(freeze_time + timedelta(seconds=interval * 6))
-
-    assert service.is_create_next(session, name, timedelta(seconds=interval))
-
-
-def test_next_worktime(session, freeze_time):
-    interval = 60
-    name = "test_next_worktime"
-    WorkplanFactory.create_many(5, interval, name=name)
-
-    pendulum.set_test_now(freeze_time + timedelta(seconds=interval * 10))
-
-    next_worktime = service.next_worktime(session, name, timedelta(seconds=interval))
-
-    assert next_worktime == pendulum.now()
-
-
-def test_create_next_or_none(session, freeze_time):
-    interval = 60
-    size = 5
-    name = "test_create_next_or_none"
-    WorkplanFactory.create_many(size, interval, name=name)
-
-    pendulum.set_test_now(freeze_time + timedelta(seconds=interval * size))
-    item = service.create_next_or_none(
-        session,
-        GenerateWorkplans(
-            name=name,
-            start_time=freeze_time,
-            interval_in_seconds=interval,
-            extra=GenerateWorkplans.Extra(status=Statuses.queue),
-        ),
-    )
-
-    assert item is None
-
-    pendulum.set_test_now(freeze_time + timedelta(seconds=interval * 10))
-    item = service.create_next_or_none(
-        session,
-        GenerateWorkplans(
-            name=name,
-            start_time=freeze_time,
-            interval_in_seconds=interval,
-            extra=GenerateWorkplans.Extra(status=Statuses.queue),
-        ),
-    )
-    session.commit()
-    item = session.scalar(crud.get_by_id(item.id))
-
-    assert item
-    assert item.worktime_utc == pendulum.now()
-    assert item.status == Statuses.queue
-
-
 def test_fill_missing(session):
     freeze_time = pendulum.datetime(2022, 1, 1)
     pendulum.set_test_now(freeze_time)
@@ -186,6 +160,34 @@ def test_fill_missing(session):
     ]
 
 
+def test_fill_missing_extra_and_repeat(session):
+    freeze_time = pendulum.datetime(2022, 1, 1)
+    interval = 60
+    name = "test_fill_missing_extra_and_repeat"
+    WorkplanFactory(name=name, worktime_utc=freeze_time.add(seconds=interval))
+    pendulum.set_test_now(freeze_time.add(seconds=interval * 3))
+    schema = GenerateWorkplans(
+        name=name,
+        start_time=freeze_time,
+        interval_in_seconds=interval,
+        extra=GenerateWorkplans.Extra(
+            status=Statuses.queue, hash="1", max_retries=2, data={"key": "value"}
+        ),
+    )
+
+    items = service.fill_missing(session, schema)
+    created = session.scalars(
+        sa.select(Workplan).where(Workplan.id.in_([i.id for i in items]))
+    ).all()
+
+    assert len(items) == 3
+    assert len({i.id for i in items}) == 3
+    assert all(i.status == Statuses.queue for i in created)
+    assert all(i.hash == "1" for i in created)
+    assert all(i.data == {"key": "value"} for i in created)
+    assert service.fill_missing(session, schema) == []
+
+
 def test_recreate_prev(session):
     freeze_time = pendulum.datetime(2022, 1, 10)
     pendulum.set_test_now(freeze_time)
@@ -212,6 +214,83 @@ def test_recreate_prev(session):
     )
 
 
+def test_recreate_prev_many(session):
+    freeze_time = pendulum.datetime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+    size = 500
+    interval = 60
+    name = "test_recreate_prev_many"
+    wp_list = WorkplanFactory.create_many(
+        size, interval, name=name, status=Statuses.success
+    )
+    pendulum.set_test_now(freeze_time + timedelta(seconds=interval * size))
+    back_restarts = [-i for i in range(1, size + 1) if i % 3]
+
+    items = service.recreate_prev(
+        session,
+        GenerateWorkplans(
+            name=name,
+            start_time=freeze_time,
+            interval_in_seconds=interval,
+            back_restarts=back_restarts,
+            extra=GenerateWorkplans.Extra(status=Statuses.queue),
+        ),
+    )
+
+    assert [i.worktime_utc for i in items] == [
+        wp_list[i].worktime_utc for i in sorted(size + i for i in back_restarts)
+    ]
+    # The loaded workplans are refreshed.
+    assert [wp.status for wp in wp_list[-3:]] == [
+        Statuses.success,
+        Statuses.queue,
+        Statuses.queue,
+    ]
+
+
+def test_recreate_prev_resets_in_place(session):
+    freeze_time = pendulum.datetime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+    interval = 60
+    name = "test_recreate_prev_resets_in_place"
+    wp_list = WorkplanFactory.create_many(
+        4,
+        interval,
+        name=name,
+        status=Statuses.fatal_error,
+        retries=3,
+        info="error",
+        lease_owner="runner",
+    )
+    session.delete(wp_list[-2])
+    session.flush()
+    pendulum.set_test_now(freeze_time + timedelta(seconds=interval * 4))
+
+    items = service.recreate_prev(
+        session,
+        GenerateWorkplans(
+            name=name,
+            start_time=freeze_time,
+            interval_in_seconds=interval,
+            back_restarts=3,
+            extra=GenerateWorkplans.Extra(status=Statuses.queue, hash="2"),
+        ),
+    )
+
+    assert [i.worktime_utc for i in items] == [wp.worktime_utc for wp in wp_list[1:]]
+    # The existing workplans keep their ids, the missing one is created.
+    assert items[0].id == wp_list[1].id
+    assert items[2].id == wp_list[3].id
+    assert items[1].id != wp_list[2].id
+    recreated = session.scalars(
+        sa.select(Workplan).where(Workplan.id.in_([i.id for i in items]))
+    ).all()
+    assert {
+        (wp.status, wp.hash, wp.retries, wp.info, wp.lease_owner) for wp in recreated
+    } == {(Statuses.queue, "2", 0, None, None)}
+    assert wp_list[0].status == Statuses.fatal_error
+
+
 def test_recreate_prev2(session):
     freeze_time = pendulum.datetime(2022, 1, 10)
     pendulum.set_test_now(freeze_time)
@@ -238,6 +317,10 @@ def test_recreate_prev2(session):
     )
 
 
+def generate_state(db, schema: GenerateWorkplans) -> sa.Row:
+    return db.execute(crud.generate_state(schema.name, schema.extra.hash)).one()
+
+
 def test_is_allowed_execute(session):
     freeze_time = pendulum.datetime(2022, 1, 10)
     pendulum.set_test_now(freeze_time)
@@ -254,7 +337,7 @@ def test_is_allowed_execute(session):
         extra=GenerateWorkplans.Extra(hash="1"),
     )
 
-    assert service.is_allowed_execute(session, schema) is True
+    assert service.is_allowed_execute(generate_state(session, schema), schema) is True
 
 
 def test_is_not_allowed_execute(session):
@@ -282,8 +365,10 @@ def test_is_not_allowed_execute(session):
         extra=GenerateWorkplans.Extra(hash="2"),
     )
 
-    assert service.is_allowed_execute(session, schema1) is False
-    assert service.is_allowed_execute(session, schema2) is True
+    assert (
+        service.is_allowed_execute(generate_state(session, schema1), schema1) is False
+    )
+    assert service.is_allowed_execute(generate_state(session, schema2), schema2) is True
 
 
 def test_update_errors_max_retries(session):
@@ -343,6 +428,29 @@ def test_update_errors_retry_delay(session):
     assert not items
 
 
+def test_update_errors_batch(session):
+    freeze_time = pendulum.DateTime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+
+    name = "test_update_errors_batch"
+    WorkplanFactory(name=name, status=Statuses.error, retries=0)
+    WorkplanFactory(name=f"{name}_max_retries", status=Statuses.error, retries=3)
+    session.info.pop(events.PENDING_KEY, None)
+    schema_list = [
+        GenerateWorkplans(
+            name=item_name,
+            start_time=freeze_time,
+            interval_in_seconds=60,
+            extra=GenerateWorkplans.Extra(max_retries=3),
+        )
+        for item_name in (name, f"{name}_max_retries", f"{name}_empty")
+    ]
+
+    assert service.update_errors_batch(session, schema_list) == 1
+    # Only the names with updated workplans are notified.
+    assert session.info.pop(events.PENDING_KEY) == {name}
+
+
 def test_update_errors_expired(session):
     freeze_time = pendulum.DateTime(2022, 1, 10)
     pendulum.set_test_now(freeze_time)
@@ -395,11 +503,11 @@ def test_execute_list(session):
     assert items[0].id == wp.id
 
 
-def test_check_expiration(session):
+def test_expire(session):
     freeze_time = pendulum.DateTime(2022, 1, 10)
     pendulum.set_test_now(freeze_time)
 
-    name = "test_check_expiration"
+    name = "test_expire"
     wp = WorkplanFactory(
         name=name,
         status=Statuses.add,
@@ -412,14 +520,38 @@ def test_check_expiration(session):
         worktime_utc=freeze_time.add(minutes=-2),
         expires_utc=freeze_time.add(minutes=-1),
     )
-    WorkplanFactory(name=name, status=Statuses.run)
+    wp3 = WorkplanFactory(name=name, status=Statuses.run)
+
+    assert service.expire(session) == 2
 
-    items = list(service.check_expiration(session))
+    for item in (wp, wp2, wp3):
+        session.refresh(item)
+    assert (wp.status, wp.info) == (Statuses.error, Error.expired)
+    assert (wp2.status, wp2.info) == (Statuses.error, Error.expired)
+    assert wp3.status == Statuses.run
 
-    assert len(items) == 2
-    assert sorted((items[0].id, items[1].id)) == sorted((wp.id, wp2.id))
-    assert items[0].status == Statuses.error
-    assert items[0].info == Error.expired
+
+def test_expiration_follows_clock(session):
+    freeze_time = pendulum.DateTime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+
+    name = "test_expiration_follows_clock"
+    wp = WorkplanFactory(
+        name=name,
+        status=Statuses.add,
+        worktime_utc=freeze_time,
+        expires_utc=freeze_time.add(minutes=1),
+    )
+
+    assert [i.id for i in service.execute_list(session, name)] == [wp.id]
+    assert service.expire(session) == 0
+
+    pendulum.set_test_now(freeze_time.add(minutes=1))
+
+    assert not list(service.execute_list(session, name))
+    assert service.expire(session) == 1
+    session.refresh(wp)
+    assert wp.status == Statuses.error
 
 
 def test_generate_child_workplans(session):
@@ -442,6 +574,35 @@ def test_generate_child_workplans(session):
     assert [i.worktime_utc.minute for i in items] == [4, 5]
 
 
+def test_generate_child_workplans_from_worktime(session):
+    freeze_time = pendulum.datetime(2022, 1, 10)
+    pendulum.set_test_now(freeze_time)
+
+    interval = 60
+    name = "test_generate_child_workplans_from_worktime"
+    parents = WorkplanFactory.create_many(
+        5, interval, name=name, status=Statuses.success
+    )
+    schema = GenerateChildWorkplans(
+        name=f"{name}_child",
+        parent_name=name,
+        status_trigger=Statuses.success,
+        extra=GenerateChildWorkplans.Extra(hash="1", max_retries=2),
+    )
+
+    items = list(
+        service.generate_child_workplans(
+            session, schema, from_worktime=parents[2].worktime_utc
+        )
+    )
+
+    assert [i.worktime_utc.minute for i in items] == [3, 4, 5]
+    assert all(i.hash == "1" and i.status == Statuses.add for i in items)
+    # The existing children are skipped.
+    items = service.generate_child_workplans(session, schema)
+    assert [i.worktime_utc.minute for i in items] == [1, 2]
+
+
 def test_generate_child_workplans_status_trigger(session):
     freeze_time = pendulum.datetime(2022, 1, 10)
     pendulum.set_test_now(freeze_time)
@@ -493,6 +654,122 @@ def test_generate_workplans_fill_missing(session, freeze_time):
     assert worktimes == [11, 10, 9, 8]
 
 
+def test_generate_workplans_next(session, freeze_time):
+    interval = 60
+    name = "test_generate_workplans_next"
+    WorkplanFactory.create_many(3, interval, name=name, status=Statuses.success)
+    schema = GenerateWorkplans(
+        name=name,
+        start_time=freeze_time,
+        interval_in_seconds=interval,
+        back_restarts=2,
+    )
+    pendulum.set_test_now(freeze_time.add(seconds=interval * 4, minutes=30))
+
+    items = list(service.generate_workplans(session, schema))
+
+    # The next workplan and the recreated previous one.
+    assert [i.worktime_utc for i in items] == [
+        freeze_time.add(seconds=interval * 4, minutes=30),
+        freeze_time.add(seconds=interval * 3, minutes=30),
+    ]
+
+
+def test_generate_workplans_query_budget(session, freeze_time, queries):
+    interval = 60
+    name = "test_generate_workplans_query_budget"
+    WorkplanFactory.create_many(100, interval, name=name, status=Statuses.success)
+    WorkplanFactory.create_many(
+        2,
+        interval,
+        name=name,
+        status=Statuses.error,
+        worktime_utc=freeze_time.add(seconds=interval * 100),
+    )
+    schema = GenerateWorkplans(
+        name=name,
+        start_time=freeze_time,
+        interval_in_seconds=interval,
+        extra=GenerateWorkplans.Extra(max_retries=1),
+    )
+    pendulum.set_test_now(freeze_time.add(seconds=interval * 103))
+    queries.clear()
+
+    items = list(service.generate_workplans(session, schema))
+
+    assert len(items) == 1
+    # State, next workplan, error retries, executable list.
+    assert len(queries) <= 4, queries
+
+
+def test_generate_workplans_batch(session, freeze_time, queries):
+    interval = 60
+    name = "test_generate_workplans_batch"
+    WorkplanFactory.create_many(3, interval, name=name, status=Statuses.success)
+    name_fatal = "test_generate_workplans_batch_fatal"
+    WorkplanFactory.create_many(
+        3, interval, name=name_fatal, status=Statuses.fatal_error, hash="1"
+    )
+    name_first = "test_generate_workplans_batch_first"
+    pendulum.set_test_now(freeze_time.add(seconds=interval * 4))
+    queries.clear()
+
+    result = service.generate_workplans_batch(
+        session,
+        [
+            GenerateWorkplans(
+                name=name, start_time=freeze_time, interval_in_seconds=interval
+            ),
+            GenerateWorkplans(
+                name=name_fatal,
+                start_time=freeze_time,
+                interval_in_seconds=interval,
+                extra=GenerateWorkplans.Extra(hash="1"),
+            ),
+            GenerateWorkplans(
+                name=name_first,
+                start_time=freeze_time,
+                interval_in_seconds=interval,
+                extra=GenerateWorkplans.Extra(status=Statuses.queue),
+            ),
+        ],
+    )
+    result = {name: [i.worktime_utc for i in items] for name, items in result}
+
+    assert result == {
+        name: [pendulum.now()],
+        name_fatal: [],
+        name_first: [pendulum.now()],
+    }
+    # State, inserts of both groups of columns, error retries, executable list.
+    assert len(queries) == 5, queries
+
+
+def test_generate_batch_writes(session, freeze_time, queries):
+    interval = 60
+    name = "test_generate_batch_writes"
+    WorkplanFactory.create_many(3, interval, name=name, status=Statuses.success)
+    name_fatal = "test_generate_batch_writes_fatal"
+    WorkplanFactory.create_many(
+        3, interval, name=name_fatal, status=Statuses.fatal_error
+    )
+    pendulum.set_test_now(freeze_time.add(seconds=interval * 4))
+    schema_list = [
+        GenerateWorkplans(
+            name=item_name, start_time=freeze_time, interval_in_seconds=interval
+        )
+        for item_name in (name, name_fatal)
+    ]
+    queries.clear()
+
+    allowed = service.generate_batch_writes(session, schema_list)
+
+    # State, insert, error retries, the executable workplans are not read.
+    assert len(queries) == 3, queries
+    assert [schema.name for schema in allowed] == [name]
+    assert session.scalar(crud.last(name)).worktime_utc == pendulum.now()
+
+
 def test_run(session, freeze_time):
     name = "test_run"
     wp = WorkplanFactory(
@@ -503,3 +780,75 @@ def test_run(session, freeze_time):
 
     assert item.retries == 2
     assert item.status == Statuses.add
+
+
+def test_claim(session, freeze_time):
+    start = freeze_time.add(hours=-10)
+    first = WorkplanFactory.create_many(3, name="test_claim_1", worktime_utc=start)
+    second = WorkplanFactory.create_many(
+        2, name="test_claim_2", worktime_utc=start, seconds_interval=90
+    )
+    WorkplanFactory(name="test_claim_1", worktime_utc=start, status=Statuses.success)
+    WorkplanFactory(
+        name="test_claim_2",
+        worktime_utc=start,
+        expires_utc=freeze_time.add(seconds=-1),
+    )
+    schema = schemas.ClaimWorkplans(
+        names=["test_claim_1", "test_claim_2"], limit=3, lease_seconds=60
+    )
+
+    claimed = service.claim(session, schema)
+    claimed_again = service.claim(session, schema)
+
+    # In the order of the claim: the latest worktimes first, then by name.
+    assert [wp.id for wp in claimed] == [first[2].id, second[1].id, first[1].id]
+    assert [wp.id for wp in claimed_again] == [second[0].id, first[0].id]
+    assert claimed[0].status == Statuses.run
+    assert claimed[0].started_utc == freeze_time
+    assert claimed[0].lease_expires_utc == freeze_time.add(seconds=60)
+    assert claimed[0].lease_owner == claimed[2].lease_owner
+    assert claimed[0].lease_owner != claimed_again[0].lease_owner
+    assert service.claim(session, schema) == []
+
+
+def test_heartbeat(session, freeze_time):
+    wp_list = WorkplanFactory.create_many(3, name="test_heartbeat")
+    claimed = service.claim(
+        session,
+        schemas.ClaimWorkplans(
+            names=["test_heartbeat"], limit=2, owner="runner", lease_seconds=10
+        ),
+    )
+
+    extended = service.heartbeat(
+        session,
+        schemas.Heartbeat(
+            ids=[wp.id for wp in wp_list], owner="runner", lease_seconds=60
+        ),
+    )
+    other_owner = service.heartbeat(
+        session,
+        schemas.Heartbeat(ids=[wp_list[0].id], owner="other", lease_seconds=60),
+    )
+
+    assert {wp.id for wp in extended} == {wp.id for wp in claimed}
+    assert {wp.lease_expires_utc for wp in extended} == {freeze_time.add(seconds=60)}
+    assert other_owner == []
+
+
+def test_clear_statuses_of_lost_items_keeps_leases(session, freeze_time):
+    leased, lost = WorkplanFactory.create_many(
+        2, name="test_clear_statuses_keeps_leases", status=Statuses.run
+    )
+    leased.lease_owner = "runner"
+    leased.lease_expires_utc = freeze_time.add(minutes=1)
+    session.flush()
+
+    service.clear_statuses_of_lost_items(session)
+
+    assert session.scalars(
+        sa.select(Workplan.status)
+        .filter(Workplan.name == "test_clear_statuses_keeps_leases")
+        .order_by(Workplan.worktime_utc)
+    ).all() == [Statuses.run, Statuses.add]
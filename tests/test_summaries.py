@@ -0,0 +1,186 @@
+import collections
+import random
+import threading
+import uuid
+
+import pendulum
+import sqlalchemy as sa
+from script_master_helper.workplanner.enums import Statuses
+from sqlalchemy.dialects import sqlite
+
+from tests.factories import WorkplanFactory
+from workplanner import crud
+from workplanner.models import (
+    Workplan,
+    WorkplanFatalErrors,
+    WorkplanName,
+    WorkplanStatusCount,
+)
+
+
+def summaries(db, name=None) -> dict[str, dict]:
+    """The tables maintained by the triggers, without the counters that are zero."""
+    fatal_errors = sa.select(
+        WorkplanFatalErrors.name,
+        WorkplanFatalErrors.hash,
+        WorkplanFatalErrors.fatal_errors,
+    ).where(WorkplanFatalErrors.fatal_errors > 0)
+    names = sa.select(
+        WorkplanName.name,
+        WorkplanName.worktime_utc,
+        WorkplanName.hash,
+        WorkplanName.first_worktime_utc,
+    )
+    counts = sa.select(
+        WorkplanStatusCount.name, WorkplanStatusCount.status, WorkplanStatusCount.count
+    ).where(WorkplanStatusCount.count > 0)
+    if name:
+        fatal_errors = fatal_errors.where(WorkplanFatalErrors.name == name)
+        names = names.where(WorkplanName.name == name)
+        counts = counts.where(WorkplanStatusCount.name == name)
+
+    return {
+        "fatal_errors": {(row[0], row[1]): row[2] for row in db.execute(fatal_errors)},
+        "names": {row[0]: tuple(row[1:]) for row in db.execute(names)},
+        "status_counts": {(row[0], row[1]): row[2] for row in db.execute(counts)},
+    }
+
+
+def recount(db, name=None) -> dict[str, dict]:
+    """The same as summaries, counted from the history."""
+    query = sa.select(Workplan).order_by(Workplan.worktime_utc)
+    if name:
+        query = query.where(Workplan.name == name)
+
+    fatal_errors = collections.Counter()
+    names = {}
+    counts = collections.Counter()
+    for item in db.scalars(query):
+        if item.status == Statuses.fatal_error:
+            fatal_errors[(item.name, item.hash or "")] += 1
+        first = names[item.name][2] if item.name in names else item.worktime_utc
+        names[item.name] = (item.worktime_utc, item.hash, first)
+        counts[(item.name, item.status)] += 1
+
+    return {
+        "fatal_errors": dict(fatal_errors),
+        "names": names,
+        "status_counts": dict(counts),
+    }
+
+
+def test_counters_follow_changes(session):
+    name = "test_counters_follow_changes"
+    wp_list = WorkplanFactory.create_many(
+        4, name=name, status=Statuses.fatal_error, hash="1"
+    )
+    WorkplanFactory.create_many(
+        2, name=name, status=Statuses.success, worktime_utc=pendulum.now().add(days=1)
+    )
+    assert summaries(session, name) == recount(session, name)
+    assert summaries(session, name)["fatal_errors"] == {(name, "1"): 4}
+
+    session.execute(
+        sa.update(Workplan)
+        .where(Workplan.name == name, Workplan.status == Statuses.success)
+        .values(status=Statuses.fatal_error)
+    )
+    wp_list[0].status = Statuses.success
+    wp_list[1].hash = "2"
+    session.delete(wp_list[2])
+    session.flush()
+
+    assert summaries(session, name) == recount(session, name)
+    assert summaries(session, name)["fatal_errors"] == {
+        (name, "1"): 1,
+        (name, "2"): 1,
+        (name, ""): 2,
+    }
+
+
+def test_summaries_follow_changes(session):
+    name = "test_summaries_follow_changes"
+    now = pendulum.now()
+    wp_list = WorkplanFactory.create_many(5, name=name, worktime_utc=now, hash="1")
+    assert summaries(session, name) == recount(session, name)
+
+    wp_list[-1].hash = "2"
+    wp_list[1].status = Statuses.success
+    session.flush()
+    assert summaries(session, name) == recount(session, name)
+    assert summaries(session, name)["names"][name][1] == "2"
+
+    session.delete(wp_list[0])
+    session.delete(wp_list[-1])
+    session.flush()
+    assert summaries(session, name) == recount(session, name)
+    assert summaries(session, name)["names"][name][1] == "1"
+
+    session.execute(
+        sa.update(Workplan)
+        .where(Workplan.name == name, Workplan.worktime_utc == wp_list[1].worktime_utc)
+        .values(worktime_utc=now.add(days=1))
+    )
+    assert summaries(session, name) == recount(session, name)
+
+    session.execute(sa.delete(Workplan).where(Workplan.name == name))
+    assert summaries(session, name) == {
+        "fatal_errors": {},
+        "names": {},
+        "status_counts": {},
+    }
+
+
+def test_count_by_uses_counters(session):
+    name = "test_count_by_uses_counters"
+    WorkplanFactory.create_many(3, name=name)
+    query = crud.count_by(Workplan.name, Workplan.status).where(
+        WorkplanStatusCount.name == name
+    )
+
+    assert "workplan_status_counts" in str(query)
+    assert session.execute(query).mappings().all() == [
+        {"name": name, "status": Statuses.add, "count": 3}
+    ]
+
+
+def test_summaries_under_concurrent_writes(file_session_factory):
+    now = pendulum.now()
+    names = ["a", "b"]
+    statuses = [Statuses.fatal_error, Statuses.success, Statuses.error]
+
+    def write(seed):
+        rnd = random.Random(seed)
+        for _ in range(50):
+            name, worktime_utc = rnd.choice(names), now.add(minutes=rnd.randrange(20))
+            by_pk = (Workplan.name == name, Workplan.worktime_utc == worktime_utc)
+            values = dict(status=rnd.choice(statuses), hash=rnd.choice([None, "1"]))
+            action = rnd.random()
+            if action < 0.4:
+                query = (
+                    sqlite.insert(Workplan)
+                    .values(
+                        name=name,
+                        worktime_utc=worktime_utc,
+                        id=uuid.uuid4(),
+                        retries=0,
+                        data={},
+                        **values,
+                    )
+                    .on_conflict_do_nothing()
+                )
+            elif action < 0.6:
+                query = sa.delete(Workplan).where(*by_pk)
+            else:
+                query = sa.update(Workplan).where(*by_pk).values(**values)
+            with file_session_factory.begin() as db:
+                db.execute(query)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with file_session_factory() as db:
+        assert summaries(db) == recount(db)
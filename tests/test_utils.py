@@ -52,3 +52,17 @@ def test_iter_period_from_range_with_length():
     assert list(iter_period_from_range(range, tm, length=3)) == [
         (dt.datetime(2021, 1, 1), dt.datetime(2021, 1, 3))
     ]
+
+
+def test_iter_period_from_range_unsorted():
+    tm = dt.timedelta(1)
+    range = [dt.datetime(2021, 1, i) for i in (5, 1, 2, 2, 4, 7, 6)]
+    assert list(iter_period_from_range(range, tm)) == [
+        (dt.datetime(2021, 1, 1), dt.datetime(2021, 1, 2)),
+        (dt.datetime(2021, 1, 4), dt.datetime(2021, 1, 7)),
+    ]
+    assert list(iter_period_from_range(range, tm, length=3)) == [
+        (dt.datetime(2021, 1, 1), dt.datetime(2021, 1, 2)),
+        (dt.datetime(2021, 1, 4), dt.datetime(2021, 1, 6)),
+        (dt.datetime(2021, 1, 7), dt.datetime(2021, 1, 7)),
+    ]
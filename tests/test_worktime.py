@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+import pendulum
+import pytest
+
+from workplanner import worktime
+from workplanner.utils import iter_range_datetime
+
+
+def test_count_slots():
+    start = pendulum.datetime(2022, 1, 1)
+    interval = timedelta(minutes=1)
+
+    assert worktime.count_slots(start, start, interval) == 1
+    assert worktime.count_slots(start, start.add(seconds=59), interval) == 1
+    assert worktime.count_slots(start, start.add(minutes=1), interval) == 2
+    assert worktime.count_slots(start, start.add(minutes=-1), interval) == 0
+    assert worktime.count_slots(start, start.add(days=7), interval) == len(
+        list(iter_range_datetime(start, start.add(days=7), interval))
+    )
+
+
+def test_slot_after():
+    start = pendulum.datetime(2022, 1, 1)
+
+    assert worktime.slot_after(start, timedelta(hours=1), 25) == pendulum.datetime(
+        2022, 1, 2, 1
+    )
+    assert worktime.slot_after(start, timedelta(hours=1), -1) == pendulum.datetime(
+        2021, 12, 31, 23
+    )
+
+
+@pytest.mark.parametrize("seconds", [1, 60, 90, 3600, 86400])
+def test_last_slot(seconds):
+    start = pendulum.datetime(2022, 1, 1)
+    now = start.add(days=3, minutes=7, seconds=13)
+    interval = timedelta(seconds=seconds)
+
+    expected = list(iter_range_datetime(start, now, interval))[-1]
+
+    assert worktime.last_slot(start, interval, now) == expected
+
+
+def test_last_slot_uses_now(freeze_time):
+    start = freeze_time.add(hours=-2, seconds=-30)
+
+    assert worktime.last_slot(start, timedelta(hours=1)) == freeze_time.add(seconds=-30)
+
+
+def test_last_slot_start_in_future(freeze_time):
+    with pytest.raises(ValueError):
+        worktime.last_slot(freeze_time.add(minutes=1), timedelta(minutes=1))
+
+
+def test_is_due():
+    wt = pendulum.datetime(2022, 1, 1)
+    interval = timedelta(minutes=1)
+
+    assert not worktime.is_due(wt, interval, wt.add(seconds=59))
+    assert worktime.is_due(wt, interval, wt.add(minutes=1))
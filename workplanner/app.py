@@ -1,83 +1,58 @@
-import os
-import sys
-from pathlib import Path
+import time
 
 from fastapi import FastAPI, HTTPException
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import ORJSONResponse
-from loguru import logger
 from script_master_helper.workplanner import schemas
 from script_master_helper.workplanner.schemas import Error
 from starlette import status
 from starlette.requests import Request
 from starlette.responses import Response
 
-from workplanner import errors, service
-from workplanner.database import open_session
+from workplanner import errors, metrics, service
+from workplanner.expiration import sweeper
+from workplanner.leases import reaper
+from workplanner.scheduler import scheduler
+from workplanner.logger import logger
+from workplanner.async_resources import router as async_router
+from workplanner.database import dispose_async_engine, open_session
 from workplanner.resources import router, API_VERSION
 from workplanner.settings import Settings
 
-fmt = os.environ.get(
-    "LOGURU_FORMAT",
-    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | "
-    "<level>{message}</level>",
-)
-
-if os.environ.get("PYTEST") or Path().cwd().name == "tests":
-    logger.configure(
-        handlers=[
-            {
-                "sink": sys.stdout,
-                "level": "DEBUG",
-                "colorize": True,
-                "backtrace": True,
-                "diagnose": True,
-                "format": fmt,
-            }
-        ]
-    )
-else:
-    logger.configure(
-        handlers=[
-            {
-                "sink": sys.stdout,
-                "level": Settings().loglevel,
-                "colorize": True,
-                "backtrace": True,
-                "diagnose": True,
-                "format": fmt,
-            },
-            {
-                "sink": Settings().logpath,
-                "format": fmt,
-                "rotation": Settings().logs_rotation,
-                "retention": Settings().logs_retention,
-                "compression": "zip",
-                "colorize": False,
-                "enqueue": True,
-                "backtrace": True,
-                "diagnose": True,
-            },
-        ]
-    )
-
 app = FastAPI(version=API_VERSION, title="WorkPlanner", debug=Settings().debug)
-app.include_router(router)
+app.include_router(async_router if Settings().async_api else router)
 
 
 @app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
+async def observe_requests(request: Request, call_next):
+    """Logs the requests and measures their latency for the metrics."""
+    start = time.perf_counter()
     try:
         response: Response = await call_next(request)
     except Exception:
         logger.exception("{} {}", request.method, request.url)
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
         raise
-
-    if response.status_code == 200:
-        logger.info("{} {} - {}", request.method, request.url, response.status_code)
     else:
-        logger.error("{} {} - {}", request.method, request.url, response.status_code)
+        status_code = response.status_code
+    finally:
+        duration = time.perf_counter() - start
+        metrics.HTTP_REQUEST_DURATION.observe(
+            duration,
+            method=request.method,
+            route=metrics.route_label(request.scope),
+            status=status_code,
+        )
+
+    if status_code == 200:
+        logger.info(
+            "{} {} - {} {:.3f}s", request.method, request.url, status_code, duration
+        )
+    else:
+        logger.error(
+            "{} {} - {} {:.3f}s", request.method, request.url, status_code, duration
+        )
 
     return response
 
@@ -139,11 +114,24 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.on_event("startup")
 def startup():
+    # Workplans without a lease can't be recovered by the reaper,
+    # their runners could only have been lost with the previous process.
     with open_session() as s:
         service.clear_statuses_of_lost_items(s)
+        s.commit()
+
+    sweeper.task.start()
+    reaper.task.start()
+    scheduler.task.start()
 
 
 @app.on_event("shutdown")
 def shutdown():
-    with open_session() as s:
-        service.clear_statuses_of_lost_items(s)
+    scheduler.task.stop()
+    reaper.task.stop()
+    sweeper.task.stop()
+
+
+@app.on_event("shutdown")
+async def dispose_engines():
+    await dispose_async_engine()
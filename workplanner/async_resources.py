@@ -0,0 +1,125 @@
+"""
+The API of resources on AsyncSession, enabled by the async_api setting.
+
+The hot reads (list, counts, export) and the batch generation have their own handlers
+that await the queries, the rows of the export and of the generation are streamed
+after the handler returns. The other handlers are the sync ones, they get a Session
+of AsyncSession.run_sync: the queries go through the asyncio driver,
+but the rest of the handler is blocking code that runs on the event loop.
+"""
+import functools
+import inspect
+from typing import Callable, Literal
+
+from fastapi import Depends, APIRouter, Query
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from workplanner import crud, models, schemas, export, const, resources, service
+from workplanner.database import get_async_db
+
+router = APIRouter()
+
+
+def run_sync(endpoint: Callable) -> Callable:
+    """The handler with AsyncSession in place of the `db` Session."""
+    signature = inspect.signature(endpoint)
+    if "db" not in signature.parameters:
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        db: AsyncSession = kwargs.pop("db")
+        return await db.run_sync(lambda session: endpoint(db=session, **kwargs))
+
+    wrapper.__signature__ = signature.replace(
+        parameters=[
+            p.replace(annotation=AsyncSession, default=Depends(get_async_db))
+            if p.name == "db"
+            else p
+            for p in signature.parameters.values()
+        ]
+    )
+
+    return wrapper
+
+
+async def list_resource(
+    workplan_query: schemas.WorkplanQuery, db: AsyncSession = Depends(get_async_db)
+):
+    query_filter, query = resources.filter_query(workplan_query)
+    result = (await db.scalars(query)).all()
+
+    return resources.list_response(workplan_query, query_filter, result)
+
+
+async def count_resource(
+    workplan_filter: schemas.WorkplanQuery, db: AsyncSession = Depends(get_async_db)
+):
+    query = crud.QueryFilter(schema=workplan_filter).get_count_query()
+    count = await db.scalar(query)
+
+    return schemas.ResponseGeneric(data=schemas.Affected(count=count))
+
+
+async def count_by_resource(
+    workplan_fields: schemas.WorkplanFields, db: AsyncSession = Depends(get_async_db)
+):
+    fields = [getattr(models.Workplan, name) for name in workplan_fields.field_names]
+    query = crud.count_by(*fields)
+    data = (await db.execute(query)).mappings().all()
+    return schemas.ResponseGeneric(data=data)
+
+
+async def export_resource(
+    workplan_query: schemas.WorkplanQuery,
+    format_: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Streams the workplans as newline-delimited JSON or CSV."""
+    _, query = resources.filter_query(workplan_query)
+    result = await db.stream_scalars(query)
+    partitions = result.partitions(const.EXPORT_CHUNK_SIZE)
+
+    if format_ == "csv":
+        return StreamingResponse(export.aiter_csv(partitions), media_type="text/csv")
+
+    return StreamingResponse(
+        export.aiter_ndjson(partitions), media_type="application/x-ndjson"
+    )
+
+
+async def generate_batch_resource(
+    schema_list: list[schemas.GenerateWorkplans],
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Results are streamed as newline-delimited JSON, one line per name."""
+    allowed = await db.run_sync(service.generate_batch_writes, schema_list)
+    items = await db.stream_scalars(
+        crud.executable_batch([schema.name for schema in allowed])
+    )
+
+    return StreamingResponse(
+        export.aiter_generated([schema.name for schema in schema_list], items),
+        media_type="application/x-ndjson",
+    )
+
+
+ENDPOINTS = {
+    resources.list_resource: list_resource,
+    resources.count_resource: count_resource,
+    resources.count_by_resource: count_by_resource,
+    resources.export_resource: export_resource,
+    resources.generate_batch_resource: generate_batch_resource,
+}
+
+for route in resources.router.routes:
+    if isinstance(route, APIRoute):
+        router.add_api_route(
+            route.path,
+            ENDPOINTS.get(route.endpoint) or run_sync(route.endpoint),
+            methods=route.methods,
+            response_class=route.response_class,
+            name=route.name,
+        )
@@ -0,0 +1,147 @@
+import threading
+from typing import Callable
+
+import pendulum
+from sqlalchemy.orm import Session
+
+from workplanner.logger import logger
+from workplanner.metrics import Counter
+
+
+class PeriodicTask:
+    """Calls the function in a daemon thread every `interval` seconds until stopped."""
+
+    def __init__(self, name: str, func: Callable[[], object], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info("Started background task {} every {}s", self.name, self.interval)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+            logger.info("Stopped background task {}", self.name)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.func()
+            except Exception:
+                logger.exception("Background task {} failed", self.name)
+
+            self._stopped.wait(self.interval)
+
+
+class DynamicTask(PeriodicTask):
+    """
+    Like PeriodicTask, but the function returns the seconds to wait until the next call,
+    at most `interval` (None means `interval`), and `wake` makes the next call now.
+    """
+
+    def __init__(self, name: str, func: Callable[[], float | None], interval: float):
+        super().__init__(name, func, interval)
+        self._woken = threading.Event()
+
+    def wake(self) -> None:
+        self._woken.set()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopped.set()
+        self._woken.set()
+        super().stop(timeout)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            delay = self.interval
+            try:
+                result = self.func()
+                if result is not None:
+                    delay = min(max(result, 0), self.interval)
+            except Exception:
+                logger.exception("Background task {} failed", self.name)
+
+            self._woken.wait(delay)
+            self._woken.clear()
+
+
+class BatchSweeper:
+    """
+    Calls `func(db, now, limit=batch_size)` periodically in batches,
+    each batch in its own transaction, until a batch is not full.
+    `func` returns the number of changed rows, they are counted
+    in the stats under `unit` and in the counter of the metrics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., int],
+        session_factory: Callable[[], Session],
+        interval: float,
+        batch_size: int,
+        *,
+        unit: str,
+        counter: Counter,
+        message: str,
+        level: str = "INFO",
+    ):
+        self.func = func
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.unit = unit
+        self.counter = counter
+        self.message = message
+        self.level = level
+        self.task = PeriodicTask(name, self.sweep, interval)
+        self._lock = threading.Lock()
+        self.sweeps = 0
+        self.last_count = 0
+        self.total_count = 0
+        self.last_sweep_utc: pendulum.DateTime | None = None
+
+    def sweep(self) -> int:
+        now = pendulum.now()
+        total = 0
+
+        with self._lock, self.session_factory() as db:
+            while True:
+                count = self.func(db, now, limit=self.batch_size)
+                db.commit()
+                total += count
+                if count < self.batch_size:
+                    break
+
+            self.sweeps += 1
+            self.last_count = total
+            self.total_count += total
+            self.counter.inc(total)
+            self.last_sweep_utc = now
+
+        if total:
+            logger.log(self.level, self.message, total)
+
+        return total
+
+    def stats(self) -> dict:
+        return {
+            "sweeps": self.sweeps,
+            f"last_{self.unit}": self.last_count,
+            f"total_{self.unit}": self.total_count,
+            "last_sweep_utc": self.last_sweep_utc,
+        }
@@ -20,6 +20,7 @@ def run(
     logs_rotation: str = const.DEFAULT_LOGLEVEL,
     logs_retention: str = const.DEFAULT_LOGLEVEL,
     database_url: str = None,
+    async_api: bool = const.DEFAULT_ASYNC_API,
     settings_file: str = None,
 ):
     if homedir:
@@ -60,3 +61,23 @@ def run(
     )
     server = ProactorServer(config=config)
     server.run()
+
+
+@cli.command()
+def migrate(
+    homedir: str = None,
+    database_url: str = None,
+    settings_file: str = None,
+):
+    """Creates the missing tables and applies the pending schema migrations."""
+    if homedir:
+        os.environ[const.HOME_DIR_VARNAME] = homedir
+
+    from workplanner import migrations
+    from workplanner.database import engine
+
+    versions = migrations.migrate(engine)
+    if versions:
+        typer.echo(f"Applied migrations: {', '.join(versions)}")
+    else:
+        typer.echo("The database is up to date")
@@ -10,6 +10,31 @@ DEFAULT_LOGLEVEL = "INFO"
 DEFAULT_LOGS_ROTATION = "1 day"  # Once the file is too old, it's rotated
 DEFAULT_LOGS_RETENTION = "1 months"  # Cleanup after some time
 DEFAULT_DEBUG = False
+DEFAULT_EXPIRATION_INTERVAL = 10  # Seconds between sweeps of expired workplans
+DEFAULT_EXPIRATION_BATCH_SIZE = 1000  # Workplans expired in one transaction
+DEFAULT_ASYNC_API = False
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_TIMEOUT = 30  # Seconds to wait for a free connection
+DEFAULT_POOL_RECYCLE = 3600  # Seconds after which a connection is reopened
+DEFAULT_POOL_PRE_PING = True
+# Readers do not block the writer, and fsync happens at checkpoints only.
+DEFAULT_SQLITE_JOURNAL_MODE = "WAL"
+DEFAULT_SQLITE_SYNCHRONOUS = "NORMAL"
+DEFAULT_SQLITE_BUSY_TIMEOUT = 30_000  # Milliseconds to wait for a lock
+DEFAULT_LEASE_SECONDS = 300  # How long a claimed workplan belongs to its runner
+DEFAULT_LEASE_REAP_INTERVAL = 10  # Seconds between releases of expired leases
+DEFAULT_LEASE_REAP_BATCH_SIZE = 1000  # Leases released in one transaction
+MAX_CLAIM_LIMIT = 1000  # Workplans claimed by one request
+EVENTS_KEEPALIVE = 15  # Seconds without events after which a comment is sent
+DEFAULT_SCHEDULER_RELOAD_INTERVAL = 60  # Seconds between reloads of the definitions
+DEFAULT_SCHEDULER_BATCH_SIZE = 100  # Definitions generated in one transaction
+EXPORT_CHUNK_SIZE = 1000  # Rows fetched from the database and sent at a time
+BACKFILL_BATCH_SIZE = 1000  # Names counted in one transaction by a migration
+GRAPH_BATCH_SIZE = 100  # Children of a graph level created by one statement
+# Parents updated this many seconds before a graph pass are scanned again by the next one,
+# so that the transactions committed during the pass are not missed.
+GRAPH_HIGH_WATER_OVERLAP = 60
 
 
 def get_homepath() -> Path:
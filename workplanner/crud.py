@@ -1,12 +1,25 @@
+import base64
+import binascii
 import datetime as dt
-from typing import Optional, Iterable
+import uuid
+from typing import Optional, Iterable, Sequence
 
+import orjson
 import pendulum
 import sqlalchemy as sa
-from script_master_helper.workplanner import schemas
-from script_master_helper.workplanner.enums import Statuses, Operators
-
-from workplanner.models import Workplan
+from script_master_helper.workplanner.enums import Statuses, Operators, Error
+from sqlalchemy.dialects import postgresql, sqlite
+
+from workplanner import filters, schemas, worktime
+from workplanner.fields import PendulumDateTime
+from workplanner.models import (
+    Workplan,
+    WorkplanDefinition,
+    WorkplanEdge,
+    WorkplanFatalErrors,
+    WorkplanName,
+    WorkplanStatusCount,
+)
 
 QueryT = sa.Select | sa.Update | sa.Delete
 
@@ -60,7 +73,7 @@ class QueryFilter:
 
         raise NotImplementedError()
 
-    def apply(self, query: QueryT) -> QueryT:
+    def apply_filter(self, query: QueryT) -> QueryT:
         for name in self.schema.filter.dict(exclude_unset=True):
             field_filters = getattr(self.schema.filter, name)
             if field_filters is not None:
@@ -68,6 +81,86 @@ class QueryFilter:
                 for filter_ in field_filters:
                     query = query.where(self.filter_expr(model_field, filter_))
 
+        return query
+
+    @property
+    def cursor(self) -> str | None:
+        return getattr(self.schema, "cursor", None)
+
+    @property
+    def cursor_columns(self) -> list[sa.Column]:
+        # The primary key makes the ordering unique.
+        names = [
+            *(self.schema.order_by or []),
+            Workplan.name.key,
+            Workplan.worktime_utc.key,
+        ]
+        columns = Workplan.__table__.c
+
+        return [columns[name] for name in dict.fromkeys(names)]
+
+    def encode_cursor(self, item: Workplan) -> str:
+        values = [getattr(item, column.key) for column in self.cursor_columns]
+        data = orjson.dumps(values, default=str)
+
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, cursor: str) -> list:
+        try:
+            values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, orjson.JSONDecodeError, UnicodeError) as exc:
+            raise ValueError(f"Invalid cursor: {cursor}") from exc
+
+        columns = self.cursor_columns
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+        try:
+            return [self._cursor_value(c, v) for c, v in zip(columns, values)]
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"Invalid cursor: {cursor}") from exc
+
+    @staticmethod
+    def _cursor_value(column: sa.Column, value):
+        type_ = column.type
+        if isinstance(type_, sa.TypeDecorator):
+            type_ = type_.impl_instance
+
+        if isinstance(type_, sa.DateTime):
+            return pendulum.parse(value)
+        if isinstance(type_, sa.Uuid):
+            return uuid.UUID(value)
+        if isinstance(type_, sa.String) and not isinstance(value, str):
+            raise TypeError(f"{column.key} must be a string")
+        if isinstance(type_, sa.Integer) and type(value) is not int:
+            raise TypeError(f"{column.key} must be an integer")
+
+        return value
+
+    def next_cursor(self, items: Sequence[Workplan]) -> str | None:
+        if items and len(items) >= self.schema.limit:
+            return self.encode_cursor(items[-1])
+
+        return None
+
+    def apply_cursor(self, query: QueryT) -> QueryT:
+        """Keyset pagination: rows after the cursor, in the order of its columns."""
+        columns = self.cursor_columns
+        if self.cursor:
+            values = self.decode_cursor(self.cursor)
+            query = query.where(
+                sa.tuple_(*columns)
+                > sa.tuple_(*(sa.literal(v, c.type) for c, v in zip(columns, values)))
+            )
+
+        return query.order_by(*columns).limit(self.schema.limit)
+
+    def apply(self, query: QueryT) -> QueryT:
+        query = self.apply_filter(query)
+
+        if self.cursor is not None:
+            return self.apply_cursor(query)
+
         if self.schema.order_by:
             query = query.order_by(*self.schema.order_by)
 
@@ -87,6 +180,12 @@ class QueryFilter:
 
         return self.apply(query)
 
+    def get_count_query(self) -> sa.Select:
+        """SELECT count(*) with the filters, ordering and pagination are ignored."""
+        query = sa.select(sa.func.count()).select_from(Workplan)
+
+        return self.apply_filter(query)
+
 
 def delete(
     name: str = None,
@@ -124,7 +223,78 @@ def last(name: str) -> sa.Select:
     return get_by_name(name).order_by(Workplan.worktime_utc.desc())
 
 
+def name_summary(name: str) -> sa.Select:
+    # Columns, not entities: the triggers change the rows behind the session.
+    return sa.select(
+        WorkplanName.worktime_utc, WorkplanName.hash, WorkplanName.first_worktime_utc
+    ).where(WorkplanName.name == name)
+
+
+def generate_states(definitions: Iterable[tuple[str, str | None]]) -> sa.Select:
+    """
+    Everything generation needs to know about the names, one row per (name, hash):
+    the last worktime and hash, the first worktime
+    and the number of fatal errors of the hash, if it is the hash of the last workplan.
+    Worktimes are NULL if the name has no workplans.
+    """
+    definitions = (
+        sa.values(
+            sa.column("name", Workplan.name.type),
+            sa.column("hash", Workplan.hash.type),
+            name="definitions",
+        )
+        .data(list(definitions))
+        .cte("definitions")
+    )
+    # A lookup of the counter, the history of the name is not scanned.
+    fatal_errors = sa.func.coalesce(
+        sa.select(WorkplanFatalErrors.fatal_errors)
+        .where(
+            WorkplanFatalErrors.name == definitions.c.name,
+            WorkplanFatalErrors.hash == sa.func.coalesce(definitions.c.hash, ""),
+        )
+        .scalar_subquery(),
+        0,
+    )
+
+    # The summary of the name, the history is not read.
+    return (
+        sa.select(
+            definitions.c.name,
+            WorkplanName.worktime_utc,
+            WorkplanName.hash,
+            WorkplanName.first_worktime_utc,
+            # Errors are counted only when the hash has not changed.
+            sa.case(
+                (
+                    WorkplanName.hash.is_not_distinct_from(definitions.c.hash),
+                    fatal_errors,
+                ),
+                else_=0,
+            ).label("fatal_errors"),
+        )
+        .select_from(definitions)
+        .outerjoin(WorkplanName, WorkplanName.name == definitions.c.name)
+    )
+
+
+def generate_state(name: str, hash_: str | None) -> sa.Select:
+    return generate_states([(name, hash_)])
+
+
 def count_by(*dimension_fields) -> sa.Select:
+    """Counts by name and status are summed from the counters, without the history."""
+    keys = [field.key for field in dimension_fields]
+    if set(keys) <= {WorkplanStatusCount.name.key, WorkplanStatusCount.status.key}:
+        fields = [getattr(WorkplanStatusCount, key) for key in keys]
+        count = sa.func.sum(WorkplanStatusCount.count)
+        return (
+            sa.select(*fields, count.label("count"))
+            .group_by(*fields)
+            .having(count > 0)
+            .order_by(*fields)
+        )
+
     return (
         sa.select(*dimension_fields, sa.func.count().label("count"))
         .select_from(Workplan)
@@ -132,19 +302,493 @@ def count_by(*dimension_fields) -> sa.Select:
     )
 
 
+def expire(now: dt.datetime = None, limit: int = None) -> sa.Update:
+    """
+    Marks expired workplans that have not finished as errors.
+    Finished workplans and the ones that have already expired are not rewritten.
+    """
+    query = sa.update(Workplan).values(
+        {Workplan.status.key: Statuses.error, Workplan.info.key: Error.expired}
+    )
+    if limit is None:
+        return query.filter(*filters.expirable(now))
+
+    ids = sa.select(Workplan.id).filter(*filters.expirable(now)).limit(limit)
+
+    return query.filter(Workplan.id.in_(ids), *filters.expirable(now))
+
+
+def executable(name: str, now: pendulum.DateTime = None) -> sa.Select:
+    return (
+        sa.select(Workplan)
+        .filter(Workplan.name == name, *filters.for_executed(now))
+        .order_by(Workplan.worktime_utc.desc())
+    )
+
+
+def executable_batch(names: list[str], now: pendulum.DateTime = None) -> sa.Select:
+    """executable of many names, grouped by name."""
+    return (
+        sa.select(Workplan)
+        .filter(Workplan.name.in_(names), *filters.for_executed(now))
+        .order_by(Workplan.name, Workplan.worktime_utc.desc())
+    )
+
+
+def claim(
+    dialect_name: str,
+    names: list[str],
+    limit: int,
+    owner: str,
+    lease_expires: pendulum.DateTime,
+    now: pendulum.DateTime,
+) -> sa.Update:
+    """
+    One statement, so two runners never get the same workplan.
+    SQLite has a single writer. In PostgreSQL the candidates are locked,
+    and the rows locked by concurrent claims are skipped instead of waited for.
+    """
+    candidates = (
+        sa.select(Workplan.id)
+        .filter(Workplan.name.in_(names), *filters.for_executed(now))
+        .order_by(Workplan.worktime_utc.desc(), Workplan.name)
+        .limit(limit)
+    )
+    if dialect_name == "postgresql":
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    return (
+        sa.update(Workplan)
+        .filter(Workplan.id.in_(candidates.scalar_subquery()))
+        .filter(*filters.for_executed(now))
+        .values(
+            {
+                Workplan.status: Statuses.run,
+                Workplan.started_utc: now,
+                Workplan.lease_owner: owner,
+                Workplan.lease_expires_utc: lease_expires,
+                Workplan.updated_utc: now,
+            }
+        )
+        .returning(Workplan)
+    )
+
+
+def heartbeat(
+    ids: list[uuid.UUID], owner: str, lease_expires: pendulum.DateTime
+) -> sa.Update:
+    """Extends the leases that the owner still holds."""
+    return (
+        sa.update(Workplan)
+        .filter(
+            Workplan.id.in_(ids),
+            Workplan.lease_owner == owner,
+            Workplan.status.in_(Statuses.run_statuses),
+        )
+        .values({Workplan.lease_expires_utc: lease_expires})
+        .returning(Workplan)
+    )
+
+
+def release_expired_leases(now: dt.datetime = None, limit: int = None) -> sa.Update:
+    """Workplans of runners that stopped sending heartbeats are returned to the queue."""
+    query = sa.update(Workplan).values(
+        {
+            Workplan.status: Statuses.default,
+            Workplan.lease_owner: None,
+            Workplan.lease_expires_utc: None,
+        }
+    )
+    if limit is None:
+        return query.filter(*filters.lease_expired(now))
+
+    ids = sa.select(Workplan.id).filter(*filters.lease_expired(now)).limit(limit)
+
+    return query.filter(Workplan.id.in_(ids), *filters.lease_expired(now))
+
+
+def upsert_definitions(dialect_name: str, rows: list[dict]) -> sa.Insert:
+    query = insert_ignore(dialect_name)(WorkplanDefinition).values(rows)
+
+    return query.on_conflict_do_update(
+        index_elements=[WorkplanDefinition.name],
+        set_={
+            WorkplanDefinition.definition.key: query.excluded.definition,
+            WorkplanDefinition.updated_utc.key: sa.func.now(),
+        },
+    )
+
+
+def get_definitions(names: Iterable[str] | None = None) -> sa.Select:
+    query = sa.select(WorkplanDefinition).order_by(WorkplanDefinition.name)
+    if names is not None:
+        query = query.filter(WorkplanDefinition.name.in_(names))
+
+    return query
+
+
+def delete_definitions(names: Iterable[str]) -> sa.Delete:
+    return sa.delete(WorkplanDefinition).filter(WorkplanDefinition.name.in_(names))
+
+
+def upsert_edges(dialect_name: str, rows: list[dict]) -> sa.Insert:
+    """Changed edges lose their high water mark, their parents are scanned again."""
+    query = insert_ignore(dialect_name)(WorkplanEdge).values(rows)
+
+    return query.on_conflict_do_update(
+        index_elements=[WorkplanEdge.parent_name, WorkplanEdge.name],
+        set_={
+            WorkplanEdge.status_trigger.key: query.excluded.status_trigger,
+            WorkplanEdge.definition.key: query.excluded.definition,
+            WorkplanEdge.high_water_utc.key: None,
+            WorkplanEdge.updated_utc.key: sa.func.now(),
+        },
+    )
+
+
+def get_edges() -> sa.Select:
+    return sa.select(WorkplanEdge).order_by(WorkplanEdge.name, WorkplanEdge.parent_name)
+
+
+def edge_pks() -> sa.Select:
+    return sa.select(WorkplanEdge.parent_name, WorkplanEdge.name)
+
+
+def delete_edges(pks: Iterable[tuple[str, str]]) -> sa.Delete:
+    return sa.delete(WorkplanEdge).filter(
+        sa.tuple_(WorkplanEdge.parent_name, WorkplanEdge.name).in_(list(pks))
+    )
+
+
+def update_high_water(
+    pks: Iterable[tuple[str, str]], high_water: dt.datetime
+) -> sa.Update:
+    return (
+        sa.update(WorkplanEdge)
+        .filter(sa.tuple_(WorkplanEdge.parent_name, WorkplanEdge.name).in_(list(pks)))
+        .values({WorkplanEdge.high_water_utc: high_water})
+    )
+
+
+def update_many(fields: Iterable[str], by_id: bool) -> sa.Update:
+    """
+    UPDATE to be executed with many parameter sets (executemany).
+    Parameters are named "b_" + column name,
+    rows are found by id or by (name, worktime_utc).
+    """
+    columns = Workplan.__table__.c
+    query = sa.update(Workplan.__table__).values(
+        {f: sa.bindparam(f"b_{f}", type_=columns[f].type) for f in fields}
+    )
+    if by_id:
+        return query.where(columns.id == sa.bindparam("b_id", type_=columns.id.type))
+
+    return query.where(
+        columns.name == sa.bindparam("b_name", type_=columns.name.type),
+        columns.worktime_utc
+        == sa.bindparam("b_worktime_utc", type_=columns.worktime_utc.type),
+    )
+
+
+def reset_values() -> dict:
+    """Fields of a workplan that has not run yet."""
+    return {
+        Workplan.status.key: Statuses.default,
+        Workplan.retries.key: 0,
+        Workplan.info.key: None,
+        Workplan.started_utc.key: None,
+        Workplan.finished_utc.key: None,
+        Workplan.data.key: {},
+        Workplan.lease_owner.key: None,
+        Workplan.lease_expires_utc.key: None,
+    }
+
+
 def reset(name: str, worktimes: Iterable[pendulum.DateTime]) -> sa.Update:
     return (
         sa.update(Workplan)
         .returning(Workplan)
         .filter(Workplan.name == name, Workplan.worktime_utc.in_(worktimes))
+        .values(reset_values())
+    )
+
+
+def reset_worktime(name: str, values: dict = None) -> sa.Update:
+    """
+    Makes a workplan of the name as if it has just been created with the values,
+    the id is kept. For executing with many worktimes, of the table,
+    the ORM doesn't execute an UPDATE by other keys with many parameters.
+    """
+    table = Workplan.__table__
+
+    return (
+        sa.update(table)
+        .where(
+            table.c.name == name,
+            table.c.worktime_utc
+            == sa.bindparam("b_worktime_utc", type_=table.c.worktime_utc.type),
+        )
         .values(
             {
-                Workplan.status.key: Statuses.default,
-                Workplan.retries.key: 0,
-                Workplan.info.key: None,
-                Workplan.started_utc.key: None,
-                Workplan.finished_utc.key: None,
-                Workplan.data.key: {},
+                **reset_values(),
+                Workplan.hash.key: None,
+                Workplan.expires_utc.key: None,
+                **(values or {}),
             }
         )
     )
+
+
+def worktimes_between(
+    name: str, start_time: pendulum.DateTime, end_time: pendulum.DateTime
+) -> sa.Select:
+    return sa.select(Workplan.id, Workplan.worktime_utc).where(
+        Workplan.name == name, Workplan.worktime_utc.between(start_time, end_time)
+    )
+
+
+def uuid_expr(dialect_name: str) -> sa.ColumnElement:
+    if dialect_name == "postgresql":
+        return sa.func.gen_random_uuid()
+
+    def random_hex(size: int) -> sa.ColumnElement:
+        return sa.func.hex(sa.func.randomblob(size))
+
+    # sa.Uuid is stored as 32 hex characters on databases without a native type.
+    # The version and the variant are set as in uuid.uuid4, the rest is random.
+    return sa.func.lower(
+        random_hex(6)
+        + "4"
+        + sa.func.substr(random_hex(2), 2)
+        + sa.func.substr("89ab", sa.func.random().op("&")(3) + 1, 1)
+        + sa.func.substr(random_hex(2), 2)
+        + random_hex(6)
+    )
+
+
+def worktime_series(
+    dialect_name: str,
+    start_time: pendulum.DateTime,
+    end_time: pendulum.DateTime,
+    interval_timedelta: dt.timedelta,
+) -> sa.ColumnElement:
+    """Worktimes of the range [start_time, end_time], generated by the database."""
+    if dialect_name == "postgresql":
+        series = sa.func.generate_series(
+            sa.literal(start_time, PendulumDateTime),
+            sa.literal(end_time, PendulumDateTime),
+            sa.literal(interval_timedelta, sa.Interval),
+        )
+        return sa.select(series.label("worktime_utc")).cte("slots").c.worktime_utc
+
+    if dialect_name == "sqlite":
+        size = worktime.count_slots(start_time, end_time, interval_timedelta)
+        slots = sa.select(sa.literal(0).label("n")).cte("slots", recursive=True)
+        slots = slots.union_all(sa.select(slots.c.n + 1).where(slots.c.n + 1 < size))
+        # Same format in which SQLAlchemy stores DateTime in SQLite.
+        return sa.func.strftime(
+            "%Y-%m-%d %H:%M:%S.000000",
+            worktime.to_epoch_microseconds(start_time) // 1_000_000
+            + slots.c.n * interval_timedelta.total_seconds(),
+            "unixepoch",
+        )
+
+    raise NotImplementedError(dialect_name)
+
+
+def insert_ignore(dialect_name: str):
+    return postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+
+
+def insert_workplans(dialect_name: str, rows: list[dict]) -> sa.Insert:
+    """
+    INSERT of the workplans, the ones that already exist are skipped.
+    Returns name, worktime_utc and id of the created workplans.
+    """
+    return (
+        insert_ignore(dialect_name)(Workplan)
+        .values(rows)
+        .on_conflict_do_nothing()
+        .returning(Workplan.name, Workplan.worktime_utc, Workplan.id)
+    )
+
+
+def insert_many_workplans(dialect_name: str) -> sa.Insert:
+    """
+    insert_workplans for executing with a list of rows,
+    SQLAlchemy splits them into pages of multi-row inserts.
+    Of the table, without the overhead of the ORM bulk insert.
+    """
+    table = Workplan.__table__
+
+    return (
+        insert_ignore(dialect_name)(table)
+        .on_conflict_do_nothing()
+        .returning(table.c.name, table.c.worktime_utc, table.c.id)
+    )
+
+
+def insert_worktimes(
+    dialect_name: str,
+    name: str,
+    worktimes: Iterable[pendulum.DateTime],
+    values: dict = None,
+) -> sa.Insert:
+    values = values or {}
+    rows = [
+        {**values, Workplan.name.key: name, Workplan.worktime_utc.key: wt}
+        for wt in worktimes
+    ]
+
+    return insert_workplans(dialect_name, rows)
+
+
+def insert_children(
+    dialect_name: str,
+    name: str,
+    parent_name: str,
+    status_trigger: str,
+    from_worktime: pendulum.DateTime = None,
+    values: dict = None,
+) -> sa.Insert:
+    """
+    INSERT ... SELECT of the worktimes of the parent workplans with the status
+    that the name doesn't have yet. Returns the created workplans.
+    """
+    values = values or {}
+    parent = sa.orm.aliased(Workplan, name="parents")
+    columns = {
+        Workplan.name.key: sa.literal(name, Workplan.name.type),
+        Workplan.worktime_utc.key: parent.worktime_utc,
+        Workplan.id.key: uuid_expr(dialect_name),
+        **{
+            key: sa.literal(value, Workplan.__table__.c[key].type)
+            for key, value in values.items()
+        },
+    }
+    # The parents are found by the (name, status, worktime_utc) index,
+    # the children by the primary key.
+    select = sa.select(*columns.values()).where(
+        parent.name == parent_name,
+        parent.status == status_trigger,
+        ~sa.exists().where(
+            Workplan.name == name, Workplan.worktime_utc == parent.worktime_utc
+        ),
+    )
+    if from_worktime:
+        select = select.where(parent.worktime_utc >= from_worktime)
+
+    return (
+        insert_ignore(dialect_name)(Workplan)
+        .from_select(list(columns), select)
+        .on_conflict_do_nothing()
+        .returning(Workplan)
+    )
+
+
+def insert_graph_children(
+    dialect_name: str,
+    edges_by_name: dict[str, list[WorkplanEdge]],
+    values_by_name: dict[str, dict],
+) -> sa.Insert:
+    """
+    One INSERT ... SELECT of the children of a level of the graph:
+    the worktimes at which all parents of a name have their trigger status
+    and the name doesn't have a workplan yet. Only the worktimes of the parents
+    updated since the high water mark of their edge are candidates.
+    The values must have the same columns for every name. Returns the created workplans.
+    """
+    candidate = sa.orm.aliased(Workplan, name="parents")
+    triggered = sa.orm.aliased(Workplan, name="triggered")
+    selects = []
+    for name, edges in edges_by_name.items():
+        # Found by the (name, updated_utc) index, only the changed rows are read.
+        candidates = [
+            sa.select(candidate.worktime_utc).where(
+                candidate.name == edge.parent_name,
+                candidate.status == edge.status_trigger,
+                *(
+                    [candidate.updated_utc >= edge.high_water_utc]
+                    if edge.high_water_utc
+                    else []
+                ),
+            )
+            for edge in edges
+        ]
+        changed = (
+            sa.union(*candidates) if len(candidates) > 1 else candidates[0]
+        ).subquery("changed")
+        columns = {
+            Workplan.name.key: sa.literal(name, Workplan.name.type),
+            Workplan.worktime_utc.key: changed.c.worktime_utc,
+            Workplan.id.key: uuid_expr(dialect_name),
+            **{
+                key: sa.literal(value, Workplan.__table__.c[key].type)
+                for key, value in values_by_name[name].items()
+            },
+        }
+        # A candidate of one parent waits for the others, by the primary key.
+        all_triggered = [
+            sa.exists().where(
+                triggered.name == edge.parent_name,
+                triggered.worktime_utc == changed.c.worktime_utc,
+                triggered.status == edge.status_trigger,
+            )
+            for edge in edges
+            if len(edges) > 1
+        ]
+        selects.append(
+            sa.select(*columns.values()).where(
+                *all_triggered,
+                ~sa.exists().where(
+                    Workplan.name == name,
+                    Workplan.worktime_utc == changed.c.worktime_utc,
+                ),
+            )
+        )
+
+    select = sa.union_all(*selects) if len(selects) > 1 else selects[0]
+
+    return (
+        insert_ignore(dialect_name)(Workplan)
+        .from_select(list(columns), select)
+        .on_conflict_do_nothing()
+        .returning(Workplan)
+    )
+
+
+def insert_missing(
+    dialect_name: str,
+    name: str,
+    start_time: pendulum.DateTime,
+    end_time: pendulum.DateTime,
+    interval_timedelta: dt.timedelta,
+    values: dict = None,
+) -> sa.Insert:
+    """
+    INSERT ... SELECT of the worktimes of the range that the name doesn't have yet.
+    Returns id and worktime_utc of the created workplans.
+    """
+    values = values or {}
+    worktime_utc = worktime_series(
+        dialect_name, start_time, end_time, interval_timedelta
+    )
+    columns = {
+        Workplan.name.key: sa.literal(name, Workplan.name.type),
+        Workplan.worktime_utc.key: worktime_utc,
+        Workplan.id.key: uuid_expr(dialect_name),
+        **{
+            key: sa.literal(value, Workplan.__table__.c[key].type)
+            for key, value in values.items()
+        },
+    }
+    select = sa.select(*columns.values()).where(
+        ~sa.exists().where(Workplan.name == name, Workplan.worktime_utc == worktime_utc)
+    )
+
+    return (
+        insert_ignore(dialect_name)(Workplan)
+        .from_select(list(columns), select)
+        .on_conflict_do_nothing()
+        .returning(Workplan.id, Workplan.worktime_utc)
+    )
@@ -1,41 +1,153 @@
+import time
 from contextlib import contextmanager
 
 import orjson
 from script_master_helper.utils import custom_encoder
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from workplanner.models import Base
+from workplanner import metrics, migrations
 from workplanner.settings import Settings
 
+
+def engine_options(url: str) -> dict:
+    """Pool and driver options from the settings."""
+    url = make_url(url)
+    options = {
+        "json_serializer": lambda obj: orjson.dumps(obj, default=custom_encoder),
+        "pool_pre_ping": Settings().pool_pre_ping,
+        "pool_recycle": Settings().pool_recycle,
+    }
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory databases are kept in a single connection per thread.
+        return options
+
+    options.update(
+        pool_size=Settings().pool_size,
+        max_overflow=Settings().max_overflow,
+        pool_timeout=Settings().pool_timeout,
+    )
+
+    return options
+
+
+def sqlite_pragmas() -> dict:
+    return {
+        "journal_mode": Settings().sqlite_journal_mode,
+        "synchronous": Settings().sqlite_synchronous,
+        "busy_timeout": Settings().sqlite_busy_timeout,
+    }
+
+
+def set_sqlite_pragmas(engine: Engine, pragmas: dict) -> None:
+    """Pragmas are per connection, so they are applied to each new one."""
+    pragmas = {k: v for k, v in pragmas.items() if v not in (None, "")}
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def instrument_queries(engine: Engine) -> None:
+    """Durations of the queries for the metrics, the failed ones are not measured."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        metrics.DB_QUERY_DURATION.observe(
+            time.perf_counter() - context.query_start,
+            operation=metrics.statement_operation(statement),
+        )
+
+
 if not Settings().database_url or "sqlite" in Settings().database_url:
     # For SQlite.
     engine = create_engine(
         Settings().database_url or Settings().default_database_url,
         connect_args={"check_same_thread": False},
-        json_serializer=lambda obj: orjson.dumps(obj, default=custom_encoder),
+        **engine_options(Settings().database_url or Settings().default_database_url),
     )
+    set_sqlite_pragmas(engine, sqlite_pragmas())
 else:
     engine = create_engine(
-        Settings().database_url,
-        json_serializer=lambda obj: orjson.dumps(obj, default=custom_encoder),
+        Settings().database_url, **engine_options(Settings().database_url)
     )
 
+instrument_queries(engine)
+
 SessionLocal = sessionmaker(engine, autoflush=False, expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+_async_engine: AsyncEngine | None = None
+
+
+def async_url(url: str) -> str:
+    """The same database, but through an asyncio driver."""
+    url = make_url(url)
+    if url.get_backend_name() not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver for {url.get_backend_name()}")
+
+    return url.set(
+        drivername=f"{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}"
+    ).render_as_string(hide_password=False)
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    The engine is created on first use,
+    so the asyncio drivers are only required when the async API is enabled.
+    """
+    global _async_engine
+
+    if _async_engine is None:
+        url = Settings().database_url or Settings().default_database_url
+        _async_engine = create_async_engine(async_url(url), **engine_options(url))
+        if make_url(url).get_backend_name() == "sqlite":
+            set_sqlite_pragmas(_async_engine.sync_engine, sqlite_pragmas())
+        instrument_queries(_async_engine.sync_engine)
+        AsyncSessionLocal.configure(bind=_async_engine)
+
+    return _async_engine
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine
+
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
 
 
 def init_models() -> None:
-    Base.metadata.create_all(engine)
+    migrations.migrate(engine)
 
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
+        # Not reached if the request failed, then the session is rolled back.
+        db.commit()
     finally:
         db.close()
 
 
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+        await db.commit()
+
+
 @contextmanager
 def open_session():
     return get_db()
@@ -1,6 +1,6 @@
 from typing import Any
 
-from fastapi import HTTPException
+from fastapi import HTTPException, status
 from pydantic import BaseModel
 from script_master_helper.workplanner.client import errors
 
@@ -10,6 +10,13 @@ class HttpErrorDetail(BaseModel):
     detail: Any
 
 
+def get_422_exception(message: str, detail: Any = None):
+    return HTTPException(
+        status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail=HttpErrorDetail(message=message, detail=detail),
+    )
+
+
 def get_404_exception(id_or_name):
     return HTTPException(
         errors.not_found_error.code,
@@ -0,0 +1,130 @@
+"""
+In-process notifications about names that have new executable workplans.
+
+The service marks the names in the session with `notify`,
+they are published when the session commits,
+so subscribers never hear about workplans they can't read yet.
+Other in-process listeners are called after the commit with `call_after_commit`.
+Subscriptions live in an event loop and are fed thread-safely,
+an idle subscriber only waits on its event.
+"""
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Iterable
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PENDING_KEY = "executable_names"
+CALLBACKS_KEY = "after_commit_callbacks"
+
+
+class Subscription:
+    def __init__(self, names: Iterable[str] | None, loop: asyncio.AbstractEventLoop):
+        self.names = frozenset(names) if names else None
+        self.loop = loop
+        self._pending: set[str] = set()
+        self._event = asyncio.Event()
+
+    def push(self, names: set[str]) -> None:
+        """Called in the loop of the subscription."""
+        self._pending.update(names)
+        self._event.set()
+
+    async def get(self, timeout: float | None = None) -> set[str]:
+        """
+        Names published since the previous call, they are merged while nobody reads,
+        so nothing is lost by a slow subscriber. Empty after the timeout.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return set()
+
+        self._event.clear()
+        names, self._pending = self._pending, set()
+
+        return names
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: set[Subscription] = set()
+
+    def subscribe(self, names: Iterable[str] | None = None) -> Subscription:
+        """Must be called in an event loop. Without names, all of them are received."""
+        subscription = Subscription(names, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, names: Iterable[str]) -> None:
+        """Can be called from any thread."""
+        names = set(names)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            matched = names & subscription.names if subscription.names else names
+            if matched:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.push, matched)
+                except RuntimeError:
+                    # The loop is closed, the subscriber has gone.
+                    self.unsubscribe(subscription)
+
+
+bus = EventBus()
+
+
+async def iter_sse(
+    names: Iterable[str] | None, keepalive: float
+) -> AsyncIterator[bytes]:
+    """
+    Server-sent events: "executable" with the names that have new executable workplans.
+    A comment is sent when there were no events for a while, to keep the connection open.
+    """
+    subscription = bus.subscribe(names)
+    try:
+        yield b": subscribed\n\n"
+        while True:
+            published = await subscription.get(keepalive)
+            if published:
+                data = orjson.dumps({"names": sorted(published)})
+                yield b"event: executable\ndata: " + data + b"\n\n"
+            else:
+                yield b": keepalive\n\n"
+    finally:
+        bus.unsubscribe(subscription)
+
+
+def notify(db: Session, *names: str) -> None:
+    db.info.setdefault(PENDING_KEY, set()).update(names)
+
+
+def call_after_commit(db: Session, callback: Callable[[], None]) -> None:
+    """Once per session commit, the callback is dropped if the session rolls back."""
+    db.info.setdefault(CALLBACKS_KEY, {})[callback] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(db: Session) -> None:
+    names = db.info.pop(PENDING_KEY, None)
+    if names:
+        bus.publish(names)
+
+    for callback in db.info.pop(CALLBACKS_KEY, {}):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(db: Session) -> None:
+    db.info.pop(PENDING_KEY, None)
+    db.info.pop(CALLBACKS_KEY, None)
@@ -0,0 +1,38 @@
+"""
+Marks expired workplans as errors in the background,
+so that expiration is not evaluated on every request.
+"""
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from workplanner import metrics, service
+from workplanner.background import BatchSweeper
+from workplanner.database import SessionLocal
+from workplanner.settings import Settings
+
+
+class ExpirationSweeper(BatchSweeper):
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        interval: float,
+        batch_size: int,
+    ):
+        super().__init__(
+            "expiration-sweeper",
+            service.expire,
+            session_factory,
+            interval,
+            batch_size,
+            unit="expired",
+            counter=metrics.EXPIRED_WORKPLANS,
+            message="Expired {} workplans",
+        )
+
+
+sweeper = ExpirationSweeper(
+    SessionLocal,
+    interval=Settings().expiration_interval,
+    batch_size=Settings().expiration_batch_size,
+)
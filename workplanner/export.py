@@ -0,0 +1,111 @@
+"""Serialization of workplans into streamed formats."""
+import csv
+import io
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from script_master_helper.utils import custom_encoder
+
+from workplanner import schemas
+from workplanner.models import Workplan
+
+FIELDS = list(schemas.Workplan.__fields__)
+
+
+def _rows(items: Iterable[Workplan]) -> Iterator[dict]:
+    for item in items:
+        yield schemas.Workplan.from_orm(item).dict()
+
+
+def _ndjson(items: Iterable[Workplan]) -> bytes:
+    return b"".join(
+        orjson.dumps(row, default=custom_encoder) + b"\n" for row in _rows(items)
+    )
+
+
+def _csv(items: Iterable[Workplan], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    if header:
+        writer.writeheader()
+    for row in _rows(items):
+        row["data"] = orjson.dumps(row["data"], default=custom_encoder).decode()
+        writer.writerow(row)
+
+    return buffer.getvalue()
+
+
+def iter_ndjson(partitions: Iterable[Iterable[Workplan]]) -> Iterator[bytes]:
+    """One chunk of newline-delimited JSON per partition of rows."""
+    for items in partitions:
+        yield _ndjson(items)
+
+
+def iter_csv(partitions: Iterable[Iterable[Workplan]]) -> Iterator[str]:
+    """A header, then one chunk of CSV per partition of rows."""
+    header = True
+    for items in partitions:
+        yield _csv(items, header)
+        header = False
+
+    if header:
+        yield _csv([], header)
+
+
+async def aiter_ndjson(
+    partitions: AsyncIterable[Iterable[Workplan]],
+) -> AsyncIterator[bytes]:
+    async for items in partitions:
+        yield _ndjson(items)
+
+
+async def aiter_csv(
+    partitions: AsyncIterable[Iterable[Workplan]],
+) -> AsyncIterator[str]:
+    header = True
+    async for items in partitions:
+        yield _csv(items, header)
+        header = False
+
+    if header:
+        yield _csv([], header)
+
+
+def _generated(name: str, items: Iterable[Workplan]) -> bytes:
+    result = schemas.GenerateWorkplansResult(
+        name=name, workplans=schemas.Workplan.list_from_orm(items)
+    )
+
+    return orjson.dumps(jsonable_encoder(result)) + b"\n"
+
+
+def iter_generated(results: Iterable[tuple[str, list[Workplan]]]) -> Iterator[bytes]:
+    """One line of newline-delimited JSON per name of generate_workplans_batch."""
+    for name, items in results:
+        yield _generated(name, items)
+
+
+async def aiter_generated(
+    names: Iterable[str], items: AsyncIterable[Workplan]
+) -> AsyncIterator[bytes]:
+    """
+    The lines of iter_generated from the executable workplans ordered by name,
+    then the lines of the names without them.
+    """
+    written = set()
+    group = []
+    async for item in items:
+        if group and item.name != group[0].name:
+            written.add(group[0].name)
+            yield _generated(group[0].name, group)
+            group = []
+        group.append(item)
+
+    if group:
+        written.add(group[0].name)
+        yield _generated(group[0].name, group)
+
+    for name in dict.fromkeys(names):
+        if name not in written:
+            yield _generated(name, [])
@@ -1,13 +1,44 @@
 import datetime as dt
 
+import pendulum
+import sqlalchemy as sa
 from script_master_helper.workplanner.enums import Statuses
 
 from workplanner.models import Workplan
 
-not_expired = (dt.datetime.utcnow() < Workplan.expires_utc) | (
-    Workplan.expires_utc.is_(None)
-)
+# Statuses of workplans that have not finished yet.
+active_statuses = (Statuses.add, Statuses.queue, Statuses.run)
 
-expired = dt.datetime.utcnow() >= Workplan.expires_utc
 
-for_executed = (Workplan.status.in_(Statuses.for_executed), not_expired)
+def literal_in(column, values) -> sa.ColumnElement[bool]:
+    """
+    IN with the values rendered into the SQL,
+    so the planner can match the WHERE of a partial index.
+    """
+    return column.in_([sa.literal(v, literal_execute=True) for v in values])
+
+
+def not_expired(now: dt.datetime = None) -> sa.ColumnElement[bool]:
+    now = now or pendulum.now()
+    return (Workplan.expires_utc > now) | (Workplan.expires_utc.is_(None))
+
+
+def expired(now: dt.datetime = None) -> sa.ColumnElement[bool]:
+    now = now or pendulum.now()
+    return Workplan.expires_utc <= now
+
+
+def expirable(now: dt.datetime = None) -> tuple[sa.ColumnElement[bool], ...]:
+    return literal_in(Workplan.status, active_statuses), expired(now)
+
+
+def lease_expired(now: dt.datetime = None) -> tuple[sa.ColumnElement[bool], ...]:
+    now = now or pendulum.now()
+    return (
+        literal_in(Workplan.status, Statuses.run_statuses),
+        Workplan.lease_expires_utc <= now,
+    )
+
+
+def for_executed(now: dt.datetime = None) -> tuple[sa.ColumnElement[bool], ...]:
+    return literal_in(Workplan.status, Statuses.for_executed), not_expired(now)
@@ -0,0 +1,42 @@
+"""
+Returns workplans of lost runners to the queue in the background.
+
+A claimed workplan has a lease that its runner extends with heartbeats.
+Only the leases that have expired are released,
+workplans of the runners that are alive are not touched.
+"""
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from workplanner import metrics, service
+from workplanner.background import BatchSweeper
+from workplanner.database import SessionLocal
+from workplanner.settings import Settings
+
+
+class LeaseReaper(BatchSweeper):
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        interval: float,
+        batch_size: int,
+    ):
+        super().__init__(
+            "lease-reaper",
+            service.release_expired_leases,
+            session_factory,
+            interval,
+            batch_size,
+            unit="released",
+            counter=metrics.RELEASED_LEASES,
+            message="Released {} workplans with expired leases",
+            level="WARNING",
+        )
+
+
+reaper = LeaseReaper(
+    SessionLocal,
+    interval=Settings().lease_reap_interval,
+    batch_size=Settings().lease_reap_batch_size,
+)
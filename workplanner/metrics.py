@@ -0,0 +1,233 @@
+"""
+Metrics of the service in the Prometheus text format, served at /metrics.
+
+A small registry instead of a client library: counters, gauges and histograms
+with labels, kept in the memory of the process and updated from any thread.
+"""
+import bisect
+import math
+import threading
+from typing import Iterable
+
+from script_master_helper.workplanner.enums import Statuses
+
+# The charset is appended by the response.
+CONTENT_TYPE = "text/plain; version=0.0.4"
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+UNMATCHED_ROUTE = "unmatched"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Iterable[tuple[str, str]]) -> str:
+    labels = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+    return f"{{{labels}}}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric") -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type_ = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: Registry = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+        registry.register(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} has the labels {self.labelnames}")
+
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self, key: tuple[str, ...], value) -> list[str]:
+        labels = _format_labels(zip(self.labelnames, key))
+
+        return [f"{self.name}{labels} {_format_value(value)}"]
+
+    def render(self) -> str:
+        with self._lock:
+            values = sorted(self._values.items())
+
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_}",
+        ]
+        for key, value in values:
+            lines.extend(self._samples(key, value))
+
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    type_ = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_ = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def replace(self, values: dict[tuple[str, ...], float]) -> None:
+        """All values at once, by label values, the ones that are not given are removed."""
+        for key in values:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} has the labels {self.labelnames}")
+
+        with self._lock:
+            self._values = {tuple(map(str, k)): v for k, v in values.items()}
+
+
+class Histogram(Metric):
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: Registry = REGISTRY,
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        # Values equal to the upper bound belong to its bucket, the last one is +Inf.
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            # A copy, the rendering reads the previous one without the lock.
+            counts = list(counts)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self, key: tuple[str, ...], value) -> list[str]:
+        counts, total = value
+        pairs = list(zip(self.labelnames, key))
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            labels = _format_labels([*pairs, ("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+
+        labels = _format_labels(pairs)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+
+        return lines
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "workplanner_http_request_duration_seconds",
+    "Latency of the HTTP requests by route.",
+    ["method", "route", "status"],
+)
+DB_QUERY_DURATION = Histogram(
+    "workplanner_db_query_duration_seconds",
+    "Duration of the database queries by the first keyword of the statement.",
+    ["operation"],
+)
+WORKPLANS_CREATED = Counter(
+    "workplanner_workplans_created_total",
+    "Workplans created by generation, including the rolled back ones.",
+    ["source"],
+)
+WORKPLANS = Gauge(
+    "workplanner_workplans",
+    "Current number of workplans by status, updated when the metrics are read.",
+    ["status"],
+)
+EXPIRED_WORKPLANS = Counter(
+    "workplanner_expired_workplans_total", "Workplans expired by the sweeper."
+)
+RELEASED_LEASES = Counter(
+    "workplanner_released_leases_total", "Expired leases released by the reaper."
+)
+
+
+def route_label(scope: dict) -> str:
+    """Path template of the matched route, so that path parameters don't make new series."""
+    route = scope.get("route")
+
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+def statement_operation(statement: str) -> str:
+    words = statement.split(None, 1)
+
+    return words[0].upper() if words else ""
+
+
+def set_status_counts(counts: dict[str, int]) -> None:
+    WORKPLANS.replace(
+        {
+            (status,): counts.get(status, 0)
+            for status in {*Statuses.all_statuses, *counts}
+        }
+    )
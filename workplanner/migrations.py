@@ -0,0 +1,305 @@
+"""
+Schema migrations of existing databases.
+
+New tables are created by create_all, changes of the existing ones are
+migrations: numbered steps that are applied once and recorded in schema_migrations.
+Every step checks the current schema first, so it is a no-op on a database
+created from the current models, and it can be repeated after a failure.
+
+Indexes are built without blocking writes: CREATE INDEX CONCURRENTLY in PostgreSQL.
+Summary tables maintained by triggers on workplans are created by migrations,
+with their triggers, and the history is counted in batches after that.
+"""
+import re
+from typing import Callable, NamedTuple
+
+import pendulum
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateIndex
+
+from workplanner import const
+from workplanner.fields import PendulumDateTime
+from workplanner.logger import logger
+from workplanner.models import (
+    FATAL_ERRORS_BACKFILL,
+    FATAL_ERRORS_TRIGGERS,
+    NAMES_BACKFILL,
+    NAMES_TRIGGERS,
+    STATUS_COUNTS_BACKFILL,
+    Base,
+    Workplan,
+    WorkplanFatalErrors,
+    WorkplanName,
+    WorkplanStatusCount,
+)
+
+schema_migrations = sa.Table(
+    "schema_migrations",
+    Base.metadata,
+    sa.Column("version", sa.String(30), primary_key=True),
+    sa.Column("description", sa.String(200), nullable=False),
+    sa.Column("applied_utc", PendulumDateTime, nullable=False),
+)
+
+
+# Created by the migrations, with the triggers that maintain them.
+SUMMARY_TABLES = [
+    WorkplanFatalErrors.__table__,
+    WorkplanName.__table__,
+    WorkplanStatusCount.__table__,
+]
+
+
+class Migration(NamedTuple):
+    version: str
+    description: str
+    apply: Callable[[sa.Engine], None]
+
+
+def _columns(bind, table_name: str) -> set[str]:
+    return {column["name"] for column in sa.inspect(bind).get_columns(table_name)}
+
+
+def _indexes(bind, table_name: str) -> set[str]:
+    return {index["name"] for index in sa.inspect(bind).get_indexes(table_name)}
+
+
+def add_columns(engine: sa.Engine, table: sa.Table, names: list[str]) -> list[str]:
+    """ALTER TABLE ADD COLUMN of the model columns that are missing."""
+    added = []
+    with engine.begin() as conn:
+        existing = _columns(conn, table.name)
+        for name in names:
+            if name not in existing:
+                column = table.c[name]
+                type_ = column.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {type_}"
+                )
+                added.append(name)
+
+    return added
+
+
+def _invalid_indexes(conn) -> set[str]:
+    """Left by a failed CREATE INDEX CONCURRENTLY in PostgreSQL."""
+    if conn.dialect.name != "postgresql":
+        return set()
+
+    query = sa.text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE NOT i.indisvalid"
+    )
+
+    return set(conn.execute(query).scalars())
+
+
+def concurrent_index_ddl(index: sa.Index, dialect: sa.Dialect) -> str:
+    """CREATE INDEX CONCURRENTLY of PostgreSQL, it doesn't lock the table for writes."""
+    ddl = str(CreateIndex(index).compile(dialect=dialect))
+
+    return re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", ddl)
+
+
+def create_index(engine: sa.Engine, index: sa.Index) -> None:
+    if engine.dialect.name != "postgresql":
+        with engine.begin() as conn:
+            index.create(conn)
+        return
+
+    # Concurrent builds can't run inside a transaction.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql(concurrent_index_ddl(index, engine.dialect))
+
+
+def drop_index(engine: sa.Engine, name: str) -> None:
+    if engine.dialect.name != "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        return
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def ensure_indexes(engine: sa.Engine, names: list[str] | None = None) -> list[str]:
+    """
+    Creates the model indexes missing in the database, all of them or the named ones.
+    create_all skips the tables that exist, so it doesn't create them.
+    """
+    created = []
+    for table in Base.metadata.sorted_tables:
+        with engine.connect() as conn:
+            if not sa.inspect(conn).has_table(table.name):
+                continue
+            existing = _indexes(conn, table.name)
+            invalid = _invalid_indexes(conn)
+
+        for index in table.indexes:
+            if names is not None and index.name not in names:
+                continue
+            if index.name in invalid:
+                drop_index(engine, index.name)
+            elif index.name in existing:
+                continue
+
+            create_index(engine, index)
+            created.append(index.name)
+
+    return created
+
+
+def create_summary_tables(
+    engine: sa.Engine, tables: list[sa.Table], triggers: dict[str, list[str]]
+) -> None:
+    """
+    The tables and the triggers on workplans that maintain them, in one short transaction.
+    Existing triggers are replaced, so that a later migration can change them.
+    """
+    with engine.begin() as conn:
+        for table in tables:
+            table.create(conn, checkfirst=True)
+        for statement in triggers.get(engine.dialect.name, []):
+            if engine.dialect.name == "sqlite":
+                # SQLite has no CREATE OR REPLACE TRIGGER.
+                name = re.search(r"CREATE TRIGGER (\w+)", statement).group(1)
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+            conn.exec_driver_sql(statement)
+
+
+def backfill(
+    engine: sa.Engine,
+    tables: list[sa.Table],
+    statements: list[str],
+    batch_size: int = const.BACKFILL_BATCH_SIZE,
+) -> int:
+    """
+    Counts the history into the summary tables, a batch of names per transaction,
+    while their triggers already count the changes. The rows of the names of a batch
+    are replaced by the statements, which count the names between :first and :last.
+    In PostgreSQL the tables are locked against the triggers until the batch is committed,
+    so that a change is neither lost nor counted twice. SQLite has a single writer.
+    Returns the number of names.
+    """
+    names_query = (
+        sa.select(Workplan.name)
+        .group_by(Workplan.name)
+        .order_by(Workplan.name)
+        .limit(batch_size)
+    )
+    count = 0
+    last = None
+    while True:
+        query = names_query if last is None else names_query.where(Workplan.name > last)
+        with engine.connect() as conn:
+            names = conn.execute(query).scalars().all()
+        if not names:
+            return count
+
+        first, last = names[0], names[-1]
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                for table in tables:
+                    conn.exec_driver_sql(f"LOCK TABLE {table.name} IN EXCLUSIVE MODE")
+            for table in tables:
+                conn.execute(table.delete().where(table.c.name.between(first, last)))
+            for statement in statements:
+                conn.execute(sa.text(statement), {"first": first, "last": last})
+
+        count += len(names)
+        logger.info(
+            "Counted the history of {} names into {}", count, [t.name for t in tables]
+        )
+
+
+def _add_lease_columns(engine: sa.Engine) -> None:
+    add_columns(
+        engine,
+        Workplan.__table__,
+        [Workplan.lease_owner.key, Workplan.lease_expires_utc.key],
+    )
+
+
+def _create_query_indexes(engine: sa.Engine) -> None:
+    ensure_indexes(
+        engine,
+        [
+            "ix_workplans_executable",
+            "ix_workplans_name_status_worktime_utc",
+            "ix_workplans_active_expires_utc",
+            "ix_workplans_running_lease_expires_utc",
+        ],
+    )
+
+
+def _drop_replaced_indexes(engine: sa.Engine) -> None:
+    for name in (
+        "ix_workplans_status_expires_utc",
+        "ix_workplans_status_lease_expires_utc",
+    ):
+        drop_index(engine, name)
+
+
+def _create_fatal_errors(engine: sa.Engine) -> None:
+    table = WorkplanFatalErrors.__table__
+    create_summary_tables(engine, [table], FATAL_ERRORS_TRIGGERS)
+    backfill(engine, [table], [FATAL_ERRORS_BACKFILL])
+    # The limit of fatal errors is checked with the counters.
+    drop_index(engine, "ix_workplans_name_hash_status")
+
+
+def _create_name_summaries(engine: sa.Engine) -> None:
+    # Both tables are maintained by the same triggers.
+    tables = [WorkplanName.__table__, WorkplanStatusCount.__table__]
+    create_summary_tables(engine, tables, NAMES_TRIGGERS)
+    backfill(engine, tables, [NAMES_BACKFILL, STATUS_COUNTS_BACKFILL])
+
+
+def _create_graph_index(engine: sa.Engine) -> None:
+    # The edges are in workplan_edges, create_all adds it.
+    ensure_indexes(engine, ["ix_workplans_name_updated_utc"])
+
+
+MIGRATIONS = [
+    Migration("0001", "Lease columns of workplans", _add_lease_columns),
+    Migration("0002", "Indexes of the hot queries", _create_query_indexes),
+    Migration(
+        "0003", "Drop the indexes replaced by partial ones", _drop_replaced_indexes
+    ),
+    Migration("0004", "Counters of fatal errors", _create_fatal_errors),
+    Migration("0005", "Dependency graph of child workplans", _create_graph_index),
+    Migration("0006", "Summaries of names and statuses", _create_name_summaries),
+]
+
+
+def applied_versions(engine: sa.Engine) -> set[str]:
+    with engine.connect() as conn:
+        return set(conn.execute(sa.select(schema_migrations.c.version)).scalars())
+
+
+def migrate(engine: sa.Engine, migrations: list[Migration] = None) -> list[str]:
+    """Creates the missing tables and applies the pending migrations in order."""
+    Base.metadata.create_all(
+        engine,
+        tables=[t for t in Base.metadata.sorted_tables if t not in SUMMARY_TABLES],
+    )
+    applied = applied_versions(engine)
+    versions = []
+
+    for migration in migrations or MIGRATIONS:
+        if migration.version in applied:
+            continue
+
+        logger.info("Migration {} {}", migration.version, migration.description)
+        migration.apply(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                schema_migrations.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_utc=pendulum.now(),
+                )
+            )
+        versions.append(migration.version)
+
+    return versions
@@ -30,8 +30,12 @@ class Workplan(Base):
     hash: Mapped[str] = mapped_column(sa.String(30), nullable=True)
     retries: Mapped[int] = mapped_column(default=0, nullable=False)
     info: Mapped[str] = mapped_column(nullable=True)
-    data: Mapped[dict] = mapped_column(sa.JSON, default="{}", nullable=False)
+    data: Mapped[dict] = mapped_column(sa.JSON, default=dict, nullable=False)
     expires_utc: Mapped[dt.datetime] = mapped_column(PendulumDateTime, nullable=True)
+    lease_owner: Mapped[str] = mapped_column(sa.String(100), nullable=True)
+    lease_expires_utc: Mapped[dt.datetime] = mapped_column(
+        PendulumDateTime, nullable=True
+    )
     started_utc: Mapped[dt.datetime] = mapped_column(PendulumDateTime, nullable=True)
     finished_utc: Mapped[dt.datetime] = mapped_column(PendulumDateTime, nullable=True)
     created_utc: Mapped[dt.datetime] = mapped_column(
@@ -52,3 +56,316 @@ class Workplan(Base):
     def duration(self) -> int | None:
         if self.finished_utc and self.started_utc:
             return int((self.finished_utc - self.started_utc).total_seconds())
+
+
+# Indexes of the hot queries: executable lists and claims, retries of errors,
+# the expiration sweep, the release of leases and the parents changed since the last graph pass.
+# The WHERE of the partial indexes repeats the filters with literal statuses.
+_executable_statuses = Workplan.status.in_(Statuses.for_executed)
+sa.Index(
+    "ix_workplans_executable",
+    Workplan.name,
+    Workplan.worktime_utc.desc(),
+    sqlite_where=_executable_statuses,
+    postgresql_where=_executable_statuses,
+)
+sa.Index(
+    "ix_workplans_name_status_worktime_utc",
+    Workplan.name,
+    Workplan.status,
+    Workplan.worktime_utc.desc(),
+)
+sa.Index(
+    "ix_workplans_name_updated_utc",
+    Workplan.name,
+    Workplan.updated_utc,
+)
+_active_statuses = Workplan.status.in_([Statuses.add, Statuses.queue, Statuses.run])
+sa.Index(
+    "ix_workplans_active_expires_utc",
+    Workplan.expires_utc,
+    sqlite_where=_active_statuses,
+    postgresql_where=_active_statuses,
+)
+_run_statuses = Workplan.status.in_(Statuses.run_statuses)
+sa.Index(
+    "ix_workplans_running_lease_expires_utc",
+    Workplan.lease_expires_utc,
+    sqlite_where=_run_statuses,
+    postgresql_where=_run_statuses,
+)
+
+
+class WorkplanDefinition(Base):
+    """GenerateWorkplans stored for the scheduler, as JSON."""
+
+    __tablename__ = "workplan_definitions"
+
+    name: Mapped[str] = mapped_column(sa.String(100), primary_key=True)
+    definition: Mapped[dict] = mapped_column(sa.JSON, nullable=False)
+    created_utc: Mapped[dt.datetime] = mapped_column(
+        PendulumDateTime, default=pendulum.now, server_default=sa.func.now()
+    )
+    updated_utc: Mapped[dt.datetime] = mapped_column(
+        PendulumDateTime,
+        default=pendulum.now,
+        server_default=sa.func.now(),
+        onupdate=sa.func.now(),
+    )
+
+
+class WorkplanEdge(Base):
+    """
+    Parent of a child workplan in the dependency graph, with GenerateChildWorkplans as JSON.
+    Parents updated before high_water_utc have already been generated from.
+    """
+
+    __tablename__ = "workplan_edges"
+
+    parent_name: Mapped[str] = mapped_column(sa.String(100), primary_key=True)
+    name: Mapped[str] = mapped_column(sa.String(100), primary_key=True, index=True)
+    status_trigger: Mapped[str] = mapped_column(sa.String(30), nullable=False)
+    definition: Mapped[dict] = mapped_column(sa.JSON, nullable=False)
+    high_water_utc: Mapped[dt.datetime] = mapped_column(PendulumDateTime, nullable=True)
+    created_utc: Mapped[dt.datetime] = mapped_column(
+        PendulumDateTime, default=pendulum.now, server_default=sa.func.now()
+    )
+    updated_utc: Mapped[dt.datetime] = mapped_column(
+        PendulumDateTime,
+        default=pendulum.now,
+        server_default=sa.func.now(),
+        onupdate=sa.func.now(),
+    )
+
+
+class WorkplanFatalErrors(Base):
+    """
+    Number of fatal errors per name and hash, the limit of fatal errors is checked here
+    instead of counting the history. Maintained by triggers on workplans,
+    in the same transaction as the change of the status. NULL hashes are stored as ''.
+    The table and its triggers are created by a migration.
+    """
+
+    __tablename__ = "workplan_fatal_errors"
+
+    name: Mapped[str] = mapped_column(sa.String(100), primary_key=True)
+    hash: Mapped[str] = mapped_column(sa.String(30), primary_key=True)
+    fatal_errors: Mapped[int] = mapped_column(default=0, nullable=False)
+
+
+_FATAL_ERRORS_UPSERT = """
+    INSERT INTO workplan_fatal_errors (name, hash, fatal_errors)
+    VALUES (NEW.name, coalesce(NEW.hash, ''), 1)
+    ON CONFLICT (name, hash)
+    DO UPDATE SET fatal_errors = workplan_fatal_errors.fatal_errors + 1;
+"""
+_FATAL_ERRORS_DECREMENT = """
+    UPDATE workplan_fatal_errors SET fatal_errors = fatal_errors - 1
+    WHERE name = OLD.name AND hash = coalesce(OLD.hash, '');
+"""
+FATAL_ERRORS_TRIGGERS = {
+    "sqlite": [
+        f"""
+        CREATE TRIGGER workplans_fatal_errors_insert AFTER INSERT ON workplans
+        WHEN NEW.status = '{Statuses.fatal_error}'
+        BEGIN {_FATAL_ERRORS_UPSERT} END
+        """,
+        f"""
+        CREATE TRIGGER workplans_fatal_errors_delete AFTER DELETE ON workplans
+        WHEN OLD.status = '{Statuses.fatal_error}'
+        BEGIN {_FATAL_ERRORS_DECREMENT} END
+        """,
+        f"""
+        CREATE TRIGGER workplans_fatal_errors_update_old
+        AFTER UPDATE OF name, hash, status ON workplans
+        WHEN OLD.status = '{Statuses.fatal_error}'
+        BEGIN {_FATAL_ERRORS_DECREMENT} END
+        """,
+        f"""
+        CREATE TRIGGER workplans_fatal_errors_update_new
+        AFTER UPDATE OF name, hash, status ON workplans
+        WHEN NEW.status = '{Statuses.fatal_error}'
+        BEGIN {_FATAL_ERRORS_UPSERT} END
+        """,
+    ],
+    "postgresql": [
+        f"""
+        CREATE OR REPLACE FUNCTION workplans_fatal_errors() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = '{Statuses.fatal_error}' THEN
+                {_FATAL_ERRORS_DECREMENT}
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = '{Statuses.fatal_error}' THEN
+                {_FATAL_ERRORS_UPSERT}
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE TRIGGER workplans_fatal_errors
+        AFTER INSERT OR DELETE OR UPDATE OF name, hash, status ON workplans
+        FOR EACH ROW EXECUTE FUNCTION workplans_fatal_errors()
+        """,
+    ],
+}
+# Counts the history of the names between :first and :last.
+FATAL_ERRORS_BACKFILL = f"""
+    INSERT INTO workplan_fatal_errors (name, hash, fatal_errors)
+    SELECT name, coalesce(hash, ''), count(*) FROM workplans
+    WHERE status = '{Statuses.fatal_error}' AND name BETWEEN :first AND :last
+    GROUP BY name, coalesce(hash, '')
+"""
+
+
+class WorkplanName(Base):
+    """
+    The last worktime and hash and the first worktime of each name,
+    generation reads them here instead of the history. Maintained by triggers on workplans,
+    created by a migration with the status counts.
+    """
+
+    __tablename__ = "workplan_names"
+
+    name: Mapped[str] = mapped_column(sa.String(100), primary_key=True)
+    worktime_utc: Mapped[dt.datetime] = mapped_column(PendulumDateTime, nullable=True)
+    hash: Mapped[str] = mapped_column(sa.String(30), nullable=True)
+    first_worktime_utc: Mapped[dt.datetime] = mapped_column(
+        PendulumDateTime, nullable=True
+    )
+
+
+class WorkplanStatusCount(Base):
+    """Number of workplans per name and status. Maintained by triggers on workplans."""
+
+    __tablename__ = "workplan_status_counts"
+
+    name: Mapped[str] = mapped_column(sa.String(100), primary_key=True)
+    status: Mapped[str] = mapped_column(sa.String(30), primary_key=True)
+    count: Mapped[int] = mapped_column(default=0, nullable=False)
+
+
+def _names_upsert(greatest: str, least: str) -> str:
+    return f"""
+        INSERT INTO workplan_names (name, worktime_utc, hash, first_worktime_utc)
+        VALUES (NEW.name, NEW.worktime_utc, NEW.hash, NEW.worktime_utc)
+        ON CONFLICT (name) DO UPDATE SET
+            hash = CASE
+                WHEN excluded.worktime_utc >= workplan_names.worktime_utc
+                THEN excluded.hash ELSE workplan_names.hash
+            END,
+            worktime_utc = {greatest}(workplan_names.worktime_utc, excluded.worktime_utc),
+            first_worktime_utc = {least}(
+                workplan_names.first_worktime_utc, excluded.first_worktime_utc
+            );
+    """
+
+
+# Only the removal of the first or the last workplan of the name
+# makes it look up the history, by the primary key.
+_NAMES_RECALCULATE = """
+    UPDATE workplan_names SET
+        worktime_utc = (
+            SELECT max(worktime_utc) FROM workplans WHERE name = OLD.name
+        ),
+        hash = (
+            SELECT hash FROM workplans WHERE name = OLD.name
+            ORDER BY worktime_utc DESC LIMIT 1
+        ),
+        first_worktime_utc = (
+            SELECT min(worktime_utc) FROM workplans WHERE name = OLD.name
+        )
+    WHERE name = OLD.name
+        AND (OLD.worktime_utc >= worktime_utc OR OLD.worktime_utc <= first_worktime_utc);
+    DELETE FROM workplan_names WHERE name = OLD.name AND worktime_utc IS NULL;
+"""
+_STATUS_COUNTS_INCREMENT = """
+    INSERT INTO workplan_status_counts (name, status, count)
+    VALUES (NEW.name, NEW.status, 1)
+    ON CONFLICT (name, status)
+    DO UPDATE SET count = workplan_status_counts.count + 1;
+"""
+_STATUS_COUNTS_DECREMENT = """
+    UPDATE workplan_status_counts SET count = count - 1
+    WHERE name = OLD.name AND status = OLD.status;
+"""
+NAMES_TRIGGERS = {
+    "sqlite": [
+        f"""
+        CREATE TRIGGER workplans_names_insert AFTER INSERT ON workplans
+        BEGIN {_names_upsert("max", "min")} {_STATUS_COUNTS_INCREMENT} END
+        """,
+        f"""
+        CREATE TRIGGER workplans_names_delete AFTER DELETE ON workplans
+        BEGIN {_NAMES_RECALCULATE} {_STATUS_COUNTS_DECREMENT} END
+        """,
+        f"""
+        CREATE TRIGGER workplans_names_update_worktime
+        AFTER UPDATE OF name, worktime_utc, hash ON workplans
+        BEGIN {_NAMES_RECALCULATE} {_names_upsert("max", "min")} END
+        """,
+        f"""
+        CREATE TRIGGER workplans_names_update_status
+        AFTER UPDATE OF name, status ON workplans
+        BEGIN {_STATUS_COUNTS_DECREMENT} {_STATUS_COUNTS_INCREMENT} END
+        """,
+    ],
+    "postgresql": [
+        f"""
+        CREATE OR REPLACE FUNCTION workplans_names() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND (
+                OLD.name, OLD.worktime_utc, OLD.hash
+            ) IS DISTINCT FROM (NEW.name, NEW.worktime_utc, NEW.hash)) THEN
+                -- The lock makes the recalculation see the workplans
+                -- inserted by the transactions that held it.
+                PERFORM 1 FROM workplan_names WHERE name = OLD.name FOR UPDATE;
+                {_NAMES_RECALCULATE}
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND (
+                OLD.name, OLD.worktime_utc, OLD.hash
+            ) IS DISTINCT FROM (NEW.name, NEW.worktime_utc, NEW.hash)) THEN
+                {_names_upsert("greatest", "least")}
+            END IF;
+            IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND (
+                OLD.name, OLD.status
+            ) IS DISTINCT FROM (NEW.name, NEW.status)) THEN
+                {_STATUS_COUNTS_DECREMENT}
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND (
+                OLD.name, OLD.status
+            ) IS DISTINCT FROM (NEW.name, NEW.status)) THEN
+                {_STATUS_COUNTS_INCREMENT}
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE TRIGGER workplans_names
+        AFTER INSERT OR DELETE OR UPDATE OF name, worktime_utc, hash, status
+        ON workplans FOR EACH ROW EXECUTE FUNCTION workplans_names()
+        """,
+    ],
+}
+# Counts the history of the names between :first and :last.
+NAMES_BACKFILL = """
+    INSERT INTO workplan_names (name, worktime_utc, hash, first_worktime_utc)
+    SELECT
+        names.name,
+        max(worktime_utc),
+        (
+            SELECT hash FROM workplans WHERE name = names.name
+            ORDER BY worktime_utc DESC LIMIT 1
+        ),
+        min(worktime_utc)
+    FROM workplans AS names
+    WHERE names.name BETWEEN :first AND :last
+    GROUP BY names.name
+"""
+STATUS_COUNTS_BACKFILL = """
+    INSERT INTO workplan_status_counts (name, status, count)
+    SELECT name, status, count(*) FROM workplans
+    WHERE name BETWEEN :first AND :last
+    GROUP BY name, status
+"""
@@ -1,26 +1,84 @@
+from typing import Literal, Sequence
 from uuid import UUID
 
-from fastapi import Depends, APIRouter
-from fastapi.responses import ORJSONResponse
-from script_master_helper.workplanner import schemas
+import sqlalchemy as sa
+
+from fastapi import Depends, APIRouter, Query
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from workplanner import errors, service, crud, models
+from workplanner import (
+    events,
+    errors,
+    metrics,
+    service,
+    crud,
+    models,
+    schemas,
+    export,
+    const,
+)
 from workplanner.database import get_db
+from workplanner.expiration import sweeper
+from workplanner.leases import reaper
+from workplanner.scheduler import scheduler
 
 API_VERSION = "1.0.0"
 
 router = APIRouter()
 
 
+def filter_query(
+    workplan_query: schemas.WorkplanQuery,
+) -> tuple[crud.QueryFilter, sa.Select]:
+    """The filter and its query, an invalid cursor is a 422 error."""
+    query_filter = crud.QueryFilter(schema=workplan_query)
+    try:
+        return query_filter, query_filter.get_query_with_filter()
+    except ValueError as exc:
+        raise errors.get_422_exception("Invalid cursor", str(exc))
+
+
+def list_response(
+    workplan_query: schemas.WorkplanQuery,
+    query_filter: crud.QueryFilter,
+    result: Sequence[models.Workplan],
+):
+    workplans = schemas.Workplan.list_from_orm(result)
+
+    if workplan_query.cursor is not None:
+        return schemas.ResponsePage(
+            data=workplans, next_cursor=query_filter.next_cursor(result)
+        )
+
+    return schemas.ResponseGeneric(data=workplans)
+
+
 @router.post("/workplan/list", response_class=ORJSONResponse)
 def list_resource(workplan_query: schemas.WorkplanQuery, db: Session = Depends(get_db)):
-    query = crud.QueryFilter(schema=workplan_query).get_query_with_filter()
-    result = db.scalars(query)
-    workplans = schemas.Workplan.list_from_orm(result)
-    response = schemas.ResponseGeneric(data=workplans)
+    query_filter, query = filter_query(workplan_query)
+    result = db.scalars(query).all()
+
+    return list_response(workplan_query, query_filter, result)
 
-    return response
+
+@router.post("/workplan/export")
+def export_resource(
+    workplan_query: schemas.WorkplanQuery,
+    format_: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db: Session = Depends(get_db),
+):
+    """Streams the workplans as newline-delimited JSON or CSV."""
+    _, query = filter_query(workplan_query)
+    query = query.execution_options(yield_per=const.EXPORT_CHUNK_SIZE)
+    partitions = db.scalars(query).partitions()
+
+    if format_ == "csv":
+        return StreamingResponse(export.iter_csv(partitions), media_type="text/csv")
+
+    return StreamingResponse(
+        export.iter_ndjson(partitions), media_type="application/x-ndjson"
+    )
 
 
 @router.post("/workplan/update", response_class=ORJSONResponse)
@@ -45,7 +103,7 @@ def update_list_resource(
     workplans: list[schemas.WorkplanUpdate],
     db: Session = Depends(get_db),
 ):
-    count = len(service.many_update(db, workplans))
+    count = service.many_update(db, workplans)
     return schemas.ResponseGeneric(data=schemas.Affected(count=count))
 
 
@@ -57,6 +115,18 @@ def generate_resource(schema: schemas.GenerateWorkplans, db: Session = Depends(g
     return schemas.ResponseGeneric(data=workplans)
 
 
+@router.post("/workplan/generate/batch")
+def generate_batch_resource(
+    schema_list: list[schemas.GenerateWorkplans], db: Session = Depends(get_db)
+):
+    """Results are streamed as newline-delimited JSON, one line per name."""
+    results = service.generate_workplans_batch(db, schema_list)
+
+    return StreamingResponse(
+        export.iter_generated(results), media_type="application/x-ndjson"
+    )
+
+
 @router.post("/workplan/generate/child/list", response_class=ORJSONResponse)
 def generate_child_resource(
     schema: schemas.GenerateChildWorkplans, db: Session = Depends(get_db)
@@ -67,6 +137,15 @@ def generate_child_resource(
     return schemas.ResponseGeneric(data=workplans)
 
 
+@router.post("/workplan/generate/graph", response_class=ORJSONResponse)
+def generate_graph_resource(db: Session = Depends(get_db)):
+    """Child workplans of all edges of the dependency graph, in topological order."""
+    items = service.generate_graph(db)
+    workplans = schemas.Workplan.list_from_orm(items)
+
+    return schemas.ResponseGeneric(data=workplans)
+
+
 @router.get("/workplan/execute/{name}/list", response_class=ORJSONResponse)
 def execute_list_resource(name: str, db: Session = Depends(get_db)):
     iterator = service.execute_list(db, name)
@@ -75,6 +154,111 @@ def execute_list_resource(name: str, db: Session = Depends(get_db)):
     return schemas.ResponseGeneric(data=workplans)
 
 
+@router.post("/workplan/claim", response_class=ORJSONResponse)
+def claim_resource(schema: schemas.ClaimWorkplans, db: Session = Depends(get_db)):
+    items = service.claim(db, schema)
+    workplans = schemas.LeasedWorkplan.list_from_orm(items)
+
+    return schemas.ResponseGeneric(data=workplans)
+
+
+@router.post("/workplan/heartbeat", response_class=ORJSONResponse)
+def heartbeat_resource(schema: schemas.Heartbeat, db: Session = Depends(get_db)):
+    items = service.heartbeat(db, schema)
+    workplans = schemas.LeasedWorkplan.list_from_orm(items)
+
+    return schemas.ResponseGeneric(data=workplans)
+
+
+@router.get("/workplan/leases/stats", response_class=ORJSONResponse)
+def lease_stats_resource():
+    data = schemas.LeaseStats(**reaper.stats())
+
+    return schemas.ResponseGeneric(data=data)
+
+
+@router.get("/workplan/events")
+async def events_resource(name: list[str] | None = Query(None)):
+    """
+    Server-sent events about names that have new executable workplans,
+    instead of polling the executable lists. Without `name`, about all names.
+    """
+    return StreamingResponse(
+        events.iter_sse(name, keepalive=const.EVENTS_KEEPALIVE),
+        media_type="text/event-stream",
+    )
+
+
+@router.post("/workplan/definitions", response_class=ORJSONResponse)
+def save_definitions_resource(
+    schema_list: list[schemas.GenerateWorkplans], db: Session = Depends(get_db)
+):
+    """The scheduler generates workplans of the stored definitions in the background."""
+    count = service.save_definitions(db, schema_list)
+    # The scheduler would read the old definitions before the commit.
+    events.call_after_commit(db, scheduler.wake)
+
+    return schemas.ResponseGeneric(data=schemas.Affected(count=count))
+
+
+@router.get("/workplan/definitions", response_class=ORJSONResponse)
+def definitions_resource(db: Session = Depends(get_db)):
+    data = service.get_definitions(db)
+
+    return schemas.ResponseGeneric(data=data)
+
+
+@router.post("/workplan/definitions/delete", response_class=ORJSONResponse)
+def delete_definitions_resource(names: list[str], db: Session = Depends(get_db)):
+    count = service.delete_definitions(db, names)
+    events.call_after_commit(db, scheduler.wake)
+
+    return schemas.ResponseGeneric(data=schemas.Affected(count=count))
+
+
+@router.post("/workplan/edges", response_class=ORJSONResponse)
+def save_edges_resource(
+    schema_list: list[schemas.WorkplanEdge], db: Session = Depends(get_db)
+):
+    try:
+        count = service.save_edges(db, schema_list)
+    except ValueError as exc:
+        raise errors.get_422_exception("Invalid graph", str(exc))
+
+    return schemas.ResponseGeneric(data=schemas.Affected(count=count))
+
+
+@router.get("/workplan/edges", response_class=ORJSONResponse)
+def edges_resource(db: Session = Depends(get_db)):
+    data = service.get_edges(db)
+
+    return schemas.ResponseGeneric(data=data)
+
+
+@router.post("/workplan/edges/delete", response_class=ORJSONResponse)
+def delete_edges_resource(
+    schema_list: list[schemas.WorkplanEdgePK], db: Session = Depends(get_db)
+):
+    count = service.delete_edges(db, schema_list)
+
+    return schemas.ResponseGeneric(data=schemas.Affected(count=count))
+
+
+@router.get("/workplan/expiration/stats", response_class=ORJSONResponse)
+def expiration_stats_resource():
+    data = schemas.ExpirationStats(**sweeper.stats())
+
+    return schemas.ResponseGeneric(data=data)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics_resource(db: Session = Depends(get_db)):
+    """Metrics in the Prometheus text format."""
+    metrics.set_status_counts(service.status_counts(db))
+
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @router.post("/workplan/delete", response_class=ORJSONResponse)
 def delete_resource(
     workplan_filter: schemas.WorkplanQuery, db: Session = Depends(get_db)
@@ -88,8 +272,8 @@ def delete_resource(
 def count_resource(
     workplan_filter: schemas.WorkplanQuery, db: Session = Depends(get_db)
 ):
-    query = crud.QueryFilter(schema=workplan_filter).get_query_with_filter()
-    count = len(db.scalars(query).all())
+    query = crud.QueryFilter(schema=workplan_filter).get_count_query()
+    count = db.scalar(query)
 
     return schemas.ResponseGeneric(data=schemas.Affected(count=count))
 
@@ -100,15 +284,17 @@ def count_by_resource(
 ):
     fields = [getattr(models.Workplan, name) for name in workplan_fields.field_names]
     query = crud.count_by(*fields)
-    data = db.execute(query).mappings()
+    data = db.execute(query).mappings().all()
     return schemas.ResponseGeneric(data=data)
 
 
 @router.post("/workplan/reset", response_class=ORJSONResponse)
 def reset_resource(pk: schemas.WorkplanPK, db: Session = Depends(get_db)):
-    query = crud.reset(pk.name, [pk.worktime_utc])
-    item = db.scalar(query)
-    data = schemas.Workplan.from_orm(item)
+    items = service.reset(db, pk.name, [pk.worktime_utc])
+    if not items:
+        raise errors.get_404_exception(f"{pk.name=}, {pk.worktime_utc=}")
+
+    data = schemas.Workplan.from_orm(items[0])
 
     return schemas.ResponseGeneric(data=data)
 
@@ -0,0 +1,128 @@
+"""
+Generates workplans of the stored definitions in the background,
+so that clients only read the workplans that are ready.
+
+The definitions are kept in a heap by the time of their next worktime,
+the scheduler sleeps until the earliest one and generates only the due definitions,
+in batches. Definitions are reloaded from the database periodically
+and right after they are changed through the API.
+"""
+import heapq
+import threading
+from typing import Callable
+
+import pendulum
+from sqlalchemy.orm import Session
+
+from workplanner import schemas, service, worktime
+from workplanner.background import DynamicTask
+from workplanner.database import SessionLocal
+from workplanner.logger import logger
+from workplanner.settings import Settings
+
+
+def next_due(
+    schema: schemas.GenerateWorkplans, now: pendulum.DateTime
+) -> pendulum.DateTime:
+    """When the next workplan of the definition appears."""
+    if schema.start_time > now:
+        return schema.start_time
+
+    last = worktime.last_slot(schema.start_time, schema.interval_timedelta, now)
+
+    return last + schema.interval_timedelta
+
+
+class Scheduler:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        reload_interval: float,
+        batch_size: int,
+    ):
+        self.session_factory = session_factory
+        self.reload_interval = reload_interval
+        self.batch_size = batch_size
+        self.task = DynamicTask("scheduler", self.tick, reload_interval)
+        self._lock = threading.Lock()
+        self._definitions: dict[str, schemas.GenerateWorkplans] = {}
+        self._due: dict[str, pendulum.DateTime] = {}
+        self._heap: list[tuple[pendulum.DateTime, str]] = []
+        self._reload_at: pendulum.DateTime | None = None
+
+    def wake(self) -> None:
+        """The definitions have changed."""
+        self._reload_at = None
+        self.task.wake()
+
+    def reload(self, now: pendulum.DateTime) -> None:
+        with self.session_factory() as db:
+            definitions = {s.name: s for s in service.get_definitions(db)}
+
+        for name, schema in definitions.items():
+            if self._definitions.get(name) != schema:
+                # New and changed definitions are generated right away.
+                self._push(name, now)
+
+        for name in self._definitions.keys() - definitions.keys():
+            del self._due[name]
+
+        self._definitions = definitions
+        self._reload_at = now.add(seconds=self.reload_interval)
+
+    def tick(self, now: pendulum.DateTime = None) -> float | None:
+        """
+        Generates the due definitions.
+        Returns the seconds until the next one is due, None if there are none.
+        """
+        now = now or pendulum.now()
+
+        with self._lock:
+            if self._reload_at is None or self._reload_at <= now:
+                self.reload(now)
+
+            due = self._pop_due(now)
+            for start in range(0, len(due), self.batch_size):
+                self._generate(due[slice(start, start + self.batch_size)], now)
+
+            if not self._heap:
+                return None
+
+            return (self._heap[0][0] - now).total_seconds()
+
+    def _push(self, name: str, due: pendulum.DateTime) -> None:
+        self._due[name] = due
+        heapq.heappush(self._heap, (due, name))
+
+    def _pop_due(self, now: pendulum.DateTime) -> list[schemas.GenerateWorkplans]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_time, name = heapq.heappop(self._heap)
+            # Entries of removed and rescheduled definitions are skipped.
+            if self._due.get(name) == due_time:
+                due.append(self._definitions[name])
+
+        return due
+
+    def _generate(
+        self, schema_list: list[schemas.GenerateWorkplans], now: pendulum.DateTime
+    ) -> None:
+        try:
+            with self.session_factory() as db:
+                # The executable workplans are not needed, only the writes.
+                service.generate_batch_writes(db, schema_list)
+                db.commit()
+        except Exception:
+            logger.exception("Failed to generate {}", [s.name for s in schema_list])
+            for schema in schema_list:
+                self._push(schema.name, now.add(seconds=self.reload_interval))
+        else:
+            for schema in schema_list:
+                self._push(schema.name, next_due(schema, now))
+
+
+scheduler = Scheduler(
+    SessionLocal,
+    reload_interval=Settings().scheduler_reload_interval,
+    batch_size=Settings().scheduler_batch_size,
+)
@@ -0,0 +1,125 @@
+"""
+Schemas of the API.
+
+The schemas of the client package are re-exported,
+the ones defined here exist only on the service side.
+"""
+import datetime as dt
+from typing import Optional
+from uuid import UUID
+
+import pydantic
+from pydantic import validator
+from script_master_helper.utils import normalize_datetime
+from script_master_helper.workplanner.enums import Statuses
+from script_master_helper.workplanner import schemas
+from script_master_helper.workplanner.schemas import *  # noqa: F401,F403
+from script_master_helper.workplanner.schemas import Workplan, ResponseGeneric
+
+from workplanner import const
+
+# Columns that can't be NULL, only they can be keys of the cursor.
+CURSOR_FIELDS = ("id", "name", "worktime_utc", "status", "retries", "created_utc")
+
+
+class WorkplanQuery(schemas.WorkplanQuery):
+    """
+    With `cursor`, pages are read by keyset instead of OFFSET:
+    an empty string for the first page,
+    then `next_cursor` of the previous response.
+    """
+
+    cursor: Optional[str] = None
+
+    @validator("cursor")
+    def validate_cursor(cls, cursor, values):
+        if cursor is not None:
+            if values.get("limit") is None:
+                raise ValueError("If CURSOR is present, the LIMIT field is required")
+            if values.get("page") is not None:
+                raise ValueError("CURSOR and PAGE can't be used together")
+            for field in values.get("order_by") or []:
+                if field not in CURSOR_FIELDS:
+                    raise ValueError(
+                        f"With CURSOR, ordering is possible only by {CURSOR_FIELDS}"
+                    )
+
+        return cursor
+
+
+class ResponsePage(ResponseGeneric[list[Workplan]]):
+    next_cursor: Optional[str] = None
+
+
+class ClaimWorkplans(pydantic.BaseModel):
+    """
+    Executable workplans of the names are moved into the RUN status,
+    the newest worktimes first. Without `owner`, a random one is assigned.
+    """
+
+    names: pydantic.conlist(pydantic.constr(max_length=100), min_items=1)
+    limit: pydantic.conint(gt=0, le=const.MAX_CLAIM_LIMIT) = 1
+    owner: Optional[pydantic.constr(max_length=100)] = None
+    lease_seconds: pydantic.conint(gt=0) = const.DEFAULT_LEASE_SECONDS
+
+
+class Heartbeat(pydantic.BaseModel):
+    """
+    Extends the leases of claimed workplans.
+    Only the leases still held by the owner are extended and returned.
+    """
+
+    ids: pydantic.conlist(UUID, min_items=1)
+    owner: pydantic.constr(max_length=100)
+    lease_seconds: pydantic.conint(gt=0) = const.DEFAULT_LEASE_SECONDS
+
+
+class LeasedWorkplan(Workplan):
+    lease_owner: Optional[str]
+    lease_expires_utc: Optional[dt.datetime]
+
+    _lease_expires_utc = validator("lease_expires_utc", allow_reuse=True)(
+        normalize_datetime
+    )
+
+
+class WorkplanEdge(schemas.GenerateChildWorkplans):
+    """
+    Edge of the dependency graph: workplans of `name` are created for the worktimes
+    at which all its parents have their `status_trigger`. The graph can't have cycles.
+    """
+
+    name: pydantic.constr(max_length=100)
+    parent_name: pydantic.constr(max_length=100)
+    status_trigger: str = Statuses.success
+
+    @validator("status_trigger")
+    def validate_status_trigger(cls, status_trigger):
+        if status_trigger not in Statuses.all_statuses:
+            raise ValueError(f"Invalid {status_trigger=}")
+
+        return status_trigger
+
+
+class WorkplanEdgePK(pydantic.BaseModel):
+    parent_name: str
+    name: str
+
+
+class GenerateWorkplansResult(pydantic.BaseModel):
+    name: str
+    workplans: list[Workplan]
+
+
+class ExpirationStats(pydantic.BaseModel):
+    sweeps: int
+    last_expired: int
+    total_expired: int
+    last_sweep_utc: Optional[dt.datetime]
+
+
+class LeaseStats(pydantic.BaseModel):
+    sweeps: int
+    last_released: int
+    total_released: int
+    last_sweep_utc: Optional[dt.datetime]
@@ -1,75 +1,24 @@
 import datetime as dt
-from typing import Iterator, Sequence
-from uuid import UUID
+import graphlib
+import itertools
+from typing import Iterable, Iterator, Sequence
+from uuid import UUID, uuid4
 
+import orjson
 import pendulum
 import sqlalchemy as sa
-from script_master_helper.workplanner import schemas
-from script_master_helper.workplanner.enums import Statuses, Error
-from sqlalchemy import select
-from sqlalchemy.exc import IntegrityError
+from script_master_helper.workplanner.enums import Statuses
 from sqlalchemy.orm import Session
 
-from workplanner import crud, filters
-from workplanner.app import logger
-from workplanner.models import Workplan
-from workplanner.utils import (
-    iter_range_datetime,
-    iter_period_from_range,
-    scroll_to_last_interval_time,
-)
+from workplanner import const, crud, events, filters, metrics, schemas, worktime
+from workplanner.logger import logger
+from workplanner.models import Workplan, WorkplanDefinition, WorkplanEdge
+from workplanner.utils import iter_range_datetime, iter_period_from_range
 
 
-def is_create_next(
-    db: Session,
-    name: str,
-    interval_timedelta: dt.timedelta,
-) -> bool:
-    last_executed_item = db.scalar(crud.last(name))
-    if last_executed_item:
-        result = pendulum.now() - last_executed_item.worktime_utc >= interval_timedelta
-        logger.info("Is create next [{}] {}", name, result)
-
-        return result
-
-    return False
-
-
-def next_worktime(
-    db: Session, name: str, interval_timedelta: dt.timedelta
-) -> pendulum.DateTime | None:
-    last_executed_item = db.scalar(crud.last(name))
-
-    if last_executed_item:
-        return scroll_to_last_interval_time(
-            last_executed_item.worktime_utc, interval_timedelta
-        )
-
-    return None
-
-
-def create_next_or_none(
-    db: Session, schema: schemas.GenerateWorkplans
-) -> Workplan | None:
-    if is_create_next(db, schema.name, schema.interval_timedelta):
-        next_wt = next_worktime(db, schema.name, schema.interval_timedelta)
-        try:
-            with db.begin_nested():
-                item = Workplan(
-                    **schema.extra.dict(exclude_unset=True),
-                    **{
-                        Workplan.name.key: schema.name,
-                        Workplan.worktime_utc.key: next_wt,
-                    },
-                )
-                db.add(item)
-        except IntegrityError:
-            return None
-        else:
-            logger.info(
-                "Created next workplan [{}] {} {}", schema.name, next_wt, item.id
-            )
-            return item
+def extra_values(schema: schemas.WorkplanExtraData) -> dict:
+    columns = Workplan.__table__.c
+    return {k: v for k, v in schema.dict(exclude_unset=True).items() if k in columns}
 
 
 def fill_missing(
@@ -78,38 +27,87 @@ def fill_missing(
     *,
     start_time: pendulum.DateTime = None,
     end_time: pendulum.DateTime = None,
-) -> list["Workplan"]:
-    items = []
+) -> list[sa.Row]:
+    """
+    Creates the missing workplans of the range with a single INSERT ... SELECT.
+    Returns rows with id and worktime_utc of the created workplans.
+    """
     start_time = start_time or schema.start_time
     end_time = end_time or pendulum.now()
+    if start_time > end_time:
+        raise ValueError("start_time > end_time")
+
+    dialect_name = db.get_bind().dialect.name
+    values = extra_values(schema.extra)
+
+    with db.begin_nested():
+        if dialect_name in ("postgresql", "sqlite"):
+            query = crud.insert_missing(
+                dialect_name,
+                schema.name,
+                start_time,
+                end_time,
+                schema.interval_timedelta,
+                values,
+            )
+            items = db.execute(query).all()
+        else:
+            items = _fill_missing_executemany(db, schema, start_time, end_time, values)
+
+    if items:
+        events.notify(db, schema.name)
+        metrics.WORKPLANS_CREATED.inc(len(items), source="fill_missing")
+        logger.info(
+            "Created {} missing workplans [{}] {} - {}",
+            len(items),
+            schema.name,
+            start_time,
+            end_time,
+        )
+
+    return sorted(items, key=lambda i: i.worktime_utc)
+
+
+def _fill_missing_executemany(
+    db: Session,
+    schema: schemas.GenerateWorkplans,
+    start_time: pendulum.DateTime,
+    end_time: pendulum.DateTime,
+    values: dict,
+) -> list[sa.Row]:
+    # For databases without generated series, the gaps are found in Python.
     exists_worktimes = set(
         db.scalars(
-            sa.select(Workplan.worktime_utc).filter(Workplan.name == schema.name)
+            sa.select(Workplan.worktime_utc).filter(
+                Workplan.name == schema.name,
+                Workplan.worktime_utc.between(start_time, end_time),
+            )
         )
     )
+    rows = [
+        {
+            **values,
+            Workplan.id.key: uuid4(),
+            Workplan.name.key: schema.name,
+            Workplan.worktime_utc.key: wt,
+        }
+        for wt in iter_range_datetime(start_time, end_time, schema.interval_timedelta)
+        if wt not in exists_worktimes
+    ]
+    if not rows:
+        return []
 
-    with db.begin_nested():
-        for wt in iter_range_datetime(start_time, end_time, schema.interval_timedelta):
-            if wt not in exists_worktimes:
-                item = Workplan(
-                    **schema.extra.dict(exclude_unset=True),
-                    **{
-                        Workplan.name.key: schema.name,
-                        Workplan.worktime_utc.key: wt,
-                    },
-                )
-                logger.info("Created missing workplans [{}] {}", schema.name, wt)
-                items.append(item)
-                db.add(item)
+    query = sa.insert(Workplan).returning(Workplan.id, Workplan.worktime_utc)
 
-    return items
+    return db.execute(query, rows).all()
 
 
 def recreate_prev(
     db: Session,
     schema: schemas.GenerateWorkplans,
     from_worktime: pendulum.DateTime = None,
-) -> list["Workplan"] | None:
+    first_worktime: pendulum.DateTime = None,
+) -> list[sa.Row] | None:
     if isinstance(schema.back_restarts, int):
         if schema.back_restarts > 0:
             offset_periods = [-i for i in range(schema.back_restarts)]
@@ -120,82 +118,169 @@ def recreate_prev(
 
         offset_periods = [i + 1 for i in schema.back_restarts]
 
-    first_item = db.scalar(crud.get_by_name(schema.name))
+    if first_worktime is None:
+        summary = db.execute(crud.name_summary(schema.name)).first()
+        first_worktime = summary.first_worktime_utc if summary else None
 
-    if first_item:
-        last_wt = from_worktime or scroll_to_last_interval_time(
-            first_item.worktime_utc, schema.interval_timedelta
+    if first_worktime:
+        last_wt = from_worktime or worktime.last_slot(
+            first_worktime, schema.interval_timedelta
         )
 
         worktime_list = [
-            last_wt + (schema.interval_timedelta * delta) for delta in offset_periods
+            worktime.slot_after(last_wt, schema.interval_timedelta, delta)
+            for delta in offset_periods
         ]
-        worktime_list = list(
-            filter(lambda dt_: dt_ >= first_item.worktime_utc, worktime_list)
+        worktime_list = list(filter(lambda dt_: dt_ >= first_worktime, worktime_list))
+
+        if not worktime_list:
+            return []
+
+        dialect_name = db.get_bind().dialect.name
+        values = extra_values(schema.extra)
+        # The existing workplans are reset in place, their ids and index entries stay.
+        # One UPDATE and one INSERT for all worktimes, executed with many parameters.
+        with db.begin_nested():
+            db.execute(
+                crud.reset_worktime(schema.name, values),
+                [{"b_worktime_utc": wt} for wt in worktime_list],
+            )
+            created = db.execute(
+                crud.insert_many_workplans(dialect_name),
+                [
+                    {
+                        **values,
+                        Workplan.name.key: schema.name,
+                        Workplan.worktime_utc.key: wt,
+                    }
+                    for wt in worktime_list
+                ],
+            ).all()
+
+        # The statements bypass the session, the loaded workplans are refreshed.
+        recreated = set(worktime_list)
+        for item in list(db.identity_map.values()):
+            if (
+                isinstance(item, Workplan)
+                and item.name == schema.name
+                and item.worktime_utc in recreated
+            ):
+                db.expire(item)
+
+        events.notify(db, schema.name)
+        logger.info(
+            "Recreated workplans [{}] {}, {} reset, {} created",
+            schema.name,
+            list(iter_period_from_range(worktime_list, schema.interval_timedelta)),
+            len(recreated) - len(created),
+            len(created),
         )
 
-        db.execute(crud.delete(schema.name, worktimes=worktime_list))
+        items = db.execute(
+            crud.worktimes_between(schema.name, min(worktime_list), max(worktime_list))
+        )
 
-        items = []
-        for date1, date2 in iter_period_from_range(
-            worktime_list, schema.interval_timedelta
-        ):
-            new_items = fill_missing(db, schema, start_time=date1, end_time=date2)
-            items.extend(new_items)
+        return sorted(
+            (item for item in items if item.worktime_utc in recreated),
+            key=lambda i: i.worktime_utc,
+        )
 
-        if worktime_list:
-            logger.info("Recreated workplans [{}] {}", schema.name, worktime_list)
 
-        return items
+def is_allowed_execute(state: sa.Row, schema: schemas.GenerateWorkplans) -> bool:
+    # Check limit fatal errors.
+    if (
+        state.worktime_utc is not None
+        and state.hash == schema.extra.hash
+        and state.fatal_errors >= schema.max_fatal_errors
+    ):
+        logger.info("Many fatal errors [{}] {}", schema.name, state.worktime_utc)
+        return False
 
+    return True
 
-def is_allowed_execute(db: Session, schema: schemas.GenerateWorkplans) -> bool:
-    item = db.scalar(crud.last(schema.name))
 
-    if item and item.hash == schema.extra.hash:
-        # Check limit fatal errors.
-        query = (
-            select(sa.func.count())
-            .filter(Workplan.name == schema.name)
-            .filter(Workplan.hash == schema.extra.hash)
-            .filter(Workplan.status == Statuses.fatal_error)
+def update_errors(db: Session, schema: schemas.GenerateWorkplans) -> list[Workplan]:
+    # Errors are restarted when retry_delay has passed since they finished.
+    now = pendulum.now()
+    retry_after = now - dt.timedelta(seconds=schema.retry_delay)
+    query = (
+        sa.update(Workplan)
+        .filter(
+            Workplan.name == schema.name,
+            Workplan.status.in_(Statuses.error_statuses),
+            Workplan.retries < schema.extra.max_retries,
+            filters.not_expired(now),
+            Workplan.finished_utc.is_(None) | (Workplan.finished_utc <= retry_after),
         )
-        is_allowed = db.scalar(query) < schema.max_fatal_errors
-        if not is_allowed:
-            logger.info("Many fatal errors [{}] {}", schema.name, item.id)
+        .values({Workplan.retries.key: Workplan.retries + 1})
+        .returning(Workplan)
+    )
 
-        return is_allowed
+    with db.begin_nested():
+        affected_workplans = db.scalars(query).all()
+
+    if affected_workplans:
+        events.notify(db, schema.name)
+        logger.info(
+            "Updated error workplans [{}] {}",
+            schema.name,
+            [wp.worktime_utc for wp in affected_workplans],
+        )
 
-    return True
+    return affected_workplans
 
 
-def update_errors(db: Session, schema: schemas.GenerateWorkplans) -> list[Workplan]:
-    # A function that checks to see if retry_delay passes to restart.
-    # next_start_time_timestamp = Workplan.finished_utc + dt.timedelta(retry_delay)
-    worktimes_query = sa.select(Workplan).filter(
-        Workplan.name == schema.name,
-        Workplan.status.in_(Statuses.error_statuses),
-        Workplan.retries < schema.extra.max_retries,
-        filters.not_expired,
-        # (
-        #     (pendulum.now() >= next_start_time_timestamp)
-        #     | (Workplan.finished_utc.is_null())
-        # ),
+def update_errors_batch(
+    db: Session, schema_list: list[schemas.GenerateWorkplans]
+) -> int:
+    """update_errors for many names with one UPDATE joined to the values of the names."""
+    if not schema_list:
+        return 0
+
+    now = pendulum.now()
+    definitions = (
+        sa.values(
+            sa.column("name", Workplan.name.type),
+            sa.column("max_retries", Workplan.retries.type),
+            sa.column("retry_after", Workplan.finished_utc.type),
+            name="definitions",
+        )
+        .data(
+            [
+                (
+                    schema.name,
+                    schema.extra.max_retries,
+                    now - dt.timedelta(seconds=schema.retry_delay),
+                )
+                for schema in schema_list
+            ]
+        )
+        .cte("definitions")
+    )
+    query = (
+        sa.update(Workplan)
+        .where(
+            Workplan.name == definitions.c.name,
+            Workplan.status.in_(Statuses.error_statuses),
+            Workplan.retries < definitions.c.max_retries,
+            filters.not_expired(now),
+            Workplan.finished_utc.is_(None)
+            | (Workplan.finished_utc <= definitions.c.retry_after),
+        )
+        .values({Workplan.retries.key: Workplan.retries + 1})
+        .returning(Workplan.name)
+        .execution_options(synchronize_session=False)
     )
-    affected_workplans = []
 
     with db.begin_nested():
-        for wp in db.scalars(worktimes_query):
-            if not wp.finished_utc or pendulum.now("UTC") >= (
-                wp.finished_utc + dt.timedelta(seconds=schema.retry_delay)
-            ):
-                logger.info(
-                    "Updated error workplans [{}] {}", schema.name, wp.worktime_utc
-                )
-                wp.retries += 1
-                affected_workplans.append(wp)
+        names = db.scalars(query).all()
 
-    return affected_workplans
+    if names:
+        # Only the names that have new executable workplans.
+        events.notify(db, *set(names))
+        logger.info("Updated {} error workplans", len(names))
+
+    return len(names)
 
 
 def generate_child_workplans(
@@ -207,103 +292,403 @@ def generate_child_workplans(
     if schema.status_trigger not in Statuses.all_statuses:
         raise ValueError(f"Invalid {schema.status_trigger=}")
 
-    subquery = sa.select(Workplan).filter(Workplan.name == schema.name).subquery()
-
-    parent_workplans_query = (
-        sa.select(Workplan.worktime_utc)
-        .filter(
-            Workplan.name == schema.parent_name,
-            Workplan.status == schema.status_trigger,
-        )
-        .outerjoin(subquery, subquery.c.worktime_utc == Workplan.worktime_utc)
-        .filter(subquery.c.worktime_utc is None)
+    query = crud.insert_children(
+        db.get_bind().dialect.name,
+        schema.name,
+        schema.parent_name,
+        schema.status_trigger,
+        from_worktime,
+        extra_values(schema.extra),
     )
-
-    if from_worktime:
-        parent_workplans_query = parent_workplans_query.filter(
-            Workplan.worktime_utc >= from_worktime
-        )
-
     with db.begin_nested():
-        for worktime_utc in db.scalars(parent_workplans_query):
-            item = Workplan(
-                **schema.extra.dict(exclude_unset=True),
-                **{
-                    Workplan.name.key: schema.name,
-                    Workplan.worktime_utc.key: worktime_utc,
-                },
+        items = db.scalars(query).all()
+
+    if items:
+        events.notify(db, schema.name)
+        metrics.WORKPLANS_CREATED.inc(len(items), source="generate_child_workplans")
+        logger.info("Created {} child workplans [{}]", len(items), schema.name)
+
+    yield from sorted(items, key=lambda i: i.worktime_utc)
+
+
+def graph_levels(edges: Iterable[tuple[str, str]]) -> list[list[str]]:
+    """
+    Names of the children of (parent_name, name) edges in the order of generation:
+    the parents of a level are roots or children of the previous levels.
+    Raises ValueError if the graph has a cycle.
+    """
+    parents = {}
+    for parent_name, name in edges:
+        parents.setdefault(name, set()).add(parent_name)
+
+    sorter = graphlib.TopologicalSorter(parents)
+    try:
+        sorter.prepare()
+    except graphlib.CycleError as exc:
+        raise ValueError(f"The graph has a cycle: {exc.args[1]}")
+
+    levels = []
+    while sorter.is_active():
+        ready = sorted(sorter.get_ready())
+        sorter.done(*ready)
+        if children := [name for name in ready if name in parents]:
+            levels.append(children)
+
+    return levels
+
+
+def _graph_values(edges: list[WorkplanEdge]) -> dict:
+    # Children with several parents take the extra of the first edge.
+    schema = schemas.WorkplanEdge.parse_obj(edges[0].definition)
+    columns = Workplan.__table__.c
+
+    return {k: v for k, v in schema.extra.dict().items() if k in columns}
+
+
+def generate_graph(db: Session, now: pendulum.DateTime = None) -> list[Workplan]:
+    """
+    Child workplans of the whole dependency graph, created level by level,
+    so that the children of a level trigger the next one in the same pass.
+    Each level is one INSERT ... SELECT, the parents that have not changed
+    since the previous pass are not scanned.
+    """
+    edges = db.scalars(crud.get_edges()).all()
+    edges_by_name = {}
+    for edge in edges:
+        edges_by_name.setdefault(edge.name, []).append(edge)
+
+    dialect_name = db.get_bind().dialect.name
+    high_water = (now or pendulum.now()).subtract(
+        seconds=const.GRAPH_HIGH_WATER_OVERLAP
+    )
+    items = []
+    for level in graph_levels((e.parent_name, e.name) for e in edges):
+        for start in range(0, len(level), const.GRAPH_BATCH_SIZE):
+            names = level[slice(start, start + const.GRAPH_BATCH_SIZE)]
+            query = crud.insert_graph_children(
+                dialect_name,
+                {name: edges_by_name[name] for name in names},
+                {name: _graph_values(edges_by_name[name]) for name in names},
             )
-            logger.info("Created missing workplans [{}] {}", schema.name, worktime_utc)
+            with db.begin_nested():
+                items.extend(db.scalars(query).all())
+
+    if edges:
+        query = crud.update_high_water(
+            [(e.parent_name, e.name) for e in edges], high_water
+        ).execution_options(synchronize_session=False)
+        with db.begin_nested():
+            db.execute(query)
+        for edge in edges:
+            db.expire(edge)
 
-            db.add(item)
+    if items:
+        names = {item.name for item in items}
+        events.notify(db, *names)
+        metrics.WORKPLANS_CREATED.inc(len(items), source="generate_graph")
+        logger.info("Created {} child workplans of the graph {}", len(items), names)
 
-            yield item
+    return sorted(items, key=lambda i: (i.name, i.worktime_utc))
 
 
 def generate_workplans(
     db: Session, schema: schemas.GenerateWorkplans
 ) -> Iterator[Workplan]:
-    if is_allowed_execute(db, schema):
+    # All decisions are made from one state query,
+    # and the writes are set-based statements in one savepoint.
+    state = db.execute(crud.generate_state(schema.name, schema.extra.hash)).one()
+
+    if is_allowed_execute(state, schema):
+        dialect_name = db.get_bind().dialect.name
+        values = extra_values(schema.extra)
+
         with db.begin_nested():
             if schema.keep_sequence:
                 fill_missing(db, schema)
-            else:
-                exists = db.execute(crud.get_by_name(schema.name)).first()
-                if not exists:
-                    wp = Workplan(
-                        **schema.extra.dict(exclude_unset=True),
-                        **{
-                            Workplan.name.key: schema.name,
-                            Workplan.worktime_utc.key: scroll_to_last_interval_time(
-                                schema.start_time, schema.interval_timedelta
-                            ),
-                        },
-                    )
-                    db.add(wp)
-                    logger.info(
-                        "Created first workplan [{}] {}", schema.name, schema.start_time
-                    )
-                else:
-                    next_item = create_next_or_none(db, schema)
-                    if next_item:
-                        if schema.back_restarts:
-                            # When creating the next item,
-                            # elements are created to update the data for the past dates.
-                            recreate_prev(db, schema)
-
-            list(update_errors(db, schema))
-            check_expiration(db)
+            elif state.worktime_utc is None:
+                first_wt = worktime.last_slot(
+                    schema.start_time, schema.interval_timedelta
+                )
+                query = crud.insert_worktimes(
+                    dialect_name, schema.name, [first_wt], values
+                )
+                if db.execute(query).first():
+                    events.notify(db, schema.name)
+                    metrics.WORKPLANS_CREATED.inc(source="generate_workplans")
+                    logger.info("Created first workplan [{}] {}", schema.name, first_wt)
+            elif worktime.is_due(state.worktime_utc, schema.interval_timedelta):
+                next_wt = worktime.last_slot(
+                    state.worktime_utc, schema.interval_timedelta
+                )
+                query = crud.insert_worktimes(
+                    dialect_name, schema.name, [next_wt], values
+                )
+                if db.execute(query).first():
+                    events.notify(db, schema.name)
+                    metrics.WORKPLANS_CREATED.inc(source="generate_workplans")
+                    logger.info("Created next workplan [{}] {}", schema.name, next_wt)
+
+                    if schema.back_restarts:
+                        # When creating the next item,
+                        # elements are created to update the data for the past dates.
+                        recreate_prev(
+                            db, schema, first_worktime=state.first_worktime_utc
+                        )
+
+            update_errors(db, schema)
 
             yield from execute_list(db, schema.name)
 
 
+def generate_batch_writes(
+    db: Session, schema_list: list[schemas.GenerateWorkplans]
+) -> list[schemas.GenerateWorkplans]:
+    """
+    The writes of generate_workplans for many names at once.
+    The state of all names is read with one query, the writes are set-based
+    across the names. Returns the definitions that are allowed to execute.
+    """
+    definitions = {schema.name: schema for schema in schema_list}
+    states = db.execute(
+        crud.generate_states((s.name, s.extra.hash) for s in definitions.values())
+    )
+    states = {state.name: state for state in states}
+    allowed = [
+        schema
+        for schema in definitions.values()
+        if is_allowed_execute(states[schema.name], schema)
+    ]
+    dialect_name = db.get_bind().dialect.name
+
+    with db.begin_nested():
+        rows = []
+        for schema in allowed:
+            state = states[schema.name]
+            if schema.keep_sequence:
+                fill_missing(db, schema)
+            elif state.worktime_utc is None:
+                rows.append(
+                    {
+                        **extra_values(schema.extra),
+                        Workplan.name.key: schema.name,
+                        Workplan.worktime_utc.key: worktime.last_slot(
+                            schema.start_time, schema.interval_timedelta
+                        ),
+                    }
+                )
+            elif worktime.is_due(state.worktime_utc, schema.interval_timedelta):
+                rows.append(
+                    {
+                        **extra_values(schema.extra),
+                        Workplan.name.key: schema.name,
+                        Workplan.worktime_utc.key: worktime.last_slot(
+                            state.worktime_utc, schema.interval_timedelta
+                        ),
+                    }
+                )
+
+        # Rows with the same columns are inserted with one statement.
+        rows_by_columns = {}
+        for row in rows:
+            rows_by_columns.setdefault(tuple(sorted(row)), []).append(row)
+
+        for group in rows_by_columns.values():
+            created = db.execute(crud.insert_workplans(dialect_name, group)).all()
+            metrics.WORKPLANS_CREATED.inc(len(created), source="generate_workplans")
+            for item in created:
+                events.notify(db, item.name)
+                logger.info("Created workplan [{}] {}", item.name, item.worktime_utc)
+                schema = definitions[item.name]
+                state = states[item.name]
+                if schema.back_restarts and state.worktime_utc is not None:
+                    recreate_prev(db, schema, first_worktime=state.first_worktime_utc)
+
+        update_errors_batch(db, allowed)
+
+    return allowed
+
+
+def generate_workplans_batch(
+    db: Session, schema_list: list[schemas.GenerateWorkplans]
+) -> Iterator[tuple[str, list[Workplan]]]:
+    """
+    generate_workplans for many names at once: generate_batch_writes,
+    then the executable workplans are yielded name by name.
+    """
+    allowed = generate_batch_writes(db, schema_list)
+
+    executed_names = set()
+    items = execute_list_batch(db, [schema.name for schema in allowed])
+    for name, workplans in itertools.groupby(items, key=lambda wp: wp.name):
+        executed_names.add(name)
+        yield name, list(workplans)
+
+    for name in dict.fromkeys(schema.name for schema in schema_list):
+        if name not in executed_names:
+            yield name, []
+
+
 def clear_statuses_of_lost_items(db: Session) -> Sequence[Workplan]:
-    return db.scalars(
+    """Workplans with a lease are left to the lease reaper."""
+    items = db.scalars(
         sa.update(Workplan)
         .returning(Workplan)
-        .filter(Workplan.status.in_(Statuses.run_statuses))
+        .filter(
+            Workplan.status.in_(Statuses.run_statuses),
+            Workplan.lease_expires_utc.is_(None),
+        )
         .values(**{Workplan.status.name: Statuses.default})
     ).all()
+    events.notify(db, *{item.name for item in items})
+
+    return items
 
 
-def execute_list(db: Session, name: str) -> Iterator[Workplan]:
-    return db.scalars(
-        sa.select(Workplan)
-        .filter(Workplan.name == name, *filters.for_executed)
-        .order_by(Workplan.worktime_utc.desc())
+def execute_list(
+    db: Session, name: str, now: pendulum.DateTime = None
+) -> Iterator[Workplan]:
+    return db.scalars(crud.executable(name, now))
+
+
+def execute_list_batch(db: Session, names: list[str]) -> Iterator[Workplan]:
+    return db.scalars(crud.executable_batch(names))
+
+
+def expire(db: Session, now: pendulum.DateTime = None, limit: int = None) -> int:
+    query = crud.expire(now, limit).execution_options(synchronize_session=False)
+
+    with db.begin_nested():
+        return db.execute(query).rowcount
+
+
+def claim(db: Session, schema: schemas.ClaimWorkplans) -> list[Workplan]:
+    now = pendulum.now()
+    query = crud.claim(
+        db.get_bind().dialect.name,
+        schema.names,
+        schema.limit,
+        schema.owner or uuid4().hex,
+        now.add(seconds=schema.lease_seconds),
+        now,
     )
+    with db.begin_nested():
+        items = db.scalars(query).all()
 
+    # RETURNING has no order, the one of the candidates is restored.
+    return sorted(items, key=lambda i: (-i.worktime_utc.timestamp(), i.name))
 
-def check_expiration(db: Session) -> Iterator[Workplan]:
-    return db.scalars(
-        sa.update(Workplan)
-        .returning(Workplan)
-        .values(
-            **{Workplan.status.name: Statuses.error, Workplan.info.name: Error.expired}
-        )
-        .filter(filters.expired)
+
+def heartbeat(db: Session, schema: schemas.Heartbeat) -> list[Workplan]:
+    lease_expires = pendulum.now().add(seconds=schema.lease_seconds)
+    query = crud.heartbeat(schema.ids, schema.owner, lease_expires)
+
+    with db.begin_nested():
+        return db.scalars(query).all()
+
+
+def release_expired_leases(
+    db: Session, now: pendulum.DateTime = None, limit: int = None
+) -> int:
+    query = (
+        crud.release_expired_leases(now, limit)
+        .returning(Workplan.name)
+        .execution_options(synchronize_session=False)
     )
 
+    with db.begin_nested():
+        names = db.scalars(query).all()
+
+    events.notify(db, *names)
+
+    return len(names)
+
+
+def reset(db: Session, name: str, worktimes: list[pendulum.DateTime]) -> list[Workplan]:
+    with db.begin_nested():
+        items = db.scalars(crud.reset(name, worktimes)).all()
+
+    if items:
+        events.notify(db, name)
+
+    return items
+
+
+def status_counts(db: Session) -> dict[str, int]:
+    return dict(db.execute(crud.count_by(Workplan.status)).tuples().all())
+
+
+def save_definitions(db: Session, schema_list: list[schemas.GenerateWorkplans]) -> int:
+    """Definitions for the scheduler, the existing ones are replaced."""
+    rows = {
+        schema.name: {
+            WorkplanDefinition.name.key: schema.name,
+            WorkplanDefinition.definition.key: orjson.loads(schema.json()),
+        }
+        for schema in schema_list
+    }
+    if not rows:
+        return 0
+
+    query = crud.upsert_definitions(db.get_bind().dialect.name, list(rows.values()))
+    with db.begin_nested():
+        db.execute(query)
+
+    return len(rows)
+
+
+def get_definitions(
+    db: Session, names: list[str] | None = None
+) -> list[schemas.GenerateWorkplans]:
+    return [
+        schemas.GenerateWorkplans.parse_obj(item.definition)
+        for item in db.scalars(crud.get_definitions(names))
+    ]
+
+
+def delete_definitions(db: Session, names: list[str]) -> int:
+    query = crud.delete_definitions(names).execution_options(synchronize_session=False)
+    with db.begin_nested():
+        return db.execute(query).rowcount
+
+
+def save_edges(db: Session, schema_list: list[schemas.WorkplanEdge]) -> int:
+    """Edges of the dependency graph, the existing ones are replaced."""
+    rows = {
+        (schema.parent_name, schema.name): {
+            WorkplanEdge.parent_name.key: schema.parent_name,
+            WorkplanEdge.name.key: schema.name,
+            WorkplanEdge.status_trigger.key: schema.status_trigger,
+            WorkplanEdge.definition.key: orjson.loads(schema.json()),
+        }
+        for schema in schema_list
+    }
+    if not rows:
+        return 0
+
+    existing = db.execute(crud.edge_pks()).all()
+    graph_levels({*existing, *rows})
+
+    query = crud.upsert_edges(db.get_bind().dialect.name, list(rows.values()))
+    with db.begin_nested():
+        db.execute(query)
+
+    return len(rows)
+
+
+def get_edges(db: Session) -> list[schemas.WorkplanEdge]:
+    return [
+        schemas.WorkplanEdge.parse_obj(item.definition)
+        for item in db.scalars(crud.get_edges())
+    ]
+
+
+def delete_edges(db: Session, schema_list: list[schemas.WorkplanEdgePK]) -> int:
+    query = crud.delete_edges(
+        (schema.parent_name, schema.name) for schema in schema_list
+    ).execution_options(synchronize_session=False)
+    with db.begin_nested():
+        return db.execute(query).rowcount
+
 
 def update(
     db: Session, schema: schemas.WorkplanUpdate, updated=None
@@ -324,13 +709,33 @@ def update(
         return db.scalar(query)
 
 
-def many_update(
-    db: Session, schema_list: list[schemas.WorkplanUpdate]
-) -> list[Workplan]:
+def many_update(db: Session, schema_list: list[schemas.WorkplanUpdate]) -> int:
+    """
+    Updates are grouped by the set of changed fields
+    and each group is one executemany UPDATE. Returns the number of updated rows.
+    """
     updated = pendulum.now()
+    columns = Workplan.__table__.c
+    groups = {}
+    for schema in schema_list:
+        data = schema.dict(exclude_unset=True)
+        data[Workplan.updated_utc.key] = updated
+        by_id = bool(schema.id)
+        keys = (
+            (Workplan.id.key,)
+            if by_id
+            else (Workplan.name.key, Workplan.worktime_utc.key)
+        )
+        fields = tuple(sorted(k for k in data if k in columns and k not in keys))
+        params = {f"b_{k}": v for k, v in data.items() if k in columns}
+        groups.setdefault((fields, by_id), []).append(params)
 
+    count = 0
     with db.begin_nested():
-        return [update(db, schema, updated) for schema in schema_list]
+        for (fields, by_id), params in groups.items():
+            count += db.execute(crud.update_many(fields, by_id), params).rowcount
+
+    return count
 
 
 def create_by_worktimes(
@@ -360,4 +765,6 @@ def run(db: Session, id_: UUID) -> Workplan | None:
             wp.retries += 1
             wp.status = Statuses.add
 
+        events.notify(db, wp.name)
+
         return wp
@@ -20,6 +20,21 @@ class Settings(ConfZ):
     loglevel: str = const.DEFAULT_LOGLEVEL
     logs_rotation: str = const.DEFAULT_LOGS_ROTATION
     logs_retention: str = const.DEFAULT_LOGS_RETENTION
+    expiration_interval: float = const.DEFAULT_EXPIRATION_INTERVAL
+    expiration_batch_size: int = const.DEFAULT_EXPIRATION_BATCH_SIZE
+    lease_reap_interval: float = const.DEFAULT_LEASE_REAP_INTERVAL
+    lease_reap_batch_size: int = const.DEFAULT_LEASE_REAP_BATCH_SIZE
+    scheduler_reload_interval: float = const.DEFAULT_SCHEDULER_RELOAD_INTERVAL
+    scheduler_batch_size: int = const.DEFAULT_SCHEDULER_BATCH_SIZE
+    async_api: bool = const.DEFAULT_ASYNC_API
+    pool_size: int = const.DEFAULT_POOL_SIZE
+    max_overflow: int = const.DEFAULT_MAX_OVERFLOW
+    pool_timeout: float = const.DEFAULT_POOL_TIMEOUT
+    pool_recycle: int = const.DEFAULT_POOL_RECYCLE
+    pool_pre_ping: bool = const.DEFAULT_POOL_PRE_PING
+    sqlite_journal_mode: str = const.DEFAULT_SQLITE_JOURNAL_MODE
+    sqlite_synchronous: str = const.DEFAULT_SQLITE_SYNCHRONOUS
+    sqlite_busy_timeout: int = const.DEFAULT_SQLITE_BUSY_TIMEOUT
 
     CONFIG_SOURCES = [
         ConfZCLArgSource(),
@@ -28,31 +28,30 @@ def iter_period_from_range(
     interval_timedelta: dt.timedelta,
     length: Optional[int] = None,
 ) -> Iterator[tuple[pendulum.DateTime, pendulum.DateTime]]:
-    datetimes = sorted(set(datetimes))
-    while datetimes:
-        date1 = datetimes.pop(0)
-        date2 = date1
-        i = 1
-        while datetimes:
-            i += 1
-            date = date2 + interval_timedelta
-            if date in datetimes and (length is None or i <= length):
-                date2 = datetimes.pop(datetimes.index(date))
-            else:
-                break
-
+    """
+    The first and the last datetime of each run of consecutive datetimes,
+    runs are at most `length` datetimes long. One pass over the sorted datetimes.
+    """
+    date1 = date2 = None
+    size = 0
+    for date in sorted(set(datetimes)):
+        if (
+            date1 is not None
+            and date == date2 + interval_timedelta
+            and (length is None or size < length)
+        ):
+            date2 = date
+            size += 1
+        else:
+            if date1 is not None:
+                yield date1, date2
+            date1 = date2 = date
+            size = 1
+
+    if date1 is not None:
         yield date1, date2
 
 
-def scroll_to_last_interval_time(
-    start_time: pendulum.DateTime,
-    interval_timedelta: dt.timedelta,
-) -> pendulum.DateTime:
-    return list(
-        iter_range_datetime(start_time, pendulum.now(), timedelta=interval_timedelta)
-    )[-1]
-
-
 def strftime_utc(value: pendulum.DateTime) -> str:
     value = value.astimezone(pendulum.UTC)
     value = value.replace(tzinfo=None, microsecond=0)
@@ -0,0 +1,68 @@
+"""
+Arithmetic on the worktime grid of a workplan.
+
+The worktimes of a workplan are ``start_time + interval * n``.
+All functions here work with integer epoch microseconds,
+so they cost the same regardless of how far ``start_time`` lies in the past.
+"""
+import calendar
+import datetime as dt
+
+import pendulum
+
+
+def to_epoch_microseconds(value: dt.datetime) -> int:
+    # Naive datetimes are considered to be in UTC, like everywhere in the service.
+    return calendar.timegm(value.utctimetuple()) * 1_000_000 + value.microsecond
+
+
+def to_microseconds(value: dt.timedelta) -> int:
+    return (value.days * 86_400 + value.seconds) * 1_000_000 + value.microseconds
+
+
+def count_slots(
+    start_time: dt.datetime, end_time: dt.datetime, interval_timedelta: dt.timedelta
+) -> int:
+    """Number of worktimes in the range [start_time, end_time]."""
+    interval = to_microseconds(interval_timedelta)
+    if interval <= 0:
+        raise ValueError("interval_timedelta must be positive")
+
+    delta = to_epoch_microseconds(end_time) - to_epoch_microseconds(start_time)
+    if delta < 0:
+        return 0
+
+    return delta // interval + 1
+
+
+def slot_after(
+    start_time: pendulum.DateTime, interval_timedelta: dt.timedelta, n: int
+) -> pendulum.DateTime:
+    """Worktime that is N intervals after start_time."""
+    return start_time + interval_timedelta * n
+
+
+def last_slot(
+    start_time: pendulum.DateTime,
+    interval_timedelta: dt.timedelta,
+    now: pendulum.DateTime | None = None,
+) -> pendulum.DateTime:
+    """The last worktime that is less than or equal to now."""
+    now = now or pendulum.now()
+    if start_time > now:
+        raise ValueError("start_time > end_time")
+
+    n = count_slots(start_time, now, interval_timedelta) - 1
+
+    return slot_after(start_time, interval_timedelta, n)
+
+
+def is_due(
+    worktime: pendulum.DateTime,
+    interval_timedelta: dt.timedelta,
+    now: pendulum.DateTime | None = None,
+) -> bool:
+    """Whether the worktime following the given one has already come."""
+    now = now or pendulum.now()
+
+    return count_slots(worktime, now, interval_timedelta) > 1